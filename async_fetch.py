@@ -0,0 +1,270 @@
+"""
+Fetch departures of several stops concurrently with (u)asyncio streams.
+
+Every stop gets its own timeout and its own result, so one slow or failing
+stop does not hold up or spoil the others.
+
+The stream connections are HTTP/1.1 keep-alive and go back to http_pool's
+pool after each stop, so the next stop, or the next loop while the device
+stays awake, skips the TLS handshake. They are tied to the event loop that
+opened them, which is why one loop runs every fetch_all.
+"""
+
+import asyncio
+import time
+
+from http_pool import POOL
+from json_stream import ArrayItemParser
+
+CHUNK_SIZE = 512
+
+_loop = None
+
+
+def _split_url(url: str) -> tuple[str, int, bool, str]:
+    scheme, _, rest = url.partition("://")
+    host, slash, path = rest.partition("/")
+    use_ssl = scheme == "https"
+    port = 443 if use_ssl else 80
+    if ":" in host:
+        host, port_str = host.split(":")
+        port = int(port_str)
+    return host, port, use_ssl, slash + path
+
+
+class _StreamConnection:
+    def __init__(self, key, reader, writer) -> None:
+        # not the key of http_pool's own connections for the host, the two
+        # kinds can't stand in for each other
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        try:
+            self.writer.close()
+        except OSError:
+            pass
+
+
+class _Body:
+    "The response body as in http_pool._Body, read from a stream"
+
+    def __init__(self, reader, length: int | None, chunked: bool) -> None:
+        self._reader = reader
+        self._remaining = length
+        self.chunked = chunked
+        self._chunk_left = 0
+        self.complete = length == 0
+        self.read_bytes = 0
+        self.read_ms = 0
+
+    async def _read(self, size: int) -> bytes:
+        start = time.ticks_ms()
+        data = await self._reader.read(size)
+        self.read_ms += time.ticks_diff(time.ticks_ms(), start)
+        self.read_bytes += len(data)
+        return data
+
+    async def read(self, size: int) -> bytes:
+        if self.complete:
+            return b""
+        if self.chunked:
+            return await self._read_chunked(size)
+        if self._remaining is None:
+            data = await self._read(size)
+            if not data:
+                self.complete = True
+            return data
+
+        data = await self._read(min(size, self._remaining))
+        if not data:
+            raise OSError("connection closed before the end of the body")
+        self._remaining -= len(data)
+        self.complete = self._remaining == 0
+        return data
+
+    async def _read_chunked(self, size: int) -> bytes:
+        if not self._chunk_left:
+            size_line = await self._reader.readline()
+            self._chunk_left = int(size_line.split(b";")[0].strip(), 16)
+            if not self._chunk_left:
+                # trailers end with an empty line
+                while await self._reader.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                self.complete = True
+                return b""
+        data = await self._read(min(size, self._chunk_left))
+        if not data:
+            raise OSError("connection closed before the end of the body")
+        self._chunk_left -= len(data)
+        if not self._chunk_left:
+            await self._reader.readline()
+        return data
+
+    def remaining(self) -> int | None:
+        return None if self.chunked else self._remaining
+
+
+async def _send(connection: _StreamConnection, host: str, path: str):
+    "Sends a GET and reads the head, (status, body, keep_alive)"
+    writer = connection.writer
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode()
+    )
+    await writer.drain()
+    reader = connection.reader
+    status_line = await reader.readline()
+    if not status_line:
+        raise OSError("connection closed")
+    version, status, _ = (status_line.decode().split(None, 2) + [""])[:3]
+    try:
+        status = int(status)
+    except ValueError:
+        raise ValueError("invalid status line", status_line)
+    headers = dict()
+    while True:
+        line = await reader.readline()
+        if not line or line in (b"\r\n", b"\n"):
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = headers.get("content-length")
+    body = _Body(
+        reader,
+        int(length) if length is not None else None,
+        headers.get("transfer-encoding", "").lower() == "chunked",
+    )
+    keep_alive = (
+        version == "HTTP/1.1"
+        and headers.get("connection", "").lower() != "close"
+        and (length is not None or body.chunked)
+    )
+    return status, body, keep_alive
+
+
+async def _request(host: str, port: int, use_ssl: bool, path: str):
+    "(connection, status, body, keep_alive), on an idle connection if there is one"
+    key = (host, port, use_ssl, "stream")
+    start = time.ticks_ms()
+    handshake_ms = None
+    connection = POOL.take(key)
+    if connection is not None:
+        try:
+            response = await _send(connection, host, path)
+        except OSError:
+            # the server closed the idle connection in the meantime
+            connection.close()
+            connection = None
+        except BaseException:
+            connection.close()
+            raise
+    if connection is None:
+        connect_start = time.ticks_ms()
+        reader, writer = await asyncio.open_connection(host, port, ssl=use_ssl)
+        handshake_ms = time.ticks_diff(time.ticks_ms(), connect_start)
+        connection = _StreamConnection(key, reader, writer)
+        try:
+            response = await _send(connection, host, path)
+        except BaseException:
+            connection.close()
+            raise
+    POOL.record(start, handshake_ms)
+    return (connection,) + response
+
+
+async def _drain(body: _Body) -> bool:
+    "Reads out the rest of the body if it is worth it, whether it got to the end"
+    deadline = time.ticks_add(time.ticks_ms(), POOL.drain_ms(body))
+    while not body.complete and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+        await body.read(CHUNK_SIZE)
+    return body.complete
+
+
+async def fetch_departures(url: str, accept, limit: int) -> list:
+    """
+    GET `url` and stream its departures array through `accept`, which
+    returns the item to keep or None. Stops reading after `limit` items.
+    """
+    host, port, use_ssl, path = _split_url(url)
+    connection, status, body, keep_alive = await _request(host, port, use_ssl, path)
+    items = []
+    reusable = False
+    try:
+        if status < 200 or status > 299:
+            reusable = keep_alive and await _drain(body)
+            raise ValueError("response was not successful!", status)
+
+        parser = ArrayItemParser("departures")
+        while not parser.done and len(items) < limit:
+            chunk = await body.read(CHUNK_SIZE)
+            if not chunk:
+                if parser.found:
+                    raise OSError("response ended inside the departures array")
+                break
+            for departure in parser.feed(chunk):
+                item = accept(departure)
+                if item is not None:
+                    items.append(item)
+        if not parser.found:
+            raise KeyError("missing departures in response")
+        reusable = keep_alive and await _drain(body)
+    finally:
+        # a timeout cancels this in the middle of a response
+        if reusable:
+            POOL.give(connection)
+        else:
+            connection.close()
+    return items[:limit]
+
+
+async def _worker(
+    pending: list, results: dict, accept, limit: int, timeout: int, timings: dict
+):
+    while pending:
+        stop_id, url = pending.pop(0)
+        start = time.ticks_us()
+        try:
+            results[stop_id] = await asyncio.wait_for(
+                fetch_departures(url, lambda d: accept(stop_id, d), limit), timeout
+            )
+        except (OSError, ValueError, KeyError, asyncio.TimeoutError) as e:
+            results[stop_id] = e
+        timings[stop_id] = time.ticks_diff(time.ticks_us(), start)
+
+
+async def _fetch_all(urls, accept, limit, concurrency, timeout, timings) -> dict:
+    pending = list(urls.items())
+    results = dict()
+    await asyncio.gather(
+        *[
+            _worker(pending, results, accept, limit, timeout, timings)
+            for _ in range(min(concurrency, len(pending)))
+        ]
+    )
+    return results
+
+
+def fetch_all(
+    urls: dict[str, str],
+    accept,
+    limit: int,
+    concurrency: int,
+    timeout: int,
+    timings: dict | None = None,
+) -> dict[str, list | Exception]:
+    """
+    Fetch `urls` (stop id -> departures URL) with at most `concurrency`
+    connections at a time. `accept(stop_id, departure)` picks and converts
+    departures. Failed stops map to their exception instead of a list.
+    `timings` gets the microseconds each stop took.
+    """
+    global _loop
+    if timings is None:
+        timings = dict()
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+    return _loop.run_until_complete(
+        _fetch_all(urls, accept, limit, concurrency, timeout, timings)
+    )
@@ -1,11 +1,18 @@
 """Functions and types to deal with caching the state between reboots"""
 
+import binascii
 import collections
+import os
+import struct
 
 import json
 
+from state_store import FlashStore, RTCStore
+
+# `when` is the departure time in seconds since the `time` epoch, the time
+# left is worked out when drawing so cached departures never show stale minutes
 UIDeparture = collections.namedtuple(
-    "UIDeparture", ("line_name", "direction", "time_left", "stop")
+    "UIDeparture", ("line_name", "direction", "when", "stop", "stop_id")
 )
 
 
@@ -13,20 +20,255 @@ def _ui_departure_to_json_dict(departure: UIDeparture) -> dict:
     return {
         "line_name": departure.line_name,
         "direction": departure.direction,
-        "time_left": departure.time_left,
+        "when": departure.when,
         "stop": departure.stop,
+        "stop_id": departure.stop_id,
     }
 
 
-def _ui_departure_from_json_dict(json_dict: dict) -> UIDeparture:
+def _ui_departure_from_json_dict(
+    json_dict: dict, last_departure_update: int
+) -> UIDeparture:
+    when = json_dict.get("when")
+    if when is None:
+        # caches from before `when` kept the time left at the last update
+        when = last_departure_update + json_dict["time_left"]
     return UIDeparture(
         json_dict["line_name"],
         json_dict["direction"],
-        json_dict["time_left"],
+        when,
         json_dict["stop"],
+        json_dict.get("stop_id", ""),
     )
 
 
+CACHE_PATH = "/cache.bin"
+# written by versions before the binary format, read once to migrate
+JSON_CACHE_PATH = "/cache.json"
+
+MAGIC = b"STCH"
+VERSION = 3
+# magic, version, last_rtc_ntp_update, last_departure_update,
+# next_departure_fetch, partial_refreshes_since_full, fetch_failures,
+# departure_volatility, then string table indices of the wifi ssid and the
+# JSON of last_tz_response, string and departure counts, then the string
+# table index of the hex wifi_bssid, wifi_channel, the string table index of
+# the comma separated wifi_ifconfig and wifi_leased_at, then rtc_drift_ppm,
+# rtc_drift_span and next_ntp_sync
+HEADER = "<4sBqqqHHfHHHHHBHqfIq"
+# version 1 ended after the counts, version 2 after wifi_leased_at
+HEADERS = {1: "<4sBqqqHHfHHHH", 2: "<4sBqqqHHfHHHHHBHq", VERSION: HEADER}
+MAGIC_VERSION = "<4sB"
+# when, then string table indices of line_name, direction, stop, stop_id
+DEPARTURE = "<qHHHH"
+STRING_LENGTH = "<H"
+
+RTC_MAGIC = b"STRT"
+RTC_VERSION = 2
+# the RTC_FIELDS in order, after magic and version
+RTC_RECORD = "<4sBqqqHHfIq"
+
+# small fields that change on most loops, kept in RTC memory; the flash
+# copy of them is only as recent as the last flash write
+RTC_FIELDS = (
+    "last_rtc_ntp_update",
+    "last_departure_update",
+    "next_departure_fetch",
+    "partial_refreshes_since_full",
+    "fetch_failures",
+    "departure_volatility",
+    "frame_hash",
+    "next_ntp_sync",
+)
+FLASH_FIELDS = (
+    "departures",
+    "last_tz_response",
+    "last_connected_wifi_ssid",
+    "wifi_bssid",
+    "wifi_channel",
+    "wifi_ifconfig",
+    "wifi_leased_at",
+    "rtc_drift_ppm",
+    "rtc_drift_span",
+)
+FIELDS = FLASH_FIELDS + RTC_FIELDS
+
+RTC_STORE = RTCStore()
+
+
+def _snapshot(value):
+    "Copy of a field value that in-place changes of the field don't affect"
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, dict):
+        return dict(value)
+    return value
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.strings = []
+        self._indices = dict()
+
+    def intern(self, string: str) -> int:
+        index = self._indices.get(string)
+        if index is None:
+            index = len(self.strings)
+            self.strings.append(string)
+            self._indices[string] = index
+        return index
+
+
+def pack(cache: "StateCache") -> bytes:
+    strings = _StringTable()
+    ssid_index = strings.intern(cache.last_connected_wifi_ssid)
+    tz_index = strings.intern(json.dumps(cache.last_tz_response))
+    bssid_index = strings.intern(binascii.hexlify(cache.wifi_bssid).decode())
+    ifconfig_index = strings.intern(",".join(cache.wifi_ifconfig))
+    records = [
+        struct.pack(
+            DEPARTURE,
+            d.when,
+            strings.intern(d.line_name),
+            strings.intern(d.direction),
+            strings.intern(d.stop),
+            strings.intern(d.stop_id),
+        )
+        for d in cache.departures
+    ]
+
+    parts = [
+        struct.pack(
+            HEADER,
+            MAGIC,
+            VERSION,
+            cache.last_rtc_ntp_update,
+            cache.last_departure_update,
+            cache.next_departure_fetch,
+            cache.partial_refreshes_since_full,
+            cache.fetch_failures,
+            cache.departure_volatility,
+            ssid_index,
+            tz_index,
+            len(strings.strings),
+            len(records),
+            bssid_index,
+            cache.wifi_channel,
+            ifconfig_index,
+            cache.wifi_leased_at,
+            cache.rtc_drift_ppm,
+            cache.rtc_drift_span,
+            cache.next_ntp_sync,
+        )
+    ]
+    for string in strings.strings:
+        encoded = string.encode()
+        parts.append(struct.pack(STRING_LENGTH, len(encoded)))
+        parts.append(encoded)
+    parts.extend(records)
+    return b"".join(parts)
+
+
+def unpack(data: bytes) -> "StateCache":
+    magic, version = struct.unpack_from(MAGIC_VERSION, data)
+    header = HEADERS.get(version)
+    if magic != MAGIC or header is None:
+        raise ValueError(f"unknown cache format {magic} v{version}")
+    fields = struct.unpack_from(header, data)
+    (
+        _,
+        _,
+        last_rtc_ntp_update,
+        last_departure_update,
+        next_departure_fetch,
+        partial_refreshes_since_full,
+        fetch_failures,
+        departure_volatility,
+        ssid_index,
+        tz_index,
+        string_count,
+        departure_count,
+    ) = fields[:12]
+    # fields of later versions, as older versions would have left them
+    bssid_index, wifi_channel, ifconfig_index, wifi_leased_at = (
+        fields[12:16] if version > 1 else (None, 0, None, 0)
+    )
+    rtc_drift_ppm, rtc_drift_span, next_ntp_sync = (
+        fields[16:19] if version > 2 else (0.0, 0, 0)
+    )
+
+    offset = struct.calcsize(header)
+    length_size = struct.calcsize(STRING_LENGTH)
+    strings = []
+    for _ in range(string_count):
+        (length,) = struct.unpack_from(STRING_LENGTH, data, offset)
+        offset += length_size
+        strings.append(str(data[offset : offset + length], "utf-8"))
+        offset += length
+
+    departure_size = struct.calcsize(DEPARTURE)
+    if len(data) != offset + departure_count * departure_size:
+        raise ValueError("truncated cache")
+    departures = []
+    for _ in range(departure_count):
+        when, line_name, direction, stop, stop_id = struct.unpack_from(
+            DEPARTURE, data, offset
+        )
+        offset += departure_size
+        departures.append(
+            UIDeparture(
+                strings[line_name],
+                strings[direction],
+                when,
+                strings[stop],
+                strings[stop_id],
+            )
+        )
+
+    return StateCache(
+        last_rtc_ntp_update,
+        departures,
+        last_departure_update,
+        json.loads(strings[tz_index]),
+        strings[ssid_index],
+        partial_refreshes_since_full,
+        next_departure_fetch,
+        fetch_failures,
+        departure_volatility,
+        wifi_bssid=(
+            b"" if bssid_index is None else binascii.unhexlify(strings[bssid_index])
+        ),
+        wifi_channel=wifi_channel,
+        wifi_ifconfig=(
+            tuple(strings[ifconfig_index].split(","))
+            if ifconfig_index is not None and strings[ifconfig_index]
+            else ()
+        ),
+        wifi_leased_at=wifi_leased_at,
+        rtc_drift_ppm=rtc_drift_ppm,
+        rtc_drift_span=rtc_drift_span,
+        next_ntp_sync=next_ntp_sync,
+    )
+
+
+def pack_rtc(cache: "StateCache") -> bytes:
+    return struct.pack(
+        RTC_RECORD,
+        RTC_MAGIC,
+        RTC_VERSION,
+        *(getattr(cache, name) for name in RTC_FIELDS),
+    )
+
+
+def unpack_rtc(payload: bytes, cache: "StateCache"):
+    "Overrides the RTC_FIELDS of `cache` with the values in `payload`"
+    values = struct.unpack(RTC_RECORD, payload)
+    if values[0] != RTC_MAGIC or values[1] != RTC_VERSION:
+        raise ValueError(f"unknown RTC record {values[0]} v{values[1]}")
+    for name, value in zip(RTC_FIELDS, values[2:]):
+        setattr(cache, name, value)
+
+
 class StateCache:
     def __init__(
         self,
@@ -35,12 +277,54 @@ class StateCache:
         last_departure_update: int = 0,
         last_tz_response: dict = dict(),
         last_connected_wifi_ssid: str = "",
+        partial_refreshes_since_full: int = 0,
+        next_departure_fetch: int = 0,
+        fetch_failures: int = 0,
+        departure_volatility: float = 0.0,
+        frame_hash: int = 0,
+        wifi_bssid: bytes = b"",
+        wifi_channel: int = 0,
+        wifi_ifconfig: tuple[str, ...] = (),
+        wifi_leased_at: int = 0,
+        rtc_drift_ppm: float = 0.0,
+        rtc_drift_span: int = 0,
+        next_ntp_sync: int = 0,
     ) -> None:
         self.last_rtc_ntp_update = last_rtc_ntp_update
         self.departures = departures
         self.last_departure_update = last_departure_update
         self.last_tz_response = last_tz_response
         self.last_connected_wifi_ssid = last_connected_wifi_ssid
+        self.partial_refreshes_since_full = partial_refreshes_since_full
+        self.next_departure_fetch = next_departure_fetch
+        self.fetch_failures = fetch_failures
+        self.departure_volatility = departure_volatility
+        # CRC32 of the frame the panel shows
+        self.frame_hash = frame_hash
+        # the access point and DHCP lease of the last connect, see netutil
+        self.wifi_bssid = wifi_bssid
+        self.wifi_channel = wifi_channel
+        self.wifi_ifconfig = wifi_ifconfig
+        self.wifi_leased_at = wifi_leased_at
+        # RTC drift estimate over the seconds it was observed, see clock_sync
+        self.rtc_drift_ppm = rtc_drift_ppm
+        self.rtc_drift_span = rtc_drift_span
+        self.next_ntp_sync = next_ntp_sync
+        # field values as they are in RTC memory or flash
+        self._saved = dict()
+
+    def _mark_saved(self, names: tuple[str, ...]):
+        for name in names:
+            self._saved[name] = _snapshot(getattr(self, name))
+
+    def changed_fields(self) -> list[str]:
+        "Fields that differ from what is saved"
+        return [
+            name
+            for name in FIELDS
+            if name not in self._saved
+            or _snapshot(getattr(self, name)) != self._saved[name]
+        ]
 
     def to_json_dict(self):
         return {
@@ -48,31 +332,85 @@ class StateCache:
             "last_departure_update": self.last_departure_update,
             "last_tz_response": self.last_tz_response,
             "last_connected_wifi_ssid": self.last_connected_wifi_ssid,
+            "partial_refreshes_since_full": self.partial_refreshes_since_full,
+            "next_departure_fetch": self.next_departure_fetch,
+            "fetch_failures": self.fetch_failures,
+            "departure_volatility": self.departure_volatility,
             "departures": [_ui_departure_to_json_dict(d) for d in self.departures],
         }
 
     @classmethod
-    def load_cache(cls, path="/cache.json") -> "StateCache":
+    def from_json_dict(cls, cache_dict: dict) -> "StateCache":
+        if not isinstance(cache_dict, dict):
+            raise TypeError(
+                f"loaded cache was not a dict, it was a '{type(cache_dict).__name__}'"
+            )
+        cache_dict["departures"] = [
+            _ui_departure_from_json_dict(dd, cache_dict.get("last_departure_update", 0))
+            for dd in cache_dict["departures"]
+        ]
+        return StateCache(**cache_dict)
+
+    @classmethod
+    def load_cache(cls, path=CACHE_PATH, rtc_store=None) -> "StateCache":
+        cache = cls._load_flash(path)
         try:
-            with open(path, encoding="utf-8") as cache_file:
-                cache_dict = json.load(cache_file)
-
-            if not isinstance(cache_dict, dict):
-                raise TypeError(
-                    f"loaded cache was not a dict, it was a '{type(cache_dict).__name__}'"
-                )
-            cache_dict["departures"] = [_ui_departure_from_json_dict(dd) for dd in cache_dict["departures"]]
-            return StateCache(**cache_dict)
-
-        except (OSError, TypeError, ValueError) as e:
-            _log("failed to load cache :( ", type(e).__name__, str(e))
+            payload = (rtc_store or RTC_STORE).read()
+            if payload is None:
+                _log("no valid RTC memory, using the flash copy")
+            else:
+                unpack_rtc(payload, cache)
+                cache._mark_saved(RTC_FIELDS)
+        except (OSError, ValueError) as e:
+            _log("failed to read RTC memory", type(e).__name__, str(e))
+        return cache
+
+    @classmethod
+    def _load_flash(cls, path: str) -> "StateCache":
+        data = FlashStore(path).read()
+        if data is not None:
+            try:
+                cache = unpack(data)
+                cache._mark_saved(FLASH_FIELDS)
+                return cache
+            except (TypeError, ValueError, IndexError) as e:
+                _log("failed to load cache :( ", type(e).__name__, str(e))
+
+        try:
+            with open(JSON_CACHE_PATH, encoding="utf-8") as cache_file:
+                cache = cls.from_json_dict(json.load(cache_file))
+            _log("migrating", JSON_CACHE_PATH, "to", path)
+            # everything counts as changed, so the next perist() writes it all
+            os.remove(JSON_CACHE_PATH)
+            return cache
+        except (OSError, TypeError, ValueError, KeyError):
             return StateCache()
 
+    def perist(self, path=CACHE_PATH, rtc_store=None) -> int:
+        """
+        Saves what changed, RTC fields to RTC memory and the rest to flash.
+        Returns the bytes written to flash.
+        """
+        changed = self.changed_fields()
+        if not changed:
+            _log("cache unchanged, not saving")
+            return 0
+
+        if any(name in RTC_FIELDS for name in changed):
+            (rtc_store or RTC_STORE).write(pack_rtc(self))
+            self._mark_saved(RTC_FIELDS)
+        written = 0
+        if any(name in FLASH_FIELDS for name in changed):
+            data = pack(self)
+            FlashStore(path).write(data)
+            self._mark_saved(FLASH_FIELDS)
+            written = len(data)
+        _log("saved cache, changed:", changed, "flash bytes:", written)
+        return written
 
-    def perist(self, path="/cache.json"):
-        with open(path, "wt", encoding="utf-8") as json_file:
-            json.dump(self.to_json_dict(), json_file)
-            _log("saved cache to", path)
+    def upcoming_departures(self, now: int) -> list[UIDeparture]:
+        "Cached departures that have not left yet"
+        return [d for d in self.departures if d.when >= now]
 
     def __enter__(self):
         return self
@@ -0,0 +1,90 @@
+"""
+Decides when the RTC is synced with NTP and corrects it in between.
+
+The RTC runs fast or slow by a rate that depends on the board and the
+temperature. Every sync measures how far it got off since the previous
+one, the drift estimate is the average over all the time observed, and
+dateutil.now_epoch() takes off the drift accumulated since the last sync.
+The longer the RTC was observed, the better the estimate, and the longer
+the corrected clock stays within ERROR_BUDGET_SEC before the next sync.
+"""
+
+from cache import StateCache
+import dateutil
+
+# NTP and the RTC both count whole seconds
+SYNC_ERROR_SEC = 1
+# how much the drift may differ from the estimate, e.g. with temperature
+DRIFT_WANDER_PPM = 50
+# assumed until there is an estimate, the first interval is the shortest
+UNKNOWN_DRIFT_PPM = 1000
+# the clock may be this far off before a sync is due
+ERROR_BUDGET_SEC = 10
+MIN_INTERVAL_SEC = 60 * 60
+MAX_INTERVAL_SEC = 24 * 60 * 60
+# older observations stop counting, the drift changes with the seasons
+MAX_DRIFT_SPAN_SEC = 7 * 24 * 60 * 60
+# more than that is an RTC that was set or reset, not drift
+MAX_DRIFT_PPM = 50000
+RETRY_SEC = 10 * 60
+
+
+def apply(cache: StateCache):
+    "Makes dateutil.now_epoch() correct for the drift since the last sync"
+    dateutil.set_drift(cache.last_rtc_ntp_update, cache.rtc_drift_ppm)
+
+
+def uncertainty_ppm(cache: StateCache) -> float:
+    if not cache.rtc_drift_span:
+        return UNKNOWN_DRIFT_PPM
+    return 2 * SYNC_ERROR_SEC * 1000000 / cache.rtc_drift_span + DRIFT_WANDER_PPM
+
+
+def error_bound(cache: StateCache, now: int) -> float | None:
+    "How far off the corrected clock can be by now, None if it was never synced"
+    if not cache.last_rtc_ntp_update:
+        return None
+    elapsed = abs(now - cache.last_rtc_ntp_update)
+    return SYNC_ERROR_SEC + uncertainty_ppm(cache) * elapsed / 1000000
+
+
+def sync_due(cache: StateCache, now: int) -> bool:
+    return (
+        now >= cache.next_ntp_sync
+        # the RTC was reset and counts from 2000 again
+        or cache.next_ntp_sync - now > MAX_INTERVAL_SEC + RETRY_SEC
+    )
+
+
+def record_sync(cache: StateCache, ntp_now: int, rtc_now: int):
+    """
+    Updates the drift estimate with the RTC reading `rtc_now` taken at NTP
+    time `ntp_now`, the RTC has to be set to `ntp_now` after this
+    """
+    elapsed = ntp_now - cache.last_rtc_ntp_update
+    rtc_error = rtc_now - ntp_now
+    if (
+        cache.last_rtc_ntp_update
+        and elapsed > 0
+        and abs(rtc_error) * 1000000 < MAX_DRIFT_PPM * elapsed
+    ):
+        # both weighted by how long they were observed
+        cache.rtc_drift_ppm = (
+            cache.rtc_drift_ppm * cache.rtc_drift_span + rtc_error * 1000000
+        ) / (cache.rtc_drift_span + elapsed)
+        cache.rtc_drift_span = min(cache.rtc_drift_span + elapsed, MAX_DRIFT_SPAN_SEC)
+    interval = MIN_INTERVAL_SEC
+    if cache.rtc_drift_span:
+        interval = (
+            (ERROR_BUDGET_SEC - SYNC_ERROR_SEC) * 1000000 / uncertainty_ppm(cache)
+        )
+    cache.last_rtc_ntp_update = ntp_now
+    cache.next_ntp_sync = ntp_now + int(
+        min(max(interval, MIN_INTERVAL_SEC), MAX_INTERVAL_SEC)
+    )
+    apply(cache)
+
+
+def record_failure(cache: StateCache, now: int):
+    "The corrected clock keeps going, try again in a while"
+    cache.next_ntp_sync = now + RETRY_SEC
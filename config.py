@@ -1,5 +1,8 @@
 import json
-import re
+
+from departure_filter import DepartureFilter
+
+_compiled = None
 
 
 def _check_config(config: any) -> dict[str, list[str | dict[str, str]]]:
@@ -24,7 +27,7 @@ def _check_config(config: any) -> dict[str, list[str | dict[str, str]]]:
     config_valid = has_keys and lines_directions_valid and wifi_valid
     if not config_valid:
         raise ValueError(f"config: {config} was invalid")
-    config["lines_directions"] = _compile(config["lines_directions"])
+    config["departure_filter"] = _compile(config["lines_directions"])
     return config
 
 
@@ -34,24 +37,9 @@ def load_config():
     return _check_config(config)
 
 
-def _compile(
-    lines_directions: list[dict[str, str]]
-) -> list[tuple[str, re.Pattern, re.Pattern | None]]:
-    compiled = []
-    for item in lines_directions:
-        line_name = item["line_name"]
-        direction_regex = re.compile(item["direction_regex"])
-
-        except_regex = None
-        if "except_regex" in item:
-            except_regex = re.compile(item["except_regex"])
-
-        compiled.append(
-            {
-                "line_name": line_name,
-                "direction_regex": direction_regex,
-                "except_regex": except_regex,
-            }
-        )
-
-    return compiled
+def _compile(lines_directions: list[dict[str, str]]) -> DepartureFilter:
+    global _compiled
+    # config is reloaded every loop, keep the filter and what it remembered
+    if _compiled is None or _compiled[0] != lines_directions:
+        _compiled = (lines_directions, DepartureFilter(lines_directions))
+    return _compiled[1]
@@ -7,8 +7,75 @@ date_time_matcher = re.compile(
 )
 
 
+# epoch of midnight for a "YYYY-MM-DD" + zone suffix, most timestamps in a
+# response share a handful of those
+_day_start_cache = dict()
+DAY_START_CACHE_SIZE = 8
+
+
 def parse_iso(isostr: str) -> int:
     "Parses ISO8601 datetime and returns UTC seconds since `time` epoch."
+    # fixed positions for YYYY-MM-DDTHH:MM:SS(.fff)?(Z|+HH:MM|-HH:MM)?
+    if (
+        len(isostr) >= 19
+        and isostr[4] == "-"
+        and isostr[7] == "-"
+        and isostr[10] == "T"
+        and isostr[13] == ":"
+        and isostr[16] == ":"
+    ):
+        zone_start = 19
+        if len(isostr) > 19 and isostr[19] == ".":
+            zone_start = 20
+            while zone_start < len(isostr) and isostr[zone_start].isdigit():
+                zone_start += 1
+        zone = isostr[zone_start:]
+        day_key = isostr[:10] + zone
+        day_start = _day_start_cache.get(day_key)
+        if day_start is None:
+            day_start = _day_start(isostr, zone)
+            if day_start is not None:
+                if len(_day_start_cache) >= DAY_START_CACHE_SIZE:
+                    _day_start_cache.clear()
+                _day_start_cache[day_key] = day_start
+
+        hour, minute, second = isostr[11:13], isostr[14:16], isostr[17:19]
+        if (
+            day_start is not None
+            and hour.isdigit()
+            and minute.isdigit()
+            and second.isdigit()
+        ):
+            return day_start + int(hour) * 3600 + int(minute) * 60 + int(second)
+    return _parse_iso_regex(isostr)
+
+
+def _day_start(isostr: str, zone: str) -> int | None:
+    "UTC epoch of the local midnight, None if the date or zone look unusual"
+    year, month, day = isostr[0:4], isostr[5:7], isostr[8:10]
+    if not (year.isdigit() and month.isdigit() and day.isdigit()):
+        return None
+
+    if zone in ("", "Z"):
+        offset_seconds = 0
+    elif (
+        len(zone) == 6
+        and zone[0] in "+-"
+        and zone[3] == ":"
+        and zone[1:3].isdigit()
+        and zone[4:6].isdigit()
+    ):
+        offset_seconds = (int(zone[1:3]) * 60 + int(zone[4:6])) * 60
+        if zone[0] == "+":
+            offset_seconds = -offset_seconds
+    else:
+        return None
+    return (
+        time.mktime((int(year), int(month), int(day), 0, 0, 0, 0, 0)) + offset_seconds
+    )
+
+
+def _parse_iso_regex(isostr: str) -> int:
     offset_seconds = 0
     offset_match = zone_matcher.match(isostr)
     if offset_match:
@@ -37,6 +104,7 @@ def parse_iso(isostr: str) -> int:
     epoch_utc_time = epoch_local_time + offset_seconds
     return epoch_utc_time
 
+
 def timedelta_pformat(td: int, now_threshold: int = 30) -> str:
     assert td > 0, "negative time delta not supported"
     # formatted = "in "
@@ -63,12 +131,31 @@ def timedelta_pformat(td: int, now_threshold: int = 30) -> str:
     return formatted
 
 
-def now_epoch() -> int:
+# RTC time of the last NTP sync and the RTC's drift since then in ppm,
+# set from StateCache by clock_sync.py
+_drift = (0, 0.0)
+
+
+def set_drift(synced_at: int, drift_ppm: float):
+    global _drift
+    _drift = (synced_at, drift_ppm)
+
+
+def rtc_epoch() -> int:
+    "What the RTC says, without the drift correction"
     return time.mktime(time.gmtime())
 
 
+def now_epoch() -> int:
+    rtc = rtc_epoch()
+    synced_at, drift_ppm = _drift
+    if synced_at and rtc > synced_at:
+        return rtc - round(drift_ppm * (rtc - synced_at) / 1000000)
+    return rtc
+
+
 def next_full_minute() -> int:
     """calculate next full minute"""
-    (y, m, d, hour, minute, second, _, _) = time.gmtime(now_epoch() + 60)
+    y, m, d, hour, minute, second, _, _ = time.gmtime(now_epoch() + 60)
     second = 0
-    return time.mktime((y, m, d, hour, minute, second, 0, 0))
\ No newline at end of file
+    return time.mktime((y, m, d, hour, minute, second, 0, 0))
@@ -0,0 +1,73 @@
+"""
+Compiled form of the `lines_directions` config rules.
+
+Rules are indexed by line name, direction patterns without regex syntax
+become plain string comparisons, and the result for every (line, direction)
+pair seen is remembered, since the same few pairs repeat all day.
+"""
+
+import re
+
+REGEX_CHARS = "\\.^$*+?{}[]|()"
+MATCH_ALL = ("", ".*")
+
+# remembered (line, direction) results before the memo starts over
+MEMO_LIMIT = 256
+
+
+def _compile_pattern(pattern: str | None):
+    """
+    None matches everything, a str is a literal prefix (re.match semantics),
+    anything else is a compiled regex.
+    """
+    if pattern is None or pattern in MATCH_ALL:
+        return None
+    if any(c in REGEX_CHARS for c in pattern):
+        return re.compile(pattern)
+    return pattern
+
+
+def _matches(matcher, text: str) -> bool:
+    if matcher is None:
+        return True
+    if isinstance(matcher, str):
+        return text.startswith(matcher)
+    return matcher.match(text) is not None
+
+
+class DepartureFilter:
+    def __init__(self, lines_directions: list[dict[str, str]]) -> None:
+        self._rules = dict()
+        for item in lines_directions:
+            except_regex = item.get("except_regex")
+            self._rules.setdefault(item["line_name"], []).append(
+                (
+                    _compile_pattern(item["direction_regex"]),
+                    _compile_pattern(except_regex) if except_regex else False,
+                )
+            )
+        self.line_names = list(self._rules)
+        self._memo = dict()
+
+    def _match(self, rules: list, direction: str) -> bool:
+        for direction_matcher, except_matcher in rules:
+            if not _matches(direction_matcher, direction):
+                continue
+            if except_matcher is not False and _matches(except_matcher, direction):
+                continue
+            return True
+        return False
+
+    def matches(self, line_name: str, direction: str | None) -> bool:
+        rules = self._rules.get(line_name)
+        if rules is None or direction is None:
+            return False
+
+        key = line_name + "\n" + direction
+        result = self._memo.get(key)
+        if result is None:
+            result = self._match(rules, direction)
+            if len(self._memo) >= MEMO_LIMIT:
+                self._memo = dict()
+            self._memo[key] = result
+        return result
@@ -0,0 +1,155 @@
+"""
+Load and persist times of the old JSON cache and the binary StateCache, and
+the flash bytes each would write in a day of minute wakes. RTC memory is a
+stub, so nothing survives between runs. From the repository root with the
+MicroPython unix port, or on the device with `mpremote run`:
+
+    just bench-cache
+
+The simulated day refreshes the clock every minute (so the partial refresh
+counter and frame hash change every loop, which only goes to RTC memory)
+and fetches departures every FETCH_EVERY_MIN, which goes to flash.
+"""
+
+import json
+import os
+import sys
+import time
+
+from cache import StateCache, UIDeparture
+from state_store import RTCStore
+
+ROUNDS = 10
+WAKES_PER_DAY = 24 * 60
+FETCH_EVERY_MIN = 10
+
+TZ_RESPONSE = {
+    "abbreviation": "CET",
+    "client_ip": "192.0.2.1",
+    "datetime": "2024-11-29T10:00:00.123456+01:00",
+    "day_of_week": 5,
+    "day_of_year": 334,
+    "dst": False,
+    "dst_from": None,
+    "dst_offset": 0,
+    "dst_until": None,
+    "raw_offset": 3600,
+    "timezone": "Europe/Berlin",
+    "unixtime": 1732870800,
+    "utc_datetime": "2024-11-29T09:00:00.123456+00:00",
+    "utc_offset": "+01:00",
+    "week_number": 48,
+}
+
+
+class _StubRTC:
+    def __init__(self) -> None:
+        self._memory = b""
+
+    def memory(self, data=None):
+        if data is None:
+            return self._memory
+        self._memory = bytes(data)
+
+
+RTC = RTCStore(_StubRTC())
+
+
+def _departures(start: int) -> list[UIDeparture]:
+    directions = ("Pankow", "Ruhleben", "Hauptbahnhof")
+    return [
+        UIDeparture(
+            "U5" if i % 3 == 2 else "U2",
+            directions[i % 3],
+            start + i * 150,
+            "Alexanderplatz" if i < 6 else "Rosa-Luxemburg-Platz",
+            "900100003" if i < 6 else "900100016",
+        )
+        for i in range(12)
+    ]
+
+
+def _cache(now: int) -> StateCache:
+    return StateCache(
+        now - 600, _departures(now), now, TZ_RESPONSE, "wifi", 3, now + 300, 0, 0.25
+    )
+
+
+def _save_json(cache: StateCache, path: str) -> int:
+    data = json.dumps(cache.to_json_dict())
+    with open(path, "wt") as json_file:
+        json_file.write(data)
+    return len(data)
+
+
+def _load_json(path: str) -> StateCache:
+    with open(path) as json_file:
+        return StateCache.from_json_dict(json.load(json_file))
+
+
+def _time_us(fn, *args) -> int:
+    start = time.ticks_us()
+    for _ in range(ROUNDS):
+        fn(*args)
+    return time.ticks_diff(time.ticks_us(), start) // ROUNDS
+
+
+def _persist_changed(cache: StateCache, path: str) -> int:
+    # mark a field as changed, otherwise perist() skips the write
+    cache.last_tz_response = dict(cache.last_tz_response, unixtime=time.time())
+    return cache.perist(path, RTC)
+
+
+def _persist_rtc(cache: StateCache, path: str) -> int:
+    cache.partial_refreshes_since_full += 1
+    return cache.perist(path, RTC)
+
+
+def _day(json_path: str, bin_path: str) -> tuple[int, int, int]:
+    json_bytes = bin_bytes = bin_writes = 0
+    now = 0
+    cache = _cache(now)
+    for wake in range(WAKES_PER_DAY):
+        now += 60
+        if wake % FETCH_EVERY_MIN == 0:
+            cache.departures = _departures(now)
+            cache.last_departure_update = now
+            cache.next_departure_fetch = now + FETCH_EVERY_MIN * 60
+        cache.partial_refreshes_since_full = (
+            cache.partial_refreshes_since_full + 1
+        ) % 20
+        json_bytes += _save_json(cache, json_path)
+        cache.frame_hash = wake
+        written = cache.perist(bin_path, RTC)
+        bin_bytes += written
+        bin_writes += 1 if written else 0
+    return json_bytes, bin_bytes, bin_writes
+
+
+def main(directory: str):
+    json_path = directory + "/cache_bench.json"
+    bin_path = directory + "/cache_bench.bin"
+    cache = _cache(0)
+    json_size = _save_json(cache, json_path)
+    bin_size = cache.perist(bin_path, RTC)
+    json_load_us = _time_us(_load_json, json_path)
+    json_persist_us = _time_us(_save_json, cache, json_path)
+    bin_load_us = _time_us(StateCache.load_cache, bin_path, RTC)
+    bin_persist_us = _time_us(_persist_changed, cache, bin_path)
+    rtc_persist_us = _time_us(_persist_rtc, cache, bin_path)
+    json_bytes, bin_bytes, bin_writes = _day(json_path, bin_path)
+
+    print(
+        f"  json: {json_size} bytes, load {json_load_us}us, persist {json_persist_us}us"
+    )
+    print(
+        f"binary: {bin_size} bytes, load {bin_load_us}us, persist {bin_persist_us}us,"
+        f" RTC only {rtc_persist_us}us"
+    )
+    print(f"flash written per day: json {json_bytes} bytes in {WAKES_PER_DAY} writes,")
+    print(f"                     binary {bin_bytes} bytes in {bin_writes} writes")
+    os.remove(json_path)
+    os.remove(bin_path)
+
+
+main(sys.argv[1] if len(sys.argv) > 1 else ".")
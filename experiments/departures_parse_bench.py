@@ -0,0 +1,56 @@
+"""
+Peak heap and parse time of json.load vs streaming departures responses.
+
+Record responses from busy stops first, then run with the MicroPython unix
+port from the repository root:
+
+    curl -o /tmp/alex.json "https://v6.vbb.transport.rest/stops/900100003/departures/?duration=180"
+    just bench-parse /tmp/alex.json
+
+Peak heap is sampled after every parsed departure with the collector
+running normally, so it is what the device would need to parse the file.
+"""
+
+import gc
+import json
+import sys
+import time
+
+from json_stream import iter_array_items
+
+
+def _full(path: str) -> tuple[int, int, int]:
+    gc.collect()
+    base = gc.mem_alloc()
+    start = time.ticks_ms()
+    with open(path, "rb") as response:
+        departures = json.load(response)["departures"]
+    peak = gc.mem_alloc() - base
+    count = sum(1 for d in departures if d["line"]["name"])
+    return time.ticks_diff(time.ticks_ms(), start), peak, count
+
+
+def _streaming(path: str) -> tuple[int, int, int]:
+    gc.collect()
+    base = gc.mem_alloc()
+    peak = count = 0
+    start = time.ticks_ms()
+    with open(path, "rb") as response:
+        for departure in iter_array_items(response, "departures"):
+            if departure["line"]["name"]:
+                count += 1
+            peak = max(peak, gc.mem_alloc() - base)
+    return time.ticks_diff(time.ticks_ms(), start), peak, count
+
+
+def main(paths: list[str]):
+    for path in paths:
+        for label, parse in (("json.load", _full), ("streaming", _streaming)):
+            elapsed_ms, peak, count = parse(path)
+            print(
+                f"{path} {label:>9}: {count} departures in {elapsed_ms}ms,"
+                f" peak heap {peak} bytes"
+            )
+
+
+main(sys.argv[1:])
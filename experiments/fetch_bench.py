@@ -0,0 +1,152 @@
+"""
+Latency and peak memory of fetching and filtering departures
+(ui.get_configured_departures) against the local fixture server, once per
+network scenario. Runs on CPython from the repository root:
+
+    just bench-fetch
+
+or for another config, more rounds or concurrent fetches:
+
+    python experiments/fetch_bench.py --config config.json --rounds 50 --concurrency 3
+
+Latency is host wall time per update, with the scenario's network delays
+really waited for. Peak memory is the most an update allocated on top of
+what was there before, as tracemalloc sees it on CPython. It only compares
+scenarios with each other, not with the device heap. The server runs in
+its own process to stay out of that. Failed is the share of updates where a
+stop fell back to cached departures. Reused is the share of requests that
+went out on a kept-alive connection, as http_pool.POOL counts them.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulator import board
+from simulator.device import APP_DIR, Device
+from simulator.fixture_server import DEFAULT_FAULTS, Faults, FixtureServer
+
+FIXTURES_DIR = os.path.join(APP_DIR, "simulator", "fixtures")
+PERCENTILES = (50, 90, 99)
+
+SCENARIOS = {
+    "lan": Faults(5, 100000, False, 0, 0, 0),
+    "typical": DEFAULT_FAULTS,
+    "slow": Faults(800, 256, False, 0, 0, 0),
+    "chunked": DEFAULT_FAULTS._replace(chunked=True),
+    "5xx": DEFAULT_FAULTS._replace(error_rate=0.3),
+    "stalls": DEFAULT_FAULTS._replace(stall_rate=0.3),
+    "truncated": DEFAULT_FAULTS._replace(truncate_rate=0.3),
+}
+
+
+def _percentile(sorted_values: list, percentile: int):
+    index = max(0, -(-len(sorted_values) * percentile // 100) - 1)
+    return sorted_values[index]
+
+
+def _run(config: dict, server: FixtureServer, args) -> tuple[list, list, int, float]:
+    import fetch_scheduler
+    import http_pool
+    import ui
+    from cache import StateCache
+
+    concurrency = args.concurrency or config.get(
+        "fetch_concurrency", min(len(config["stops"]), 3)
+    )
+    cache = StateCache()
+
+    def update():
+        # due now, whatever the last round planned
+        cache.next_departure_fetch = 0
+        ui.get_configured_departures(
+            config["stops"],
+            config["departure_filter"],
+            config["remove_phrases"],
+            cache,
+            config["max_duration_min"],
+            concurrency,
+            args.timeout,
+            fetch_scheduler.policy_from_config(config),
+            server.utc_offset,
+            server.url,
+        )
+
+    # imports the HTTP stack, not counted
+    update()
+    pool = http_pool.POOL
+    requests, reused = pool.requests, pool.reused
+    latencies_ms = []
+    peaks = []
+    failed = 0
+    for _ in range(args.rounds):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        update()
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        # reset by every update without a failed stop
+        if cache.fetch_failures:
+            failed += 1
+    return (
+        latencies_ms,
+        peaks,
+        failed,
+        (pool.reused - reused) / (pool.requests - requests),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--config", default=os.path.join(APP_DIR, "config.example.json")
+    )
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=0)
+    parser.add_argument("--timeout", type=int, default=3)
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    with open(args.config) as config_file:
+        raw_config = json.load(config_file)
+    clock = board.Clock(int(time.time()) - board.DEVICE_EPOCH_OFFSET, realtime=True)
+    flash = tempfile.mkdtemp(prefix="fetch-bench-")
+    device = Device(clock, flash, open(os.devnull, "w"))
+
+    print(
+        f"{'scenario':>10}"
+        + "".join(f"{f'p{p} ms':>9}" for p in PERCENTILES)
+        + f"{'peak kB':>9}{'failed':>8}{'reused':>8}{'sent kB':>9}  injected"
+    )
+    tracemalloc.start()
+    with device.installed():
+        from config import load_config
+
+        for name in args.scenarios:
+            server = FixtureServer(args.fixtures, clock, SCENARIOS[name])
+            server.start_process()
+            try:
+                with open("config.json", "w") as config_file:
+                    json.dump(dict(raw_config, timezone_url=server.url), config_file)
+                latencies_ms, peaks, failed, reused = _run(load_config(), server, args)
+            finally:
+                server.stop()
+            latencies_ms.sort()
+            sys.__stdout__.write(
+                f"{name:>10}"
+                + "".join(f"{_percentile(latencies_ms, p):9.0f}" for p in PERCENTILES)
+                + f"{max(peaks) / 1024:9.0f}{failed / args.rounds:8.0%}{reused:8.0%}"
+                + f"{server.bytes_sent / 1024:9.0f}  {dict(server.injected)}\n"
+            )
+    tracemalloc.stop()
+
+
+main()
@@ -0,0 +1,139 @@
+"""
+Simulates a day of minute wakes against a synthetic timetable and reports
+how often departures get fetched with the old fixed MAX_AGE and with
+fetch_scheduler, and how far off the shown countdowns are. Runs on CPython
+or the MicroPython unix port, from the repository root:
+
+    just sim-fetch-schedule
+
+The timetable has rush hour headways with growing delays, a thin evening
+service, no service at night and a 20 minute API outage in the morning.
+"""
+
+import random
+
+import fetch_scheduler
+from cache import StateCache, UIDeparture
+
+UTC_OFFSET = 60 * 60
+# local midnight, the simulated clock starts here
+DAY_START = 20000 * fetch_scheduler.DAY_SEC - UTC_OFFSET
+WAKE_SEC = 60
+ROWS = 6
+MAX_AGE = 30
+OUTAGE = (8 * 3600, 8 * 3600 + 20 * 60)
+LINES = (("U2", "Pankow"), ("U2", "Ruhleben"), ("U5", "Hauptbahnhof"))
+
+
+def _headway(local_seconds: int) -> int | None:
+    hour = local_seconds // 3600
+    if 1 <= hour < 4:
+        return None
+    if 6 <= hour < 20:
+        return 5 * 60
+    return 15 * 60
+
+
+def _timetable() -> list[tuple[str, str, int]]:
+    departures = []
+    for line, direction in LINES:
+        local = random.randint(0, 5 * 60)
+        while local < fetch_scheduler.DAY_SEC + 3600:
+            headway = _headway(local % fetch_scheduler.DAY_SEC)
+            if headway is None:
+                local += 10 * 60
+                continue
+            departures.append((line, direction, DAY_START + local))
+            local += headway
+    departures.sort(key=lambda d: d[2])
+    return departures
+
+
+def _delay(scheduled: int, now: int) -> int:
+    """
+    Realtime delay as known at `now`. In rush hours trains pick up to 5 min
+    of delay, which shows up bit by bit in the last half hour before they
+    leave.
+    """
+    local_hour = (scheduled - DAY_START) // 3600 % 24
+    if not (7 <= local_hour < 9 or 16 <= local_hour < 19):
+        return 0
+    final_delay = (scheduled * 7919) % 6 * 60
+    known = 30 * 60 - (scheduled - now)
+    if known <= 0:
+        return 0
+    return min(final_delay, final_delay * known // (20 * 60)) // 60 * 60
+
+
+class FakeApi:
+    def __init__(self, timetable) -> None:
+        self.timetable = timetable
+        self.requests = 0
+
+    def true_when(self, scheduled: int, now: int) -> int:
+        return scheduled + _delay(scheduled, now)
+
+    def departures(self, now: int) -> list[UIDeparture]:
+        self.requests += 1
+        if OUTAGE[0] <= now - DAY_START < OUTAGE[1]:
+            raise OSError("simulated outage")
+        upcoming = []
+        for line, direction, scheduled in self.timetable:
+            when = self.true_when(scheduled, now)
+            if now <= when < now + 60 * 60:
+                # the stop name is free here, it keeps the scheduled time
+                upcoming.append(UIDeparture(line, direction, when, scheduled, "1"))
+                if len(upcoming) >= 2 * ROWS:
+                    break
+        return upcoming
+
+
+def _countdown_error(api: FakeApi, shown: list[UIDeparture], now: int) -> int:
+    "Sum of seconds the shown rows are off, compared to what is true at `now`"
+    error = 0
+    for departure in shown[:ROWS]:
+        error += abs(api.true_when(departure.stop, now) - departure.when)
+    return error
+
+
+def simulate(use_scheduler: bool, policy: fetch_scheduler.FetchPolicy):
+    random.seed(1)
+    api = FakeApi(_timetable())
+    cache = StateCache(departures=[])
+    error_seconds = wakes = 0
+    now = DAY_START
+    while now < DAY_START + fetch_scheduler.DAY_SEC:
+        if use_scheduler:
+            due = fetch_scheduler.fetch_due(cache, now)
+        else:
+            due = now - cache.last_departure_update > MAX_AGE
+        if due:
+            try:
+                departures = api.departures(now)
+                if use_scheduler:
+                    fetch_scheduler.record_fetch(cache, departures, now)
+                cache.last_departure_update = now
+            except OSError:
+                fetch_scheduler.record_failure(cache)
+                departures = cache.upcoming_departures(now)
+            cache.departures = departures
+            if use_scheduler:
+                fetch_scheduler.schedule(cache, now, policy, UTC_OFFSET)
+        error_seconds += _countdown_error(api, cache.upcoming_departures(now), now)
+        wakes += 1
+        now += WAKE_SEC
+    return api.requests, error_seconds // wakes
+
+
+def main():
+    policy = fetch_scheduler.policy_from_config({"quiet_hours": ["01:00", "04:30"]})
+    print(f"{fetch_scheduler.DAY_SEC // WAKE_SEC} wakes, {policy}")
+    for label, use_scheduler in (("MAX_AGE", False), ("scheduler", True)):
+        requests, error = simulate(use_scheduler, policy)
+        print(
+            f"{label:>9}: {requests} fetches per day,"
+            f" shown countdowns off by {error} sec per wake on average"
+        )
+
+
+main()
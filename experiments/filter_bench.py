@@ -0,0 +1,101 @@
+"""
+Old per-item rule scan vs the compiled DepartureFilter on recorded responses.
+
+From the repository root, with the MicroPython unix port:
+
+    just bench-filter config.json /tmp/alex.json /tmp/rosa.json
+
+Both variants do what update_departures_from_api needs: decide whether a
+departure is shown and get its departure time. The old one parses 'when'
+twice, the compiled one only parses it for departures that match.
+"""
+
+import json
+import re
+import sys
+import time
+
+import dateutil
+from departure_filter import DepartureFilter
+
+ROUNDS = 5
+
+
+def _old_compile(lines_directions):
+    return [
+        {
+            "line_name": item["line_name"],
+            "direction_regex": re.compile(item["direction_regex"]),
+            "except_regex": (
+                re.compile(item["except_regex"]) if "except_regex" in item else None
+            ),
+        }
+        for item in lines_directions
+    ]
+
+
+def _when(departure) -> int:
+    if departure["when"] is None:
+        return -1
+    return dateutil.parse_iso(departure["when"])
+
+
+def _old_is_relevant(departure, lines_directions, now) -> bool:
+    time_left = _when(departure) - now
+    if time_left < 0:
+        return False
+    for match_config in lines_directions:
+        if departure["line"]["name"] != match_config["line_name"]:
+            continue
+        direction = departure["direction"]
+        if match_config["direction_regex"].match(direction) is None:
+            continue
+        except_regex = match_config["except_regex"]
+        if except_regex and except_regex.match(direction):
+            continue
+        return True
+    return False
+
+
+def _old(departures, rules, now) -> int:
+    return sum(
+        _when(d) - now for d in departures if _old_is_relevant(d, rules, now)
+    )
+
+
+def _new(departures, departure_filter, now) -> int:
+    total = 0
+    for d in departures:
+        if not departure_filter.matches(d["line"]["name"], d["direction"]):
+            continue
+        when = _when(d)
+        if when >= now:
+            total += when - now
+    return total
+
+
+def main(config_path: str, response_paths: list[str]):
+    with open(config_path) as config_file:
+        lines_directions = json.load(config_file)["lines_directions"]
+    departures = []
+    for path in response_paths:
+        with open(path) as response_file:
+            departures.extend(json.load(response_file)["departures"])
+    timestamps = [dateutil.parse_iso(d["when"]) for d in departures if d["when"]]
+    now = min(timestamps) if timestamps else 0
+
+    for label, run, rules in (
+        ("old", _old, _old_compile(lines_directions)),
+        ("compiled", _new, DepartureFilter(lines_directions)),
+    ):
+        start = time.ticks_us()
+        for _ in range(ROUNDS):
+            checksum = run(departures, rules, now)
+        elapsed_us = time.ticks_diff(time.ticks_us(), start) // ROUNDS
+        print(
+            f"{label:>8}: {len(departures)} departures in {elapsed_us // 1000}ms"
+            f" ({elapsed_us // max(len(departures), 1)}us ea), checksum {checksum}"
+        )
+
+
+main(sys.argv[1], sys.argv[2:])
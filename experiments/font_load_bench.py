@@ -0,0 +1,67 @@
+"""
+Compare loading a font dict module with opening a binary font file.
+
+Run on the device after `just make-fonts copy-fonts`, the recipe also copies
+the .py font modules that are otherwise not needed on the device:
+
+    just bench-font-load
+
+"import" is measured with the garbage collector disabled, so the allocated
+bytes are the peak heap needed to get the font ready. "retained" is what
+stays on the heap after a collection, "after text" additionally includes the
+glyphs cached while drawing a typical frame's worth of characters.
+"""
+
+import gc
+import sys
+import time
+
+from framebuf import FrameBuffer, MONO_HMSB
+from simple_bitmap_font import MonoFont
+
+FONTS = ("regular", "condensed")
+SAMPLE_TEXT = "U2 S+U Pankow 12m 1h5m now 0123456789:"
+
+
+def _measure(load) -> tuple[int, int, int, int]:
+    gc.collect()
+    alloc_before = gc.mem_alloc()
+    gc.disable()
+    start = time.ticks_us()
+    font = load()
+    elapsed_us = time.ticks_diff(time.ticks_us(), start)
+    peak = gc.mem_alloc() - alloc_before
+    gc.enable()
+    gc.collect()
+    retained = gc.mem_alloc() - alloc_before
+
+    fb = FrameBuffer(bytearray(1), 1, 1, MONO_HMSB)
+    font.draw_text(fb, SAMPLE_TEXT, MonoFont.OFFSCREEN, MonoFont.OFFSCREEN)
+    gc.collect()
+    after_text = gc.mem_alloc() - alloc_before
+    return elapsed_us, peak, retained, after_text
+
+
+def _load_module(name: str):
+    module_name = "fonts." + name
+    sys.modules.pop(module_name, None)
+    return MonoFont.from_module(__import__(module_name, None, None, ("font_dict",)))
+
+
+def main():
+    for name in FONTS:
+        for label, load in (
+            ("module", lambda: _load_module(name)),
+            ("binary", lambda: MonoFont.from_file(f"/fonts/{name}.bin")),
+        ):
+            elapsed_us, peak, retained, after_text = _measure(load)
+            print(
+                f"{name:>10} {label}: import {elapsed_us // 1000}ms,"
+                f" peak {peak} bytes, retained {retained} bytes,"
+                f" after text {after_text} bytes"
+            )
+            sys.modules.pop("fonts." + name, None)
+            gc.collect()
+
+
+main()
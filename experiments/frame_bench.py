@@ -0,0 +1,127 @@
+"""
+Frame render time with the text run cache off, cold and warm, and with
+retained-mode widgets when only one countdown changed.
+
+Run on the device after `just install copy-fonts`:
+
+    mpremote run experiments/frame_bench.py
+
+The layout mirrors ui.departure_widgets for two stops with three rows each.
+"""
+
+import gc
+import time
+
+from framebuf import FrameBuffer, MONO_HMSB
+from simple_bitmap_font import MonoFont, TextRunCache
+import ui_model
+
+STOPS = {
+    "Alexanderplatz": (
+        ("U2", "Pankow", "now"),
+        ("U5", "Hauptbahnhof", "4m"),
+        ("U2", "Ruhleben", "12m"),
+    ),
+    "Rosa-Luxemburg-Platz": (
+        ("U2", "Pankow", "1m"),
+        ("U2", "Ruhleben", "9m"),
+        ("U2", "Pankow", "1h5m"),
+    ),
+}
+
+
+class _NoCache:
+    def draw_text(self, font, display, text, x, y, transparent=False, align=0):
+        return font.draw_text(display, text, x, y, transparent, align)
+
+
+def _render(runs, display: FrameBuffer, condensed: MonoFont, regular: MonoFont):
+    display.fill(0)
+    y = 5
+    for stop, rows in STOPS.items():
+        runs.draw_text(condensed, display, stop, 0, y)
+        y += condensed._line_height
+        for line, direction, when in rows:
+            runs.draw_text(regular, display, line, 0, y)
+            runs.draw_text(condensed, display, direction, 135, y - 5)
+            runs.draw_text(regular, display, when, 800, y, align=MonoFont.RIGHT)
+            y += 100
+        y += 24
+
+
+def _measure(label: str, runs, display, condensed, regular):
+    gc.collect()
+    start = time.ticks_ms()
+    _render(runs, display, condensed, regular)
+    elapsed = time.ticks_diff(time.ticks_ms(), start)
+    print(f"{label:>5}: {elapsed}ms")
+
+
+def _widgets(stops, condensed: MonoFont, regular: MonoFont) -> list:
+    widgets = []
+    y = 5
+    for stop_index, (stop, rows) in enumerate(stops.items()):
+        widgets.append(
+            ui_model.text_widget(f"{stop_index}", "condensed", condensed, stop, 0, y)
+        )
+        y += condensed._line_height
+        for row, (line, direction, when) in enumerate(rows):
+            key = f"{stop_index}.{row}"
+            when_x = 800 - regular.text_width(when)
+            widgets.extend(
+                (
+                    ui_model.text_widget(key + ".line", "regular", regular, line, 0, y),
+                    ui_model.text_widget(
+                        key + ".direction",
+                        "condensed",
+                        condensed,
+                        direction,
+                        135,
+                        y - 5,
+                    ),
+                    ui_model.text_widget(
+                        key + ".time", "regular", regular, when, when_x, y
+                    ),
+                )
+            )
+            y += 100
+        y += 12
+        widgets.append(ui_model.fill_widget(f"{stop_index}.rule", 0, y, 800, 2))
+        y += 12
+    return widgets
+
+
+def _measure_retained(runs, display, condensed, regular):
+    fonts = {"condensed": condensed, "regular": regular}
+    shown = _widgets(STOPS, condensed, regular)
+    ui_model.render(display, None, shown, fonts, runs, 800, 600)
+
+    stops = dict(STOPS)
+    first_stop = next(iter(stops))
+    stops[first_stop] = (("U2", "Pankow", "1m"),) + stops[first_stop][1:]
+    gc.collect()
+    start = time.ticks_ms()
+    changed = _widgets(stops, condensed, regular)
+    stats = ui_model.render(display, shown, changed, fonts, runs, 800, 600)
+    elapsed = time.ticks_diff(time.ticks_ms(), start)
+    print(
+        f"retained: {elapsed}ms, redrew {stats.drawn} of {stats.widgets}, {stats.rects}"
+    )
+
+
+def main():
+    display = FrameBuffer(bytearray(800 * 600 // 8), 800, 600, MONO_HMSB)
+    condensed = MonoFont.from_file("/fonts/condensed.bin")
+    regular = MonoFont.from_file("/fonts/regular.bin")
+    # fill the glyph caches first, so only the text run cache differs
+    _render(_NoCache(), display, condensed, regular)
+
+    _measure("off", _NoCache(), display, condensed, regular)
+    runs = TextRunCache(budget_bytes=96 * 1024)
+    _measure("cold", runs, display, condensed, regular)
+    _measure("warm", runs, display, condensed, regular)
+    print(runs.stats())
+    _measure_retained(runs, display, condensed, regular)
+
+
+main()
@@ -0,0 +1,75 @@
+"""
+Compare glyph FrameBuffer build time and allocations for both font packings.
+
+Run on the device after `just install copy-fonts`:
+
+    mpremote run experiments/glyph_bench.py
+
+The font module is loaded once and its glyphs are repacked in memory, so
+the same bitmaps are measured in the legacy bitstream and the MONO_HMSB
+row layout regardless of which one the module was generated with.
+"""
+
+import gc
+import time
+
+from font_file import stream_to_hmsb
+from simple_bitmap_font import MonoFont
+
+FONT_MODULE = "fonts.regular"
+
+
+def _hmsb_to_stream(data: bytes, width: int, height: int) -> bytes:
+    bytes_per_row = (width + 7) // 8
+    out = bytearray((width * height + 7) // 8)
+    for y in range(height):
+        for x in range(width):
+            if data[y * bytes_per_row + (x >> 3)] & (1 << (x & 7)):
+                i = y * width + x
+                out[i >> 3] |= 1 << (i & 7)
+    return bytes(out)
+
+
+def _load_glyphs(module_name: str):
+    font_module = __import__(module_name, None, None, ("font_dict",))
+    packing = getattr(font_module, "font_packing", MonoFont.PACKING_STREAM)
+    stream, hmsb = {}, {}
+    for name, (width, height, data) in font_module.font_dict.items():
+        if packing == MonoFont.PACKING_HMSB:
+            hmsb[name] = width, height, data
+            stream[name] = width, height, _hmsb_to_stream(data, width, height)
+        else:
+            stream[name] = width, height, data
+            hmsb[name] = width, height, stream_to_hmsb(data, width, height)
+    return stream, hmsb
+
+
+def _measure(build_char_fb, glyphs: dict) -> tuple[int, int]:
+    keep = []
+    gc.collect()
+    alloc_before = gc.mem_alloc()
+    start = time.ticks_us()
+    for width, height, data in glyphs.values():
+        keep.append(build_char_fb(data, width, height, 1, 0))
+    elapsed_us = time.ticks_diff(time.ticks_us(), start)
+    gc.collect()
+    allocated = gc.mem_alloc() - alloc_before
+    return elapsed_us, allocated
+
+
+def main(module_name: str = FONT_MODULE):
+    stream, hmsb = _load_glyphs(module_name)
+    print(f"{module_name}: {len(stream)} glyphs")
+    for label, build_char_fb, glyphs in (
+        ("stream", MonoFont._draw_char_fb, stream),
+        ("hmsb", MonoFont._wrap_char_fb, hmsb),
+    ):
+        elapsed_us, allocated = _measure(build_char_fb, glyphs)
+        print(
+            f"{label:>6}: build {elapsed_us // 1000}ms"
+            f" ({elapsed_us // len(glyphs)}us ea),"
+            f" retained {allocated} bytes ({allocated // len(glyphs)} ea)"
+        )
+
+
+main()
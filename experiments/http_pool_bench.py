@@ -0,0 +1,34 @@
+"""
+Request the same URL a few times through http_pool and print the pool stats.
+
+Start experiments/keepalive_server.py first, then from the repository root:
+
+    MICROPYPATH=.:~/.micropython/lib micropython experiments/http_pool_bench.py http://127.0.0.1:8080/stops/1/departures/
+
+On the device the URL can also be the real API, to see TLS handshake costs.
+"""
+
+import sys
+
+import http_pool
+from json_stream import iter_array_items
+
+REQUESTS = 10
+
+
+def main(url: str):
+    for _ in range(REQUESTS):
+        response = http_pool.request("GET", url)
+        count = sum(1 for _ in iter_array_items(response.raw, "departures"))
+        response.close()
+        print(f"{response.status_code}: {count} departures")
+    stats = http_pool.POOL.stats()
+    print(stats)
+    latencies = sorted(stats.latencies_ms)
+    print(
+        f"latency min {latencies[0]}ms,"
+        f" median {latencies[len(latencies) // 2]}ms, max {latencies[-1]}ms"
+    )
+
+
+main(sys.argv[1])
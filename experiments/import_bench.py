@@ -0,0 +1,113 @@
+"""
+Import time and heap per module of ui's startup, with the eager imports ui
+had before and with the lazy ones it has now.
+
+Run with the MicroPython unix port from the repository root, one process per
+order so nothing is imported already:
+
+    just bench-imports
+
+Each module is timed on its own, in the order ui imports it, so the numbers
+exclude dependencies loaded by an earlier line. Device-only modules
+(machine, network, the display driver) are skipped on the unix port. Fonts
+are read from fonts/*.bin if `just make-fonts` was run.
+"""
+
+import gc
+import sys
+import time
+
+# everything ui.py loaded before the first loop, before lazy loading
+BEFORE = (
+    "profiler",
+    "binascii",
+    "collections",
+    "json",
+    "machine",
+    "framebuf",
+    "cache",
+    "soldered_inkplate6",
+    "async_fetch",
+    "fetch_scheduler",
+    "http_pool",
+    "transport_api",
+    "timezone_api",
+    "dateutil",
+    "refresh",
+    "ui_model",
+    "json_stream",
+    "query_planner",
+    "netutil",
+    "config",
+    "departure_filter",
+    "stringutil",
+    "simple_bitmap_font",
+)
+
+# what a wake without a fetch loads now
+AFTER = (
+    "profiler",
+    "binascii",
+    "collections",
+    "json",
+    "machine",
+    "framebuf",
+    "cache",
+    "clock_sync",
+    "fetch_scheduler",
+    "timezone_api",
+    "dateutil",
+    "refresh",
+    "ui_model",
+    "config",
+    "departure_filter",
+    "simple_bitmap_font",
+)
+
+FONT_FILES = ("fonts/condensed.bin", "fonts/regular.bin")
+
+
+def _measure(label: str, load) -> tuple[int, int]:
+    gc.collect()
+    mem_before = gc.mem_free()
+    start = time.ticks_us()
+    try:
+        load()
+    except (ImportError, OSError) as e:
+        print(f"{label:>22}: skipped ({e})")
+        return 0, 0
+    elapsed = time.ticks_diff(time.ticks_us(), start)
+    gc.collect()
+    used = mem_before - gc.mem_free()
+    print(f"{label:>22}: {elapsed:>7}us {used:>7}B")
+    return elapsed, used
+
+
+def _load_fonts():
+    from simple_bitmap_font import MonoFont
+
+    return [
+        MonoFont.from_file(path, preload_chars=False, cache_budget_bytes=24 * 1024)
+        for path in FONT_FILES
+    ]
+
+
+def main():
+    order = sys.argv[1] if len(sys.argv) > 1 else "after"
+    modules = BEFORE if order == "before" else AFTER
+    print(f"--- {order}")
+    total_us = total_bytes = 0
+    loaded = []
+    for name in modules:
+        elapsed, used = _measure(name, lambda: __import__(name))
+        total_us += elapsed
+        total_bytes += used
+    if order == "before":
+        # kept alive, as ui kept them in module globals
+        elapsed, used = _measure("fonts", lambda: loaded.extend(_load_fonts()))
+        total_us += elapsed
+        total_bytes += used
+    print(f"{'total':>22}: {total_us:>7}us {total_bytes:>7}B")
+
+
+main()
@@ -0,0 +1,93 @@
+"""
+Checks the fixed-position parse_iso against the old regex parser on a corpus
+of timestamp shapes, then times both. From the repository root:
+
+    just bench-iso
+
+Pass recorded departures responses to also time them on real 'when' values:
+
+    just bench-iso /tmp/alex.json /tmp/rosa.json
+"""
+
+import json
+import sys
+import time
+
+import dateutil
+
+ROUNDS = 5
+
+CORPUS = [
+    "2024-11-29T10:00:00+01:00",
+    "2024-11-29T23:59:59+01:00",
+    "2024-11-30T00:00:00+01:00",
+    "2024-03-31T01:59:00+01:00",
+    "2024-03-31T03:01:00+02:00",
+    "2024-10-27T02:30:00+02:00",
+    "2024-10-27T02:30:00+01:00",
+    "2024-12-31T23:30:00-05:30",
+    "2025-01-01T00:15:00+05:45",
+    "2024-02-29T12:00:00Z",
+    "2024-11-29T10:00:00",
+    "2024-11-29T10:00:00.5+01:00",
+    "2024-11-29T10:00:00.123456Z",
+    "2024-11-29T10:00:00.000-03:00",
+    # shapes the fast path hands over to the regex parser
+    "2024-11-29T10:00:00+0100",
+    "2024-11-29T10:00:00 +01:00",
+    "2024-11-29T10:00",
+]
+
+
+def _result(parse, isostr: str):
+    try:
+        return parse(isostr)
+    except Exception as e:
+        return type(e).__name__
+
+
+def _check() -> int:
+    failures = 0
+    for isostr in CORPUS:
+        expected = _result(dateutil._parse_iso_regex, isostr)
+        # twice, so the cached day start is checked as well
+        for _ in range(2):
+            actual = _result(dateutil.parse_iso, isostr)
+            if actual != expected:
+                failures += 1
+                print(f"MISMATCH {isostr}: {actual} != {expected}")
+    print(f"{len(CORPUS)} timestamps checked, {failures} mismatches")
+    return failures
+
+
+def _time(label: str, parse, timestamps: list[str]):
+    start = time.ticks_us()
+    for _ in range(ROUNDS):
+        for isostr in timestamps:
+            parse(isostr)
+    elapsed_us = time.ticks_diff(time.ticks_us(), start) // ROUNDS
+    print(
+        f"{label:>6}: {len(timestamps)} timestamps in {elapsed_us // 1000}ms"
+        f" ({elapsed_us // max(len(timestamps), 1)}us ea)"
+    )
+
+
+def main(response_paths: list[str]):
+    if _check():
+        sys.exit(1)
+
+    timestamps = []
+    for path in response_paths:
+        with open(path) as response_file:
+            departures = json.load(response_file)["departures"]
+        timestamps.extend(d["when"] for d in departures if d["when"])
+    if not timestamps:
+        timestamps = CORPUS[:14] * 20
+    for label, parse in (
+        ("regex", dateutil._parse_iso_regex),
+        ("fast", dateutil.parse_iso),
+    ):
+        _time(label, parse, timestamps)
+
+
+main(sys.argv[1:])
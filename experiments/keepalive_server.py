@@ -0,0 +1,76 @@
+"""
+Local keep-alive HTTP/1.1 stand-in for the departures API, for trying out
+http_pool without hitting the public API. Runs on CPython:
+
+    python experiments/keepalive_server.py --port 8080 --response /tmp/alex.json
+
+Every GET returns the recorded response, alternating between Content-Length
+and chunked bodies. Connections are counted, so comparing them with the
+pool's handshake count shows whether connections were reused.
+"""
+
+import argparse
+import http.server
+import json
+
+DEFAULT_RESPONSE = {
+    "departures": [
+        {
+            "line": {"name": "U2"},
+            "direction": "S+U Pankow",
+            "when": "2024-11-29T10:00:00+01:00",
+            "stop": {"name": "S+U Alexanderplatz (Berlin)"},
+        }
+    ]
+}
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    body = json.dumps(DEFAULT_RESPONSE).encode()
+    connections = 0
+    requests = 0
+
+    def setup(self):
+        super().setup()
+        KeepAliveHandler.connections += 1
+
+    def do_GET(self):
+        KeepAliveHandler.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if self.requests % 2:
+            self.send_header("Content-Length", str(len(self.body)))
+            self.end_headers()
+            self.wfile.write(self.body)
+        else:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(self.body), 1000):
+                chunk = self.body[start : start + 1000]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        print(
+            f"connections: {self.connections}, requests: {self.requests},",
+            format % args,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--response", help="recorded departures response (JSON)")
+    args = parser.parse_args()
+    if args.response:
+        with open(args.response, "rb") as response_file:
+            KeepAliveHandler.body = response_file.read()
+
+    server = http.server.ThreadingHTTPServer(("", args.port), KeepAliveHandler)
+    print(f"serving on port {args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Summarise the profile ring buffer written by profiler.py. Runs on CPython:
+
+    just profile-dump
+
+which copies /profile.bin off the device first, or for a file copied
+earlier:
+
+    PYTHONPATH=. python experiments/profile_dump.py /tmp/profile.bin --cycles
+
+Prints percentiles of every span's duration and heap use, `--cycles` also
+prints the spans of each cycle.
+"""
+
+import argparse
+import time
+
+import profiler
+
+PERCENTILES = (50, 90, 99)
+# MicroPython on the ESP32 counts seconds from 2000-01-01
+DEVICE_EPOCH_OFFSET = 946684800
+# tags of the wifi span, netutil.FAILED, DIRECT and SCANNED
+WIFI_METHODS = ("failed", "direct", "scanned")
+
+
+def _percentile(sorted_values: list, percentile: int):
+    index = max(0, -(-len(sorted_values) * percentile // 100) - 1)
+    return sorted_values[index]
+
+
+def _span_label(name: str, tag: int) -> str:
+    if name == "fetch_stop":
+        return f"{name}[{tag}]"
+    if name == "wifi":
+        return f"{name}[{WIFI_METHODS[tag]}]"
+    return name
+
+
+def print_cycles(cycles):
+    for epoch, spans in cycles:
+        utc = time.gmtime(epoch + DEVICE_EPOCH_OFFSET)
+        print(time.strftime("%Y-%m-%d %H:%M:%S UTC", utc))
+        for name, tag, elapsed_us, mem_before, mem_after in spans:
+            print(
+                f"  {_span_label(name, tag):<14} {elapsed_us / 1000:>9.1f}ms"
+                f"  free {mem_before:>8} -> {mem_after:>8}"
+            )
+
+
+def print_summary(cycles):
+    durations = dict()
+    heap_used = dict()
+    for _, spans in cycles:
+        for name, tag, elapsed_us, mem_before, mem_after in spans:
+            label = _span_label(name, tag)
+            durations.setdefault(label, []).append(elapsed_us / 1000)
+            if mem_before >= 0 and mem_after >= 0:
+                heap_used.setdefault(label, []).append(mem_before - mem_after)
+
+    header = "".join(f"{'p' + str(p):>9}" for p in PERCENTILES)
+    print(f"{len(cycles)} cycles, durations in ms, heap used in bytes")
+    print(f"{'span':<14} {'count':>5}{header}{'max':>9}  heap used p50/max")
+    for label in sorted(durations, key=lambda l: -max(durations[l])):
+        values = sorted(durations[label])
+        row = "".join(f"{_percentile(values, p):>9.1f}" for p in PERCENTILES)
+        heap = sorted(heap_used.get(label, []))
+        heap_text = f"{_percentile(heap, 50)}/{heap[-1]}" if heap else "-"
+        print(f"{label:<14} {len(values):>5}{row}{values[-1]:>9.1f}  {heap_text}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="profile ring buffer copied from the device")
+    parser.add_argument("--cycles", action="store_true", help="print every cycle")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as profile_file:
+        cycles = profiler.read_cycles(profile_file.read())
+    if args.cycles:
+        print_cycles(cycles)
+    print_summary(cycles)
+
+
+if __name__ == "__main__":
+    main()
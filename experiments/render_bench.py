@@ -0,0 +1,303 @@
+"""
+Rendering and layout timings on CPython: building glyphs, drawing text with
+cold and warm glyph caches, measuring text, and laying out and rendering
+whole frames for 1 to 4 stops. Runs from the repository root:
+
+    just bench-render --json /tmp/render.json
+
+and after a font or layout change, against the saved numbers:
+
+    just bench-render --compare /tmp/render.json
+
+The app runs on the simulator's stand-ins, framebuf included, so the times
+say how two versions of the code compare and not how fast the device is.
+Times are CPU time of a call, the median and the fastest of --rounds
+rounds. Every case is then run once more under
+tracemalloc, "peak" is the most it allocated at once and "kept" what was
+still allocated after it. Compare goes by the fastest round, which is less
+noisy than the median, and exits with 1 when a case got slower or
+allocates more than --threshold.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulator import board
+from simulator.device import APP_DIR, Device
+
+FONTS = ("condensed", "regular")
+STOP_NAMES = (
+    "S+U Alexanderplatz",
+    "Rosa-Luxemburg-Platz",
+    "U Senefelderplatz",
+    "S Hackescher Markt",
+)
+LINES = (
+    ("U2", "S+U Pankow"),
+    ("U5", "S+U Hauptbahnhof"),
+    ("M2", "Am Kupfergraben"),
+    ("S42", "Ringbahn S 42"),
+    ("N2", "U Ruhleben über S+U Zoologischer Garten"),
+    ("M48", "Busseallee"),
+)
+SAMPLE_TEXTS = (
+    STOP_NAMES
+    + tuple(line for line, _ in LINES)
+    + tuple(direction for _, direction in LINES)
+    + ("now", "4m", "12m", "1h5m", "23:59")
+)
+NOW = 778000000
+# what ui.TEXT_RUNS gets
+RUNS_BUDGET_BYTES = 96 * 1024
+# short cases are called repeatedly for a round to take at least this long
+MIN_ROUND_US = 20000
+# bytes that are noise, not a regression
+MIN_BYTES_CHANGE = 1024
+
+
+def _hmsb_to_stream(data: bytes, width: int, height: int) -> bytes:
+    bytes_per_row = (width + 7) // 8
+    out = bytearray((width * height + 7) // 8)
+    for y in range(height):
+        for x in range(width):
+            if data[y * bytes_per_row + (x >> 3)] & (1 << (x & 7)):
+                i = y * width + x
+                out[i >> 3] |= 1 << (i & 7)
+    return bytes(out)
+
+
+def _departures(stops: int, now: int) -> dict:
+    from cache import UIDeparture
+
+    return {
+        name: [
+            UIDeparture(line, direction, now + 60 * (1 + 4 * row + stop), name, name)
+            for row, (line, direction) in enumerate(LINES)
+        ]
+        for stop, name in enumerate(STOP_NAMES[:stops])
+    }
+
+
+def _cases() -> dict:
+    """
+    Case name -> setup, the setup prepares a round outside the timing and
+    returns the function that is timed
+    """
+    from simple_bitmap_font import MonoFont, TextRunCache
+    import ui
+    import ui_model
+
+    chars = sorted(set("".join(SAMPLE_TEXTS)))
+    cases = dict()
+
+    def fresh_font(name):
+        ui.FONTS.pop(name, None)
+        return ui.font(name)
+
+    for name in FONTS:
+        font = fresh_font(name)
+        hmsb = [font._font_dict.get(c) or font._unknown_char for c in chars]
+        stream = [(w, h, _hmsb_to_stream(data, w, h)) for w, h, data in hmsb]
+
+        def build(glyphs, build_char_fb):
+            return lambda: lambda: [
+                build_char_fb(data, w, h, 1, 0) for w, h, data in glyphs
+            ]
+
+        cases[f"glyph_build_hmsb.{name}"] = build(hmsb, MonoFont._wrap_char_fb)
+        cases[f"glyph_build_stream.{name}"] = build(stream, MonoFont._draw_char_fb)
+
+        def draw(font):
+            return lambda: [
+                font.draw_text(ui.FRAME_FB, text, 0, 0) for text in SAMPLE_TEXTS
+            ]
+
+        cases[f"draw_cold.{name}"] = lambda name=name: draw(fresh_font(name))
+
+        def warm(name=name):
+            run = draw(ui.font(name))
+            run()
+            return run
+
+        cases[f"draw_warm.{name}"] = warm
+
+        def measure(name=name):
+            font = ui.font(name)
+            return lambda: [
+                (font.text_width(text), font.truncate_text(text, 300))
+                for text in SAMPLE_TEXTS
+            ]
+
+        cases[f"text_width.{name}"] = measure
+
+    for stops in range(1, 5):
+        departures = _departures(stops, NOW)
+
+        def layout(departures=departures):
+            return lambda: ui.departure_widgets(departures, NOW)
+
+        def frame(departures=departures, warm_runs=False, previous_at=None):
+            def render(previous, now, runs):
+                widgets = ui.departure_widgets(departures, now)
+                ui_model.render(
+                    ui.FRAME_FB, previous, widgets, ui.FONTS, runs, 800, 600
+                )
+                return widgets
+
+            # the same glyphs cached whatever ran before
+            render(None, NOW, TextRunCache(RUNS_BUDGET_BYTES))
+            runs = TextRunCache(RUNS_BUDGET_BYTES)
+            if warm_runs:
+                render(None, NOW, runs)
+            previous = None
+            if previous_at is not None:
+                previous = render(None, previous_at, runs)
+            return lambda: render(previous, NOW, runs)
+
+        cases[f"layout.{stops}_stops"] = layout
+        cases[f"frame_cold.{stops}_stops"] = frame
+        cases[f"frame_warm.{stops}_stops"] = lambda departures=departures: frame(
+            departures, True
+        )
+        # a minute later, only the countdowns are drawn again
+        cases[f"frame_tick.{stops}_stops"] = lambda departures=departures: frame(
+            departures, True, NOW - 60
+        )
+    return cases
+
+
+def _time_us(setup, calls: int) -> float:
+    "CPU time of one call, other processes do not count"
+    total_ns = 0
+    for _ in range(calls):
+        run = setup()
+        start = time.thread_time_ns()
+        run()
+        total_ns += time.thread_time_ns() - start
+    return total_ns / calls / 1000
+
+
+def _measure(cases: dict, rounds: int) -> dict:
+    """
+    The rounds take turns between the cases, so a stretch where the host is
+    slower does not land on just a few of them
+    """
+    calls = {
+        name: max(1, int(MIN_ROUND_US // max(_time_us(setup, 1), 1)))
+        for name, setup in cases.items()
+    }
+    times_us = {name: [] for name in cases}
+    for _ in range(rounds):
+        for name, setup in cases.items():
+            times_us[name].append(_time_us(setup, calls[name]))
+
+    results = dict()
+    for name, setup in cases.items():
+        run = setup()
+        tracemalloc.start()
+        result = run()
+        kept, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+        times = sorted(times_us[name])
+        results[name] = {
+            "median_us": round(times[len(times) // 2], 1),
+            "min_us": round(times[0], 1),
+            "peak_bytes": peak,
+            "kept_bytes": kept,
+        }
+    return results
+
+
+def _regressions(baseline: dict, results: dict, threshold: float) -> list[str]:
+    print(f"{'case':>30}{'min us was':>12}{'now':>10}{'change':>8}{'peak kB':>14}")
+    regressed = []
+    for name, now in results.items():
+        was = baseline.get(name)
+        if was is None:
+            print(f"{name:>30}{'':>12}{now['min_us']:10.0f}{'new':>8}")
+            continue
+        change = now["min_us"] / was["min_us"] - 1
+        bytes_change = now["peak_bytes"] - was["peak_bytes"]
+        slower = change > threshold
+        bigger = bytes_change > MIN_BYTES_CHANGE and now["peak_bytes"] > was[
+            "peak_bytes"
+        ] * (1 + threshold)
+        if slower or bigger:
+            regressed.append(name)
+        print(
+            f"{name:>30}{was['min_us']:12.0f}{now['min_us']:10.0f}"
+            f"{change:+8.0%}"
+            f"{was['peak_bytes'] / 1024:7.0f}>{now['peak_bytes'] / 1024:<6.0f}"
+            + ("  slower" if slower else "")
+            + ("  more memory" if bigger else "")
+        )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fonts", default=os.path.join(APP_DIR, "fonts"))
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--json", help="save the results here")
+    parser.add_argument("--compare", help="results saved with --json before")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("cases", nargs="*", help="only cases starting with these")
+    args = parser.parse_args()
+
+    flash = tempfile.mkdtemp(prefix="render-bench-")
+    os.makedirs(os.path.join(flash, "fonts"))
+    for name in FONTS:
+        font_path = os.path.join(args.fonts, name + ".bin")
+        if not os.path.exists(font_path):
+            sys.exit(f"{font_path} is missing, run `just make-fonts` or pass --fonts")
+        shutil.copy(font_path, os.path.join(flash, "fonts"))
+    device = Device(board.Clock(NOW), flash, open(os.devnull, "w"))
+
+    with device.installed():
+        cases = {
+            name: setup
+            for name, setup in _cases().items()
+            if not args.cases or name.startswith(tuple(args.cases))
+        }
+        results = _measure(cases, args.rounds)
+    shutil.rmtree(flash)
+    if not args.compare:
+        for name, result in results.items():
+            print(
+                f"{name:>30}: median {result['median_us']:9.0f}us"
+                f" min {result['min_us']:9.0f}us"
+                f" peak {result['peak_bytes'] / 1024:6.1f}kB"
+                f" kept {result['kept_bytes'] / 1024:6.1f}kB"
+            )
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "rounds": args.rounds,
+                    "results": results,
+                },
+                json_file,
+                indent=2,
+            )
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressed = _regressions(baseline, results, args.threshold)
+        if regressed:
+            sys.exit(f"{len(regressed)} cases regressed: {', '.join(regressed)}")
+
+
+main()
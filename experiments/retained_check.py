@@ -0,0 +1,144 @@
+"""
+Checks that redrawing only the changed widgets gives the same frame as
+drawing everything, on CPython. Lays out 1 to 4 stops for every minute of
+--minutes and renders each frame both ways, from the repository root:
+
+    just check-retained
+
+Exits with 1 and prints where they differ if they do.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulator import board
+from simulator.device import APP_DIR, Device
+
+FONTS = ("condensed", "regular")
+STOP_NAMES = (
+    "S+U Alexanderplatz",
+    "Rosa-Luxemburg-Platz",
+    "U Senefelderplatz",
+    "S Hackescher Markt",
+)
+# directions long enough to be truncated, more when the countdown is wider
+LINES = (
+    ("U2", "S+U Pankow über Senefelderplatz und Eberswalder Straße"),
+    ("U5", "S+U Hauptbahnhof"),
+    ("M2", "Am Kupfergraben über Hackescher Markt und Oranienburger Tor"),
+    ("S42", "Ringbahn S 42"),
+    ("N2", "U Ruhleben über S+U Zoologischer Garten"),
+    ("M48", "Busseallee"),
+)
+NOW = 778000000
+RUNS_BUDGET_BYTES = 96 * 1024
+
+
+def _departures(stops: int) -> dict:
+    from cache import UIDeparture
+
+    # every row leaves a few minutes after the one before, at every stop
+    # another minute later
+    return {
+        name: [
+            UIDeparture(
+                line, direction, NOW + 60 * (1 + 3 * row + stop) + 30, name, name
+            )
+            for row, (line, direction) in enumerate(LINES * 3)
+        ]
+        for stop, name in enumerate(STOP_NAMES[:stops])
+    }
+
+
+def _diff(a: bytes, b: bytes, width: int) -> tuple[int, tuple | None]:
+    "Differing pixels and their bounding box"
+    pixels = 0
+    x1 = y1 = x2 = y2 = None
+    for i, (byte_a, byte_b) in enumerate(zip(a, b)):
+        changed = byte_a ^ byte_b
+        if not changed:
+            continue
+        y, x = divmod(i * 8, width)
+        pixels += bin(changed).count("1")
+        x1 = x if x1 is None else min(x1, x)
+        y1 = y if y1 is None else min(y1, y)
+        x2 = x + 8 if x2 is None else max(x2, x + 8)
+        y2 = y + 1 if y2 is None else max(y2, y + 1)
+    return pixels, None if pixels == 0 else (x1, y1, x2 - x1, y2 - y1)
+
+
+def _check(stops: int, minutes: int) -> list[str]:
+    "Where the frames differ, one line per minute"
+    from framebuf import FrameBuffer, MONO_HMSB
+    from simple_bitmap_font import TextRunCache
+    import refresh
+    import ui
+    import ui_model
+
+    departures = _departures(stops)
+    retained = bytearray(refresh.FRAME_BYTES)
+    retained_fb = FrameBuffer(retained, refresh.WIDTH, refresh.HEIGHT, MONO_HMSB)
+    full = bytearray(refresh.FRAME_BYTES)
+    full_fb = FrameBuffer(full, refresh.WIDTH, refresh.HEIGHT, MONO_HMSB)
+    retained_runs = TextRunCache(RUNS_BUDGET_BYTES)
+    full_runs = TextRunCache(RUNS_BUDGET_BYTES)
+
+    failures = []
+    previous = None
+    for minute in range(minutes):
+        widgets = ui.departure_widgets(departures, NOW + 60 * minute)
+        stats = ui_model.render(
+            retained_fb,
+            previous,
+            widgets,
+            ui.FONTS,
+            retained_runs,
+            refresh.WIDTH,
+            refresh.HEIGHT,
+        )
+        ui_model.render(
+            full_fb, None, widgets, ui.FONTS, full_runs, refresh.WIDTH, refresh.HEIGHT
+        )
+        pixels, box = _diff(retained, full, refresh.WIDTH)
+        if pixels:
+            failures.append(
+                f"{stops} stops, minute {minute}: {pixels} pixels differ in {box},"
+                f" redrew {stats.drawn} of {stats.widgets} widgets"
+            )
+        previous = widgets
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fonts", default=os.path.join(APP_DIR, "fonts"))
+    parser.add_argument("--minutes", type=int, default=30)
+    args = parser.parse_args()
+
+    flash = tempfile.mkdtemp(prefix="retained-check-")
+    os.makedirs(os.path.join(flash, "fonts"))
+    for name in FONTS:
+        font_path = os.path.join(args.fonts, name + ".bin")
+        if not os.path.exists(font_path):
+            sys.exit(f"{font_path} is missing, run `just make-fonts` or pass --fonts")
+        shutil.copy(font_path, os.path.join(flash, "fonts"))
+    device = Device(board.Clock(NOW), flash, open(os.devnull, "w"))
+
+    failures = []
+    # the app's output goes to the device log
+    with device.installed():
+        for stops in range(1, len(STOP_NAMES) + 1):
+            failures += _check(stops, args.minutes)
+    shutil.rmtree(flash)
+    if failures:
+        print("\n".join(failures))
+        sys.exit(f"{len(failures)} frames differ from a full redraw")
+    print(f"1 to {len(STOP_NAMES)} stops, {args.minutes} minutes: all frames match")
+
+
+main()
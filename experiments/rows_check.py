@@ -0,0 +1,125 @@
+"""
+Checks that fetching fills every screen row the fixture has departures
+for, with filters that keep many or few of the departures a query gets.
+Fetches (ui.get_configured_departures) from the local fixture server every
+10 minutes of a day, on CPython from the repository root:
+
+    just check-rows
+
+Exits with 1 and prints the stops that got fewer departures than they
+could show if that happens.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from simulator import board
+from simulator.device import APP_DIR, Device
+from simulator.fixture_server import DEFAULT_FAULTS, FixtureServer
+
+FIXTURES_DIR = os.path.join(APP_DIR, "simulator", "fixtures")
+START = 786076200
+STEP_SEC = 10 * 60
+# lines_directions per case, for the Alexanderplatz fixture
+CASES = {
+    "example": None,
+    # 1 in 10 of the subway and tram departures match
+    "selective": [
+        {"line_name": "U2", "direction_regex": "S\\+U Pankow"},
+        {"line_name": "M4", "direction_regex": "Nowhere"},
+    ],
+}
+
+
+def _check(config: dict, server: FixtureServer, clock: board.Clock) -> list[str]:
+    "The stops that got too few departures, one line per fetch"
+    import fetch_scheduler
+    import ui
+    from cache import StateCache
+
+    departure_filter = config["departure_filter"]
+    rows = ui.DEPARTURE_ROWS // len(config["stops"])
+    cache = StateCache()
+    short = []
+    for _ in range(24 * 60 * 60 // STEP_SEC):
+        cache.next_departure_fetch = 0
+        departures = ui.get_configured_departures(
+            config["stops"],
+            departure_filter,
+            config["remove_phrases"],
+            cache,
+            config["max_duration_min"],
+            1,
+            10,
+            fetch_scheduler.policy_from_config(config),
+            server.utc_offset,
+            server.url,
+        )
+        now = clock.now()
+        for stop_id in config["stops"]:
+            response = server.departures(
+                stop_id, {"duration": str(config["max_duration_min"])}
+            )
+            available = sum(
+                1
+                for d in response["departures"]
+                if ui._relevant_when(d, departure_filter, now) is not None
+            )
+            got = sum(
+                1 for stop in departures.values() for d in stop if d.stop_id == stop_id
+            )
+            if got < min(rows, available):
+                short.append(
+                    f"{stop_id} at {now}: {got} of {min(rows, available)} rows,"
+                    f" {available} departures match"
+                )
+        clock.advance_ms(STEP_SEC * 1000)
+    return short
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--config", default=os.path.join(APP_DIR, "config.example.json")
+    )
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    args = parser.parse_args()
+
+    with open(args.config) as config_file:
+        raw_config = json.load(config_file)
+    flash = tempfile.mkdtemp(prefix="rows-check-")
+    failures = []
+    for name, lines_directions in CASES.items():
+        clock = board.Clock(START)
+        server = FixtureServer(
+            args.fixtures, clock, DEFAULT_FAULTS._replace(latency_ms=0)
+        )
+        server.start()
+        device = Device(clock, flash, open(os.devnull, "w"))
+        case_config = dict(raw_config, timezone_url=server.url + "/api/ip")
+        if lines_directions is not None:
+            case_config["lines_directions"] = lines_directions
+        try:
+            with device.installed():
+                from config import load_config
+
+                with open("config.json", "w") as config_file:
+                    json.dump(case_config, config_file)
+                short = _check(load_config(), server, clock)
+        finally:
+            server.stop()
+        print(f"{name:>10}: {len(short)} fetches short of rows")
+        failures += [f"{name}: {line}" for line in short]
+    shutil.rmtree(flash)
+    if failures:
+        print("\n".join(failures[:20]))
+        sys.exit(f"{len(failures)} fetches left rows empty")
+
+
+main()
@@ -0,0 +1,147 @@
+"""
+Decides when departures should be fetched next.
+
+The device wakes every minute, but the countdowns are computed from absolute
+departure times, so fetching is only needed to pick up delays and new
+departures. Departures close by and responses that keep changing call for
+frequent fetches, far away ones and quiet hours for rare ones, failures back
+off. The decision is kept in StateCache, wakes before it don't need Wi-Fi.
+"""
+
+import collections
+
+from cache import StateCache, UIDeparture
+
+FetchPolicy = collections.namedtuple(
+    "FetchPolicy", ("min_interval", "max_interval", "max_backoff", "quiet_hours")
+)
+
+DEFAULT_MIN_INTERVAL_SEC = 60
+DEFAULT_MAX_INTERVAL_SEC = 15 * 60
+DEFAULT_MAX_BACKOFF_SEC = 30 * 60
+
+# with changing responses, fetch again after a third of the time until the
+# nearest departure
+PROXIMITY_DIVISOR = 3
+# a departure moved by at least this much between two responses counts as changed
+CHANGED_SEC = 60
+# weight of the latest response in the volatility average
+VOLATILITY_WEIGHT = 0.5
+# wakes happen shortly before the full minute, fetch if one is due by then
+FETCH_EARLY_SEC = 30
+
+DAY_SEC = 24 * 60 * 60
+
+
+def _seconds_of_day(hh_mm: str) -> int:
+    hours, minutes = hh_mm.split(":")
+    return (int(hours) * 60 + int(minutes)) * 60
+
+
+def policy_from_config(config: dict) -> FetchPolicy:
+    quiet_hours = config.get("quiet_hours")
+    return FetchPolicy(
+        config.get("fetch_min_interval_sec", DEFAULT_MIN_INTERVAL_SEC),
+        config.get("fetch_max_interval_sec", DEFAULT_MAX_INTERVAL_SEC),
+        config.get("fetch_max_backoff_sec", DEFAULT_MAX_BACKOFF_SEC),
+        (
+            (_seconds_of_day(quiet_hours[0]), _seconds_of_day(quiet_hours[1]))
+            if quiet_hours
+            else None
+        ),
+    )
+
+
+def fetch_due(cache: StateCache, now: int) -> bool:
+    return now + FETCH_EARLY_SEC >= cache.next_departure_fetch
+
+
+def volatility(previous: list[UIDeparture], departures: list[UIDeparture]) -> float:
+    "Fraction of departures that moved since the previous response"
+    previous_whens = dict()
+    for d in previous:
+        previous_whens.setdefault((d.stop_id, d.line_name, d.direction), []).append(
+            d.when
+        )
+    compared = changed = 0
+    for d in departures:
+        whens = previous_whens.get((d.stop_id, d.line_name, d.direction))
+        if not whens:
+            continue
+        closest = min(whens, key=lambda when: abs(when - d.when))
+        whens.remove(closest)
+        compared += 1
+        if abs(closest - d.when) >= CHANGED_SEC:
+            changed += 1
+    return changed / compared if compared else 0.0
+
+
+def record_fetch(
+    cache: StateCache, departures: list[UIDeparture], now: int, ok: bool = True
+):
+    "Updates the volatility and failure count after fetching `departures`"
+    sample = volatility(cache.upcoming_departures(now), departures)
+    cache.departure_volatility = (
+        1 - VOLATILITY_WEIGHT
+    ) * cache.departure_volatility + VOLATILITY_WEIGHT * sample
+    cache.fetch_failures = 0 if ok else cache.fetch_failures + 1
+
+
+def record_failure(cache: StateCache):
+    cache.fetch_failures += 1
+
+
+def _in_quiet_hours(local_seconds: int, quiet_hours: tuple[int, int]) -> bool:
+    start, end = quiet_hours
+    if start <= end:
+        return start <= local_seconds < end
+    return local_seconds >= start or local_seconds < end
+
+
+def next_fetch_at(
+    now: int,
+    departures: list[UIDeparture],
+    failures: int,
+    departure_volatility: float,
+    policy: FetchPolicy,
+    utc_offset_seconds: int = 0,
+) -> int:
+    if failures:
+        interval = min(policy.min_interval * 2**failures, policy.max_backoff)
+    else:
+        times_left = sorted(d.when - now for d in departures if d.when >= now)
+        if times_left:
+            # delays of the nearest departure matter soonest, but only if the
+            # responses have been changing, otherwise refill before the
+            # screen runs short (twice what fits on screen is cached)
+            settle = times_left[0] // PROXIMITY_DIVISOR
+            refill = times_left[len(times_left) // 2]
+            interval = min(
+                refill,
+                settle + int((1 - departure_volatility) ** 2 * policy.max_interval),
+            )
+        else:
+            interval = policy.max_interval
+        interval = max(policy.min_interval, min(interval, policy.max_interval))
+
+    at = now + interval
+    if policy.quiet_hours is not None:
+        local_seconds = (at + utc_offset_seconds) % DAY_SEC
+        if _in_quiet_hours(local_seconds, policy.quiet_hours):
+            at += (policy.quiet_hours[1] - local_seconds) % DAY_SEC
+    return at
+
+
+def schedule(
+    cache: StateCache, now: int, policy: FetchPolicy, utc_offset_seconds: int = 0
+) -> int:
+    "Stores the next fetch time in `cache` and returns the seconds until then"
+    cache.next_departure_fetch = next_fetch_at(
+        now,
+        cache.departures,
+        cache.fetch_failures,
+        cache.departure_volatility,
+        policy,
+        utc_offset_seconds,
+    )
+    return cache.next_departure_fetch - now
@@ -0,0 +1,61 @@
+import logging
+import runpy
+import sys
+from pathlib import Path
+
+from font_file import dump_font_file
+
+LOGGER = logging.getLogger(__name__)
+
+# must match MonoFont.PACKING_STREAM in simple_bitmap_font.py
+PACKING_STREAM = 0
+
+
+def convert_module(module_path: Path, output_path: Path) -> int:
+    module_globals = runpy.run_path(str(module_path))
+    font_dict = module_globals["font_dict"]
+    packing = module_globals.get("font_packing", PACKING_STREAM)
+    font_bytes = dump_font_file(font_dict, packing)
+    output_path.write_bytes(font_bytes)
+    LOGGER.info(
+        "Converted %d glyphs from %s (%d bytes) to %s (%d bytes).",
+        len(font_dict),
+        module_path,
+        module_path.stat().st_size,
+        output_path,
+        len(font_bytes),
+    )
+    return len(font_bytes)
+
+
+def parse_args():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Convert a font_maker.py font module into a binary font file"
+    )
+    parser.add_argument("module", help="font module (.py) to convert", type=Path)
+    parser.add_argument(
+        "output",
+        help="binary font file to write, defaults to the module path with .bin",
+        type=Path,
+        nargs="?",
+        default=None,
+    )
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(
+        stream=sys.stdout,
+        format="%(asctime)s :: %(levelname)-8s :: %(message)s",
+        datefmt="%Y-%m-%dT%H:%M:%S%z",
+        level=logging.INFO,
+    )
+    args = parse_args()
+    output = args.output or args.module.with_suffix(".bin")
+    convert_module(args.module, output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Binary font container that keeps only a small glyph index in memory.
+
+Layout (little endian):
+
+    header  "<4sBBHHH"  magic, version, packing, glyph count, line height,
+                        size of the names section
+    names   per named glyph ("UNKNOWN", "SUN"...): u8 length + utf-8 bytes
+    index   "<IIHH" per glyph, sorted by key: key, data offset, width, height
+    data    MONO_HMSB glyph rows, each row padded to a byte boundary
+
+Single character glyphs use their codepoint as the key, named glyphs use
+NAMED_KEY_BASE + their position in the names section.
+"""
+
+import struct
+
+MAGIC = b"MFNT"
+VERSION = 1
+# same value as MonoFont.PACKING_HMSB
+PACKING_HMSB = 1
+
+HEADER = "<4sBBHHH"
+HEADER_SIZE = struct.calcsize(HEADER)
+INDEX_ENTRY = "<IIHH"
+INDEX_ENTRY_SIZE = struct.calcsize(INDEX_ENTRY)
+
+NAMED_KEY_BASE = 0x110000
+
+
+def glyph_size(width: int, height: int) -> int:
+    return ((width + 7) // 8) * height
+
+
+class FontFile:
+    """
+    Dict-like, read-only view of a font file: `get()` seeks to the glyph and
+    reads just its bitmap, so the file is never loaded as a whole.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        magic, version, packing, count, line_height, names_size = struct.unpack(
+            HEADER, self._file.read(HEADER_SIZE)
+        )
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} font file")
+        self.packing = packing
+        self.line_height = line_height
+
+        self._named_keys = dict()
+        names = self._file.read(names_size)
+        pos = 0
+        while pos < names_size:
+            length = names[pos]
+            name = names[pos + 1 : pos + 1 + length].decode("utf-8")
+            self._named_keys[name] = NAMED_KEY_BASE + len(self._named_keys)
+            pos += 1 + length
+
+        self._count = count
+        self._index = self._file.read(count * INDEX_ENTRY_SIZE)
+
+    def _key(self, name: str) -> int:
+        if len(name) == 1:
+            return ord(name)
+        return self._named_keys.get(name, -1)
+
+    def _find(self, name: str) -> int:
+        key = self._key(name)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            (mid_key,) = struct.unpack_from("<I", self._index, mid * INDEX_ENTRY_SIZE)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def get(self, name: str, default=None) -> tuple[int, int, bytearray] | None:
+        position = self._find(name)
+        if position < 0:
+            return default
+        _, offset, width, height = struct.unpack_from(
+            INDEX_ENTRY, self._index, position * INDEX_ENTRY_SIZE
+        )
+        data = bytearray(glyph_size(width, height))
+        self._file.seek(offset)
+        self._file.readinto(data)
+        return width, height, data
+
+    def __getitem__(self, name: str) -> tuple[int, int, bytearray]:
+        glyph = self.get(name)
+        if glyph is None:
+            raise KeyError(name)
+        return glyph
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) >= 0
+
+    def keys(self) -> list[str]:
+        return list(self.widths().keys())
+
+    def widths(self) -> dict[str, int]:
+        "Advance width table, read from the index without touching glyph data"
+        named = {key: name for name, key in self._named_keys.items()}
+        widths = dict()
+        for position in range(self._count):
+            key, _, width, _ = struct.unpack_from(
+                INDEX_ENTRY, self._index, position * INDEX_ENTRY_SIZE
+            )
+            widths[named[key] if key >= NAMED_KEY_BASE else chr(key)] = width
+        return widths
+
+    def close(self):
+        self._file.close()
+
+
+def stream_to_hmsb(data: bytes, width: int, height: int) -> bytes:
+    "Repack a legacy continuous bitstream glyph into MONO_HMSB rows"
+    bytes_per_row = (width + 7) // 8
+    out = bytearray(bytes_per_row * height)
+    for i in range(width * height):
+        if data[i >> 3] & (1 << (i & 7)):
+            y, x = divmod(i, width)
+            out[y * bytes_per_row + (x >> 3)] |= 1 << (x & 7)
+    return bytes(out)
+
+
+def dump_font_file(
+    font_dict: dict[str, tuple[int, int, bytes]], packing: int = PACKING_HMSB
+) -> bytes:
+    "Serialize a font_maker dict (in either packing) into the binary format"
+    named = [name for name in font_dict if len(name) != 1]
+    names = b"".join(
+        bytes((len(encoded),)) + encoded
+        for encoded in (name.encode("utf-8") for name in named)
+    )
+
+    def key(name):
+        return ord(name) if len(name) == 1 else NAMED_KEY_BASE + named.index(name)
+
+    ordered = sorted(font_dict, key=key)
+    line_height = max(h for _, h, _ in font_dict.values())
+    data_start = HEADER_SIZE + len(names) + len(ordered) * INDEX_ENTRY_SIZE
+
+    index = bytearray()
+    data = bytearray()
+    for name in ordered:
+        width, height, glyph = font_dict[name]
+        if packing != PACKING_HMSB:
+            glyph = stream_to_hmsb(glyph, width, height)
+        index += struct.pack(
+            INDEX_ENTRY, key(name), data_start + len(data), width, height
+        )
+        data += glyph
+
+    header = struct.pack(
+        HEADER, MAGIC, VERSION, PACKING_HMSB, len(ordered), line_height, len(names)
+    )
+    return bytes(header + names + index + data)
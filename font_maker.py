@@ -1,10 +1,23 @@
+import json
 import logging
 import sys
 
 from PIL import Image, ImageDraw, ImageFont
 
+from stringutil import clean_string
+
 LOGGER = logging.getLogger(__name__)
 
+# must match MonoFont.PACKING_* in simple_bitmap_font.py
+PACKING_STREAM = 0
+PACKING_HMSB = 1
+
+PACKINGS = {"stream": PACKING_STREAM, "hmsb": PACKING_HMSB}
+
+# digits, "h", "m" and "now" from timedelta_pformat, ":" and "~" from the
+# clock, "." from the ellipsis of truncated directions
+ALWAYS_REACHABLE = "0123456789hmnow:~."
+
 
 def draw_char(font: ImageFont.ImageFont, char: str) -> Image.Image:
     bbox = font.getbbox(char)
@@ -42,9 +55,32 @@ def to_gfx_bytes(img: Image.Image) -> bytes:
     return bytes(font_bytes)
 
 
+def to_hmsb_bytes(img: Image.Image) -> bytes:
+    """
+    Pack pixels row by row in framebuf.MONO_HMSB order: every row starts
+    at a byte boundary and bit 0 is the leftmost pixel of each byte.
+    """
+    width, height = img.size
+    bytes_per_row = (width + 7) // 8
+    font_bytes = bytearray(bytes_per_row * height)
+
+    for y in range(0, height):
+        row_start = y * bytes_per_row
+        debug_line = ""
+        for x in range(0, width):
+            pixel = bool(img.getpixel((x, y)))
+            if pixel:
+                font_bytes[row_start + (x >> 3)] |= 1 << (x & 7)
+            if LOGGER.level == logging.DEBUG:
+                debug_line += "⬛️" if pixel else "⬜️"
+        LOGGER.debug(debug_line)
+    return bytes(font_bytes)
+
+
 def convert_font(
-    font, alphabet: list[str | tuple[str, str]]
+    font, alphabet: list[str | tuple[str, str]], packing: int = PACKING_HMSB
 ) -> dict[str, tuple[int, int, bytes]]:
+    pack = to_hmsb_bytes if packing == PACKING_HMSB else to_gfx_bytes
     font_dict = {}
     for character in alphabet:
         LOGGER.debug("Converting '%s'", character)
@@ -58,13 +94,76 @@ def convert_font(
                 f"invalid type for alphabet element: {type(character).__name__}"
             )
         width, height = img.size
-        bs = to_gfx_bytes(img)
+        bs = pack(img)
         font_dict[char_name] = width, height, bs
     return font_dict
 
 
-def dump_font_module(font_dict: dict[str, tuple[int, int, bytes]]) -> str:
-    return f"font_dict={repr(font_dict)}"
+def dump_font_module(
+    font_dict: dict[str, tuple[int, int, bytes]], packing: int = PACKING_HMSB
+) -> str:
+    font_widths = {name: width for name, (width, _, _) in font_dict.items()}
+    return (
+        f"font_dict={repr(font_dict)}\n"
+        f"font_packing={packing}\n"
+        f"font_widths={repr(font_widths)}\n"
+    )
+
+
+def reachable_chars(config: dict, api_responses: list) -> set[str]:
+    """
+    Characters the display can show for `config`: configured line names,
+    plus stop and direction names of the configured lines found in saved
+    departures responses, after removing `remove_phrases` like ui.py does.
+    """
+    remove_phrases = config.get("remove_phrases", [])
+    line_names = {item["line_name"] for item in config["lines_directions"]}
+
+    chars = set(ALWAYS_REACHABLE)
+    for line_name in line_names:
+        chars.update(line_name)
+
+    for response in api_responses:
+        departures = response["departures"] if isinstance(response, dict) else response
+        for departure in departures:
+            if departure["line"]["name"] not in line_names:
+                continue
+            for text in (departure["direction"], departure["stop"]["name"]):
+                if text:
+                    chars.update(clean_string(text, remove_phrases))
+    return chars
+
+
+def subset_alphabet(
+    alphabet: list[str | tuple[str, str]], chars: set[str]
+) -> list[str | tuple[str, str]]:
+    """
+    Keep reachable characters and named specials (drawn via {{NAME}}),
+    reachable characters missing from `alphabet` are rendered as well.
+    """
+    subset = []
+    for character in alphabet:
+        name = character if isinstance(character, str) else character[0]
+        if len(name) > 1 or name in chars:
+            subset.append(character)
+    covered = {c if isinstance(c, str) else c[0] for c in subset}
+    subset.extend(sorted(chars - covered))
+    return subset
+
+
+def load_subset_inputs(config_path: str, response_paths: list[str]):
+    with open(config_path, encoding="utf-8") as config_file:
+        config = json.load(config_file)
+    responses = []
+    for response_path in response_paths:
+        with open(response_path, encoding="utf-8") as response_file:
+            responses.append(json.load(response_file))
+    if not responses:
+        LOGGER.warning(
+            "No saved API responses given, stop and direction names are not"
+            " included in the subset"
+        )
+    return config, responses
 
 
 def parse_args():
@@ -89,6 +188,26 @@ def parse_args():
     parser.add_argument(
         "--filename", help="Python file name to save", default=None, required=False
     )
+    parser.add_argument(
+        "--packing",
+        help="glyph bitmap layout: 'hmsb' (rows padded to bytes, loads without"
+        " unpacking) or 'stream' (legacy continuous bitstream)",
+        choices=PACKINGS.keys(),
+        default="hmsb",
+    )
+    parser.add_argument(
+        "--subset-config",
+        help="config.json to compute the characters the display can show,"
+        " only those are included in the font",
+        default=None,
+    )
+    parser.add_argument(
+        "--subset-response",
+        help="saved departures API response (JSON) for the configured stops,"
+        " can be given multiple times",
+        action="append",
+        default=[],
+    )
     return parser.parse_args()
 
 
@@ -148,8 +267,24 @@ def main():
 
     alphabet = list(args.alphabet)
     alphabet.extend(parse_extra_chars(args.extra_chars))
-    alphabet.append(("UNKNOWN", "\N{REPLACEMENT CHARACTER}"))
-    font_dict = convert_font(font, alphabet)
+    packing = PACKINGS[args.packing]
+    unknown = ("UNKNOWN", "\N{REPLACEMENT CHARACTER}")
+
+    full_size = None
+    if args.subset_config:
+        config, responses = load_subset_inputs(
+            args.subset_config, args.subset_response
+        )
+        full_dict = convert_font(font, alphabet + [unknown], packing)
+        full_size = len(dump_font_module(full_dict, packing))
+        alphabet = subset_alphabet(alphabet, reachable_chars(config, responses))
+        LOGGER.info(
+            "Subset alphabet: %r",
+            "".join(c if isinstance(c, str) else c[0] for c in alphabet),
+        )
+
+    alphabet.append(unknown)
+    font_dict = convert_font(font, alphabet, packing)
 
     fontname, style = font.getname()
     if args.filename is not None:
@@ -159,16 +294,24 @@ def main():
             f"{fontname.replace(' ', '_')}{style.replace(' ', '_')}{font.size}.py"
         )
 
-    bytes_written = Path(filename).write_text(dump_font_module(font_dict))
+    bytes_written = Path(filename).write_text(dump_font_module(font_dict, packing))
     LOGGER.info(
-        "Created %d dict entries for %s %s %d and wrote %d bytes to %s.",
+        "Created %d %s dict entries for %s %s %d and wrote %d bytes to %s.",
         len(font_dict),
+        args.packing,
         fontname,
         style,
         size,
         bytes_written,
         filename,
     )
+    if full_size is not None:
+        LOGGER.info(
+            "Subsetting saved %d of %d bytes (%.0f%%).",
+            full_size - bytes_written,
+            full_size,
+            100 * (full_size - bytes_written) / full_size,
+        )
 
 
 if __name__ == "__main__":
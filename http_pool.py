@@ -0,0 +1,347 @@
+"""
+Minimal HTTP/1.1 client that keeps connections open between requests.
+
+Connections are pooled per (host, port, scheme), so fetching several stops,
+and every loop while the device stays awake, reuses TLS connections instead
+of doing a handshake per request. Up to MAX_IDLE_PER_HOST are kept per host,
+as many as stops are fetched at once, and async_fetch keeps its stream
+connections here too. A connection is kept when reading out the rest of a
+response the caller stopped reading looks quicker than the last handshake
+took. Where the ssl module exposes TLS sessions (CPython) new connections
+resume the previous session.
+"""
+
+import collections
+import json
+import socket
+import ssl
+import time
+
+PoolStats = collections.namedtuple(
+    "PoolStats",
+    ("requests", "handshakes", "resumed", "reused", "reuse_ratio", "latencies_ms"),
+)
+
+# idle connections kept per host, the default fetch_concurrency
+MAX_IDLE_PER_HOST = 3
+LATENCIES_KEPT = 16
+
+
+def _split_url(url: str) -> tuple[str, int, bool, str]:
+    scheme, _, rest = url.partition("://")
+    host, slash, path = rest.partition("/")
+    use_ssl = scheme == "https"
+    port = 443 if use_ssl else 80
+    if ":" in host:
+        host, port_str = host.split(":")
+        port = int(port_str)
+    return host, port, use_ssl, slash + path
+
+
+def _ssl_context():
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    # same as requests on the device, certificates are not verified
+    if hasattr(context, "check_hostname"):
+        context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class _Connection:
+    def __init__(self, key, raw, sock, stream) -> None:
+        self.key = key
+        # the TCP socket, `sock` is the SSL socket wrapping it for https
+        self.raw = raw
+        self.sock = sock
+        self.stream = stream
+
+    def settimeout(self, timeout: int):
+        # MicroPython's SSL sockets have none, the TCP socket's timeout applies
+        settimeout = getattr(self.sock, "settimeout", None)
+        if settimeout is None:
+            settimeout = self.raw.settimeout
+        settimeout(timeout)
+
+    def close(self):
+        try:
+            if self.stream is not self.sock:
+                self.stream.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class _Body:
+    "File-like response body, knows when it has been read completely"
+
+    def __init__(self, stream, length: int | None, chunked: bool) -> None:
+        self._stream = stream
+        self._remaining = length
+        self.chunked = chunked
+        self._chunk_left = 0
+        self.complete = length == 0
+        # what was read and how long waiting for it took, parsing not counted
+        self.read_bytes = 0
+        self.read_ms = 0
+
+    def _read(self, size: int) -> bytes:
+        start = time.ticks_ms()
+        data = self._stream.read() if size < 0 else self._stream.read(size)
+        self.read_ms += time.ticks_diff(time.ticks_ms(), start)
+        if data:
+            self.read_bytes += len(data)
+        return data
+
+    def read(self, size: int = -1) -> bytes:
+        if self.complete:
+            return b""
+        if self.chunked:
+            return self._read_chunked(size)
+        if self._remaining is None:
+            data = self._read(size)
+            if not data:
+                self.complete = True
+            return data or b""
+
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._read(size)
+        if not data:
+            raise OSError("connection closed before the end of the body")
+        self._remaining -= len(data)
+        self.complete = self._remaining == 0
+        return data
+
+    def _read_chunked(self, size: int) -> bytes:
+        if not self._chunk_left:
+            size_line = self._stream.readline()
+            self._chunk_left = int(size_line.split(b";")[0].strip(), 16)
+            if not self._chunk_left:
+                # trailers end with an empty line
+                while self._stream.readline() not in (b"\r\n", b"\n", b""):
+                    pass
+                self.complete = True
+                return b""
+        if size < 0 or size > self._chunk_left:
+            size = self._chunk_left
+        data = self._read(size)
+        if not data:
+            raise OSError("connection closed before the end of the body")
+        self._chunk_left -= len(data)
+        if not self._chunk_left:
+            self._stream.readline()
+        return data
+
+    def remaining(self) -> int | None:
+        return None if self.chunked else self._remaining
+
+
+class Response:
+    def __init__(
+        self, pool, connection, status_code: int, headers: dict, body, keep_alive: bool
+    ) -> None:
+        self._pool = pool
+        self._connection = connection
+        self._keep_alive = keep_alive
+        self.status_code = status_code
+        self.headers = headers
+        self.raw = body
+
+    def json(self):
+        try:
+            chunks = []
+            while True:
+                chunk = self.raw.read(1024)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            return json.loads(b"".join(chunks))
+        finally:
+            self.close()
+
+    def close(self):
+        connection = self._connection
+        if connection is None:
+            return
+        self._connection = None
+
+        body = self.raw
+        drain_ms = self._pool.drain_ms(body) if self._keep_alive else 0
+        deadline = time.ticks_add(time.ticks_ms(), drain_ms)
+        try:
+            while not body.complete and time.ticks_diff(deadline, time.ticks_ms()) > 0:
+                body.read(512)
+        except OSError:
+            pass
+        if self._keep_alive and body.complete:
+            self._pool.give(connection)
+        else:
+            connection.close()
+
+
+class ConnectionPool:
+    def __init__(self) -> None:
+        self._idle = dict()
+        self._sessions = dict()
+        self._ssl_context = None
+        self.requests = 0
+        self.handshakes = 0
+        self.resumed = 0
+        self.reused = 0
+        self.latencies_ms = []
+        # how long the last new connection took
+        self.handshake_ms = 0
+
+    def stats(self) -> PoolStats:
+        return PoolStats(
+            self.requests,
+            self.handshakes,
+            self.resumed,
+            self.reused,
+            self.reused / self.requests if self.requests else 0,
+            list(self.latencies_ms),
+        )
+
+    def record(self, start_ms: int, handshake_ms: int | None):
+        """
+        Counts a request sent at time.ticks_ms() `start_ms`, `handshake_ms`
+        is how long connecting took, None on an idle connection
+        """
+        self.requests += 1
+        if handshake_ms is None:
+            self.reused += 1
+        else:
+            self.handshakes += 1
+            self.handshake_ms = handshake_ms
+        self.latencies_ms.append(time.ticks_diff(time.ticks_ms(), start_ms))
+        del self.latencies_ms[:-LATENCIES_KEPT]
+
+    def drain_ms(self, body) -> int:
+        """
+        How long to read out the rest of `body` for to keep its connection,
+        0 if at the rate it arrived so far that takes longer than connecting
+        """
+        remaining = body.remaining()
+        budget_ms = self.handshake_ms
+        # remaining / (read_bytes / read_ms) > budget_ms without dividing by 0
+        if (
+            remaining is not None
+            and remaining * body.read_ms > body.read_bytes * budget_ms
+        ):
+            return 0
+        return budget_ms
+
+    def _connect(self, key, timeout: int) -> _Connection:
+        host, port, use_ssl = key
+        address = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0][-1]
+        raw = sock = socket.socket()
+        raw.settimeout(timeout)
+        try:
+            raw.connect(address)
+            if use_ssl:
+                if self._ssl_context is None:
+                    self._ssl_context = _ssl_context()
+                session = self._sessions.get(key)
+                if session is not None:
+                    sock = self._ssl_context.wrap_socket(
+                        sock, server_hostname=host, session=session
+                    )
+                else:
+                    sock = self._ssl_context.wrap_socket(sock, server_hostname=host)
+                if getattr(sock, "session_reused", False):
+                    self.resumed += 1
+                session = getattr(sock, "session", None)
+                if session is not None:
+                    self._sessions[key] = session
+        except Exception:
+            sock.close()
+            raise
+        # MicroPython's sockets, SSL ones too, have readline and write but SSL
+        # ones no makefile, CPython's have only makefile
+        stream = sock if hasattr(sock, "readline") else sock.makefile("rwb")
+        return _Connection(key, raw, sock, stream)
+
+    def take(self, key):
+        "The idle connection used last for `key`, None if there is none"
+        idle = self._idle.get(key)
+        return idle.pop() if idle else None
+
+    def give(self, connection):
+        "Keeps `connection` (anything with `key` and close()) for reuse"
+        idle = self._idle.setdefault(connection.key, [])
+        idle.append(connection)
+        if len(idle) > MAX_IDLE_PER_HOST:
+            idle.pop(0).close()
+
+    def close_all(self):
+        for idle in self._idle.values():
+            for connection in idle:
+                connection.close()
+        self._idle = dict()
+
+    def request(self, method: str, url: str, timeout: int = 5) -> Response:
+        host, port, use_ssl, path = _split_url(url)
+        key = (host, port, use_ssl)
+        start = time.ticks_ms()
+
+        handshake_ms = None
+        connection = self.take(key)
+        if connection is not None:
+            connection.settimeout(timeout)
+            try:
+                response = self._send(connection, method, host, path)
+            except OSError:
+                # the server closed the idle connection in the meantime
+                connection.close()
+                connection = None
+        if connection is None:
+            connect_start = time.ticks_ms()
+            connection = self._connect(key, timeout)
+            handshake_ms = time.ticks_diff(time.ticks_ms(), connect_start)
+            response = self._send(connection, method, host, path)
+
+        self.record(start, handshake_ms)
+        return response
+
+    def _send(
+        self, connection: _Connection, method: str, host: str, path: str
+    ) -> Response:
+        stream = connection.stream
+        stream.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode()
+        )
+        flush = getattr(stream, "flush", None)
+        if flush:
+            flush()
+
+        status_line = stream.readline()
+        if not status_line:
+            raise OSError("connection closed")
+        version, status, _ = (status_line.decode().split(None, 2) + [""])[:3]
+        headers = dict()
+        while True:
+            line = stream.readline()
+            if not line or line in (b"\r\n", b"\n"):
+                break
+            name, _, value = line.decode().partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = headers.get("content-length")
+        body = _Body(
+            stream,
+            int(length) if length is not None else None,
+            headers.get("transfer-encoding", "").lower() == "chunked",
+        )
+        keep_alive = (
+            version == "HTTP/1.1"
+            and headers.get("connection", "").lower() != "close"
+            and (length is not None or body.chunked)
+        )
+        return Response(self, connection, int(status), headers, body, keep_alive)
+
+
+POOL = ConnectionPool()
+
+
+def request(method: str, url: str, timeout: int = 5) -> Response:
+    return POOL.request(method, url, timeout)
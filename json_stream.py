@@ -0,0 +1,129 @@
+"""
+Incremental parsing of the array under one top level key of a JSON object,
+so a large API response never has to be held in memory as a whole.
+"""
+
+import json
+import time
+
+_QUOTE = 0x22
+_BACKSLASH = 0x5C
+_COLON = 0x3A
+_COMMA = 0x2C
+_OPENERS = (0x7B, 0x5B)  # { [
+_CLOSERS = (0x7D, 0x5D)  # } ]
+_ARRAY_START = 0x5B
+_ARRAY_END = 0x5D
+
+
+class ArrayItemParser:
+    """
+    Push parser: `feed()` it chunks of the response and it returns the
+    elements of the `key` array that were completed by that chunk, each
+    parsed on its own with json.loads.
+    """
+
+    def __init__(self, key: str) -> None:
+        self._key = key.encode("utf-8")
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string = bytearray()
+        self._key_matched = False
+        self._array_depth = 0
+        self._item = bytearray()
+        self._capturing = False
+        self.found = False
+        self.done = False
+
+    # microseconds spent in feed() by all parsers, read by the profiler
+    feed_us = 0
+
+    def feed(self, chunk) -> list:
+        start = time.ticks_us()
+        items = self._feed(chunk)
+        ArrayItemParser.feed_us += time.ticks_diff(time.ticks_us(), start)
+        return items
+
+    @micropython.native
+    def _feed(self, chunk) -> list:
+        items = []
+        for b in chunk:
+            if self.done:
+                break
+
+            if self._in_string:
+                if self._capturing:
+                    self._item.append(b)
+                if self._escape:
+                    self._escape = False
+                elif b == _BACKSLASH:
+                    self._escape = True
+                elif b == _QUOTE:
+                    self._in_string = False
+                    if not self._capturing and self._depth == 1:
+                        self._key_matched = self._string == self._key
+                elif not self._capturing and self._depth == 1:
+                    self._string.append(b)
+                continue
+
+            if b == _QUOTE:
+                self._in_string = True
+                if self._capturing:
+                    self._item.append(b)
+                elif self._depth == 1:
+                    self._string = bytearray()
+                continue
+
+            if self._capturing:
+                self._item.append(b)
+                if b in _OPENERS:
+                    self._depth += 1
+                elif b in _CLOSERS:
+                    self._depth -= 1
+                    if self._depth == self._array_depth:
+                        items.append(json.loads(bytes(self._item)))
+                        self._item = bytearray()
+                        self._capturing = False
+                continue
+
+            if self._array_depth and self._depth == self._array_depth:
+                if b in _OPENERS:
+                    self._capturing = True
+                    self._item.append(b)
+                    self._depth += 1
+                elif b == _ARRAY_END:
+                    self._depth -= 1
+                    self._array_depth = 0
+                    self.done = True
+                continue
+
+            if b in _OPENERS:
+                self._depth += 1
+                if b == _ARRAY_START and self._key_matched and self._depth == 2:
+                    self._array_depth = 2
+                    self.found = True
+                self._key_matched = False
+            elif b in _CLOSERS:
+                self._depth -= 1
+            elif b == _COMMA:
+                self._key_matched = False
+        return items
+
+
+def iter_array_items(stream, key: str, chunk_size: int = 512):
+    """
+    Yield the elements of the `key` array read from `stream` one by one,
+    reading stops as soon as the array is closed.
+    """
+    parser = ArrayItemParser(key)
+    while not parser.done:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        for item in parser.feed(chunk):
+            yield item
+    if not parser.found:
+        raise KeyError(f"missing {key} in response")
+    if not parser.done:
+        raise OSError(f"response ended inside the {key} array")
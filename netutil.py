@@ -1,19 +1,103 @@
+import collections
+import time
+
 import network
 
 wlan = network.WLAN(network.STA_IF)
 
-def do_connect(ssid: str, key: str):
+# how it connected, also the tag of the "wifi" profiler span
+FAILED = 0
+DIRECT = 1
+SCANNED = 2
+
+# the cached access point answers quickly or not at all
+DIRECT_TIMEOUT_MS = 3000
+POLL_MS = 50
+
+# statuses after which waiting longer does not help, not every port has all
+_GAVE_UP = tuple(
+    getattr(network, name)
+    for name in ("STAT_NO_AP_FOUND", "STAT_WRONG_PASSWORD", "STAT_CONNECT_FAIL")
+    if hasattr(network, name)
+)
+
+# `ifconfig` is (ip, netmask, gateway, dns), `bssid` b"" when not known
+Connection = collections.namedtuple(
+    "Connection", ("method", "ifconfig", "bssid", "channel")
+)
+
+
+def _wait_connected(timeout_ms: int) -> bool:
+    deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+    while not wlan.isconnected():
+        if wlan.status() in _GAVE_UP or time.ticks_diff(deadline, time.ticks_ms()) <= 0:
+            wlan.disconnect()
+            return False
+        time.sleep_ms(POLL_MS)
+    return True
+
+
+def _strongest_ap(ssid: str) -> tuple[bytes, int] | None:
+    "BSSID and channel of the access point of `ssid` with the best signal"
+    best = None
+    for name, bssid, channel, rssi, _, _ in wlan.scan():
+        if name == ssid.encode() and (best is None or rssi > best[2]):
+            best = (bssid, channel, rssi)
+    return None if best is None else best[:2]
+
 
+def do_connect(
+    ssid: str,
+    key: str,
+    bssid: bytes = b"",
+    channel: int = 0,
+    static_ifconfig: tuple | None = None,
+    timeout_ms: int = 10000,
+    attempts: int = 2,
+) -> Connection:
+    """
+    Connects to the cached access point `bssid` first, with `static_ifconfig`
+    instead of asking DHCP if given. When that fails or nothing is cached,
+    scans for the strongest access point of `ssid` and connects to it with
+    DHCP, up to `attempts` times.
+    """
     wlan.active(True)
-    if not wlan.isconnected():
-        print("connecting to network...")
-        wlan.connect(ssid, key)
-        while not wlan.isconnected():
-            pass
-    return wlan.ifconfig()
-
-def setup_time():
-    import ntptime, time
-    ntptime.settime()
-    
-    print(time.localtime())
\ No newline at end of file
+    if wlan.isconnected():
+        return Connection(DIRECT, wlan.ifconfig(), bssid, channel)
+
+    if bssid:
+        print("connecting to", ssid, "on channel", channel)
+        if static_ifconfig:
+            wlan.ifconfig(static_ifconfig)
+        wlan.connect(ssid, key, bssid=bssid)
+        if _wait_connected(DIRECT_TIMEOUT_MS):
+            return Connection(DIRECT, wlan.ifconfig(), bssid, channel)
+        print("cached access point did not answer")
+        if static_ifconfig:
+            wlan.ifconfig("dhcp")
+
+    for _ in range(attempts):
+        print("scanning for", ssid)
+        ap = _strongest_ap(ssid)
+        if ap is None:
+            continue
+        bssid, channel = ap
+        wlan.connect(ssid, key, bssid=bssid)
+        if _wait_connected(timeout_ms):
+            return Connection(SCANNED, wlan.ifconfig(), bssid, channel)
+    return Connection(FAILED, None, b"", 0)
+
+
+def ntp_time(timeout_sec: int = 1) -> int:
+    "Seconds since the `time` epoch, OSError without an answer in time"
+    import ntptime
+
+    ntptime.timeout = timeout_sec
+    return ntptime.time()
+
+
+def set_rtc(seconds: int):
+    import machine
+
+    tm = time.gmtime(seconds)
+    machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
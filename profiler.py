@@ -0,0 +1,163 @@
+"""
+Named spans of a wake cycle, with their duration and the free heap before
+and after.
+
+The spans of the last cycles are kept in a ring buffer file, so units in
+the field can be profiled without a serial console. Copy the file off the
+device and summarise it with experiments/profile_dump.py.
+"""
+
+import gc
+import struct
+import time
+
+PROFILE_PATH = "/profile.bin"
+
+# spans are stored by their index in here, only append to it
+SPAN_NAMES = (
+    "boot",
+    "imports",
+    "wifi",
+    "ntp",
+    "timezone",
+    "fetch",
+    "fetch_stop",
+    "parse",
+    "filter",
+    "render",
+    "refresh",
+    "persist",
+    "loop",
+    "restore",
+)
+
+MAGIC = b"PROF"
+VERSION = 1
+# magic, version, cycles in the ring, spans per cycle, cycles written ever
+HEADER = "<4sBHHI"
+# epoch of the cycle, number of spans
+CYCLE = "<IB"
+# name index, tag (e.g. stop index), elapsed us, mem_free before and after
+SPAN = "<BBIii"
+MAX_SPANS = 24
+
+
+def _mem_free() -> int:
+    mem_free = getattr(gc, "mem_free", None)
+    return mem_free() if mem_free else -1
+
+
+def _slot_size() -> int:
+    return struct.calcsize(CYCLE) + MAX_SPANS * struct.calcsize(SPAN)
+
+
+class _Span:
+    def __init__(self, profiler: "Profiler", name: str, tag: int) -> None:
+        self._profiler = profiler
+        self._name = name
+        # can be changed inside the block, e.g. to how it ended
+        self.tag = tag
+
+    def __enter__(self):
+        self._mem_before = _mem_free()
+        self._start = time.ticks_us()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.add(
+            self._name,
+            time.ticks_diff(time.ticks_us(), self._start),
+            self._mem_before,
+            _mem_free(),
+            self.tag,
+        )
+
+
+class Profiler:
+    def __init__(self, path: str = PROFILE_PATH) -> None:
+        self.path = path
+        self.spans = []
+
+    def span(self, name: str, tag: int = 0) -> _Span:
+        "with profiler.span('render'): ... records how long the block took"
+        return _Span(self, name, tag)
+
+    def add(
+        self, name: str, elapsed_us: int, mem_before: int, mem_after: int, tag: int = 0
+    ):
+        "Records a span measured elsewhere, e.g. summed over several calls"
+        if len(self.spans) < MAX_SPANS:
+            self.spans.append(
+                (SPAN_NAMES.index(name), tag, elapsed_us, mem_before, mem_after)
+            )
+
+    def _open_ring(self, cycles: int):
+        try:
+            ring = open(self.path, "r+b")
+        except OSError:
+            ring = None
+        if ring is not None:
+            header = ring.read(struct.calcsize(HEADER))
+            if len(header) == struct.calcsize(HEADER):
+                magic, version, ring_cycles, max_spans, written = struct.unpack(
+                    HEADER, header
+                )
+                if (
+                    magic == MAGIC
+                    and version == VERSION
+                    and ring_cycles == cycles
+                    and max_spans == MAX_SPANS
+                ):
+                    return ring, written
+            ring.close()
+        # missing, damaged or sized differently, start over
+        ring = open(self.path, "w+b")
+        ring.write(struct.pack(HEADER, MAGIC, VERSION, cycles, MAX_SPANS, 0))
+        ring.write(bytes(cycles * _slot_size()))
+        return ring, 0
+
+    def flush(self, epoch: int, cycles: int):
+        """
+        Writes this cycle's spans over the oldest of `cycles` in the ring,
+        a ring of 0 cycles turns the flash writes off.
+        """
+        spans, self.spans = self.spans, []
+        if cycles <= 0:
+            return
+        record = [struct.pack(CYCLE, epoch, len(spans))]
+        record.extend(struct.pack(SPAN, *span) for span in spans)
+        ring, written = self._open_ring(cycles)
+        try:
+            ring.seek(struct.calcsize(HEADER) + (written % cycles) * _slot_size())
+            ring.write(b"".join(record))
+            ring.seek(0)
+            ring.write(
+                struct.pack(HEADER, MAGIC, VERSION, cycles, MAX_SPANS, written + 1)
+            )
+        finally:
+            ring.close()
+
+
+def read_cycles(data: bytes) -> list[tuple[int, list[tuple]]]:
+    """
+    Cycles in a ring buffer file, oldest first, as (epoch, spans) with spans
+    as (name, tag, elapsed_us, mem_before, mem_after).
+    """
+    magic, version, cycles, max_spans, written = struct.unpack_from(HEADER, data)
+    if magic != MAGIC or version != VERSION or max_spans != MAX_SPANS:
+        raise ValueError(f"unknown profile format {magic} v{version}")
+    first = max(written - cycles, 0)
+    result = []
+    for cycle in range(first, written):
+        offset = struct.calcsize(HEADER) + (cycle % cycles) * _slot_size()
+        epoch, count = struct.unpack_from(CYCLE, data, offset)
+        offset += struct.calcsize(CYCLE)
+        spans = []
+        for _ in range(count):
+            name, tag, elapsed_us, mem_before, mem_after = struct.unpack_from(
+                SPAN, data, offset
+            )
+            offset += struct.calcsize(SPAN)
+            spans.append((SPAN_NAMES[name], tag, elapsed_us, mem_before, mem_after))
+        result.append((epoch, spans))
+    return result
@@ -0,0 +1,107 @@
+"""
+Narrowest departures query per stop, derived from the configured lines.
+
+The payload estimates are rough averages for busy Berlin stops, they are
+only meant to show which parts of a query are worth disabling.
+"""
+
+import collections
+
+from transport_api import departures_url
+
+QueryPlan = collections.namedtuple(
+    "QueryPlan", ("stop_id", "url", "params", "estimated_bytes", "saved_bytes")
+)
+
+PRODUCTS = ("suburban", "subway", "tram", "bus", "ferry", "express", "regional")
+
+# the other M lines are MetroBus
+METRO_TRAM_LINES = ("M1", "M2", "M4", "M5", "M6", "M8", "M10", "M13", "M17")
+TRAM_LINES = "12 16 18 21 27 37 50 60 61 62 63 67 68".split()
+
+# rough payload model
+DEPARTURES_PER_HOUR = 120
+DEPARTURE_BYTES = 1500
+REMARKS_BYTES_PER_DEPARTURE = 1200
+PRODUCT_SHARES = {
+    "bus": 0.45,
+    "tram": 0.15,
+    "subway": 0.15,
+    "suburban": 0.15,
+    "regional": 0.07,
+    "express": 0.02,
+    "ferry": 0.01,
+}
+
+
+def line_products(line_name: str) -> tuple[str, ...] | None:
+    "Products a line name can belong to, None if it is not recognized"
+    name = line_name.strip().upper()
+    if name.startswith("U") and name[1:].isdigit():
+        return ("subway",)
+    if name.startswith("S") and name[1:].isdigit():
+        return ("suburban",)
+    if name.startswith("RE") or name.startswith("RB") or name.startswith("FEX"):
+        return ("regional",)
+    if name.startswith("IC") or name.startswith("EC") or name.startswith("FLX"):
+        return ("express",)
+    if name.startswith("F") and name[1:].isdigit():
+        return ("ferry",)
+    if name.startswith("M") and name[1:].isdigit():
+        return ("tram",) if name in METRO_TRAM_LINES else ("bus",)
+    if (name.startswith("X") or name.startswith("N")) and name[1:].isdigit():
+        return ("bus",)
+    if name.isdigit():
+        return ("tram",) if name in TRAM_LINES else ("bus",)
+    return None
+
+
+def needed_products(line_names: list[str]) -> tuple[str, ...]:
+    products = set()
+    for line_name in line_names:
+        line_product = line_products(line_name)
+        if line_product is None:
+            return PRODUCTS
+        products.update(line_product)
+    return tuple(p for p in PRODUCTS if p in products)
+
+
+def _estimate_bytes(duration: int, products: tuple[str, ...], remarks: bool) -> int:
+    departures = DEPARTURES_PER_HOUR * duration / 60
+    departures *= sum(PRODUCT_SHARES[p] for p in products)
+    per_departure = DEPARTURE_BYTES + (REMARKS_BYTES_PER_DEPARTURE if remarks else 0)
+    return int(departures * per_departure)
+
+
+def plan_departures_query(
+    stop_id: str,
+    line_names: list[str],
+    duration: int,
+    base_url: str | None = None,
+) -> QueryPlan:
+    """
+    Only request the products the configured lines use, without remarks
+    and lines of stops. The number of results is not capped: the API caps
+    before the lines and directions are filtered locally, which can leave
+    fewer matches than screen rows. Reading stops once there are enough.
+    """
+    products = needed_products(line_names)
+    params = {
+        "duration": str(duration),
+        "remarks": "false",
+        "linesOfStops": "false",
+    }
+    for product in PRODUCTS:
+        if product not in products:
+            params[product] = "false"
+
+    # the API defaults are all products with remarks and no results cap
+    unplanned = _estimate_bytes(duration, PRODUCTS, True)
+    planned = _estimate_bytes(duration, products, False)
+    return QueryPlan(
+        stop_id,
+        departures_url(stop_id, params, base_url),
+        params,
+        planned,
+        max(unplanned - planned, 0),
+    )
@@ -0,0 +1,72 @@
+"""
+The choice between partial and full e-ink refreshes.
+
+The UI renders into its own 1-bit frame, redrawing only the widgets that
+changed since the frame the panel shows (see ui_model.render), and the
+rectangles it redrew decide how the panel is refreshed. After a deep sleep
+reset the shown frame is drawn again from the saved widgets, see
+ui.restore_frame.
+"""
+
+WIDTH = 800
+HEIGHT = 600
+BYTES_PER_ROW = WIDTH // 8
+FRAME_BYTES = BYTES_PER_ROW * HEIGHT
+
+NONE = "none"
+PARTIAL = "partial"
+FULL = "full"
+
+DEFAULT_MAX_PARTIAL_REFRESHES = 20
+DEFAULT_MAX_PARTIAL_DIRTY_FRACTION = 0.4
+
+
+def dirty_fraction(rects: list[tuple[int, int, int, int]]) -> float:
+    "Fraction of the screen the rects cover, overlaps counted once"
+    edges = sorted(set(y for _, y, _, _ in rects) | set(y + h for _, y, _, h in rects))
+    area = 0
+    for top, bottom in zip(edges, edges[1:]):
+        # the x spans of the rects crossing this band, merged
+        spans = sorted(
+            (x, x + w) for x, y, w, h in rects if y <= top and y + h >= bottom
+        )
+        end = 0
+        for x1, x2 in spans:
+            if x2 > end:
+                area += (x2 - max(x1, end)) * (bottom - top)
+                end = x2
+    return area / (WIDTH * HEIGHT)
+
+
+def choose_mode(
+    rects: list[tuple[int, int, int, int]],
+    partials_since_full: int,
+    max_partials: int = DEFAULT_MAX_PARTIAL_REFRESHES,
+    max_dirty_fraction: float = DEFAULT_MAX_PARTIAL_DIRTY_FRACTION,
+) -> str:
+    """
+    Partial updates leave ghosting behind, so a full refresh is done after
+    `max_partials` of them or when too much of the screen changed anyway.
+    """
+    if not rects:
+        return NONE
+    if partials_since_full >= max_partials:
+        return FULL
+    if dirty_fraction(rects) > max_dirty_fraction:
+        return FULL
+    return PARTIAL
+
+
+def seed_partial_update(display, previous_fb) -> bool:
+    """
+    Partial updates only drive the pixels that changed since the driver's
+    last snapshot, which a deep sleep reset wipes. Put back the frame the
+    panel is showing and take the snapshot again.
+    """
+    try:
+        snapshot = display.ipp.start
+    except AttributeError:
+        return False
+    display.ipm.blit(previous_fb, 0, 0)
+    snapshot()
+    return True
@@ -1,5 +1,12 @@
+import collections
+
 from framebuf import FrameBuffer, MONO_HMSB
 
+GlyphCacheStats = collections.namedtuple(
+    "GlyphCacheStats",
+    ("hits", "misses", "evictions", "glyphs", "cached_bytes", "pinned_bytes"),
+)
+
 
 class MonoFont:
     OFFSCREEN = 9001
@@ -8,6 +15,10 @@ class MonoFont:
     RIGHT = 1
     CENTER = 2
 
+    # glyph bitmap layouts, see font_maker.py
+    PACKING_STREAM = 0
+    PACKING_HMSB = 1
+
     def __init__(
         self,
         font_dict: dict[str, tuple[int, int, bytes]],
@@ -15,13 +26,33 @@ class MonoFont:
         foreground_color: int = 1,
         background_color: int = 0,
         y_offset: int = 0,
+        packing: int = PACKING_STREAM,
+        line_height: int | None = None,
+        cache_budget_bytes: int | None = None,
+        pinned_chars: str | list[str] = "",
+        widths: dict[str, int] | None = None,
     ) -> None:
-        self._char_fb_cache = dict()
+        # least recently used glyphs first, pinned glyphs are never evicted
+        self._char_fb_cache = collections.OrderedDict()
+        self._pinned_fb_cache = dict()
+        self._pinned_chars = set(pinned_chars)
+        self._cache_budget_bytes = cache_budget_bytes
+        self._cached_bytes = 0
+        self._pinned_bytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
         self._font_dict = font_dict
+        self._build_char_fb = (
+            self._wrap_char_fb if packing == MonoFont.PACKING_HMSB else self._draw_char_fb
+        )
         self._unknown_char = self._font_dict["UNKNOWN"]
+        # advance widths, so text can be measured without building glyphs
+        self._widths = widths or {name: w for name, (w, _, _) in font_dict.items()}
+        self._unknown_width = self._unknown_char[0]
         self._foreground_color = foreground_color
         self._background_color = background_color
-        self._line_height = max(h for _, h, _ in font_dict.values())
+        self._line_height = line_height or max(h for _, h, _ in font_dict.values())
         print(f"detected line height: {self._line_height}")
         if preload_chars:
             temp_fb = FrameBuffer(bytearray(1), 1, 1, MONO_HMSB)
@@ -37,13 +68,55 @@ class MonoFont:
                     MonoFont.OFFSCREEN,
                     MonoFont.OFFSCREEN,
                 )
-                self._font_dict = dict()
+                if cache_budget_bytes is None:
+                    self._font_dict = dict()
             print("font cache preheated")
 
+    @classmethod
+    def from_module(cls, font_module, **kwargs) -> "MonoFont":
+        "Create a font from a module generated by font_maker.py"
+        return cls(
+            font_dict=font_module.font_dict,
+            packing=getattr(font_module, "font_packing", cls.PACKING_STREAM),
+            widths=getattr(font_module, "font_widths", None),
+            **kwargs,
+        )
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "MonoFont":
+        "Create a font backed by a binary font file, glyphs are read on first use"
+        from font_file import FontFile
+
+        font_file = FontFile(path)
+        return cls(
+            font_dict=font_file,
+            packing=font_file.packing,
+            line_height=font_file.line_height,
+            widths=font_file.widths(),
+            **kwargs,
+        )
+
+    @classmethod
+    def _wrap_char_fb(cls, char_data: bytes, width: int, height: int, fg: int, bg: int):
+        # rows are already MONO_HMSB, FrameBuffer only needs a writable buffer
+        if fg and not bg:
+            fb_buf = (
+                char_data if isinstance(char_data, bytearray) else bytearray(char_data)
+            )
+        elif bg and not fg:
+            fb_buf = bytearray(b ^ 0xFF for b in char_data)
+        else:
+            fb_buf = bytearray(len(char_data))
+        fb = FrameBuffer(fb_buf, width, height, MONO_HMSB)
+        if fg == bg:
+            fb.fill(fg)
+        return fb
+
     @micropython.native
     @classmethod
     def _draw_char_fb(cls, char_data: bytes, width: int, height: int, fg: int, bg: int):
-        fb_buf = bytearray(width * height)
+        "Unpack a glyph stored as one continuous bitstream (PACKING_STREAM)"
+        fb_buf = bytearray(((width + 7) // 8) * height)
         fb = FrameBuffer(fb_buf, width, height, MONO_HMSB)
         char_x = char_y = 0
         for byte in char_data:
@@ -61,6 +134,36 @@ class MonoFont:
                     break
         return fb
 
+    def cache_stats(self) -> GlyphCacheStats:
+        return GlyphCacheStats(
+            self.cache_hits,
+            self.cache_misses,
+            self.cache_evictions,
+            len(self._char_fb_cache) + len(self._pinned_fb_cache),
+            self._cached_bytes,
+            self._pinned_bytes,
+        )
+
+    def _cache_char_fb(self, char: str, cached: tuple[int, int, FrameBuffer]):
+        width, height, _ = cached
+        size = ((width + 7) // 8) * height
+        if char in self._pinned_chars:
+            self._pinned_fb_cache[char] = cached
+            self._pinned_bytes += size
+            return
+
+        budget = self._cache_budget_bytes
+        if budget is not None:
+            if size > budget:
+                return
+            while self._cached_bytes + size > budget:
+                lru_char = next(iter(self._char_fb_cache))
+                lru_width, lru_height, _ = self._char_fb_cache.pop(lru_char)
+                self._cached_bytes -= ((lru_width + 7) // 8) * lru_height
+                self.cache_evictions += 1
+        self._char_fb_cache[char] = cached
+        self._cached_bytes += size
+
     @micropython.native
     def _draw_char(
         self,
@@ -70,19 +173,26 @@ class MonoFont:
         y: int,
         transparent: bool = False,
     ):
-        cached = self._char_fb_cache.get(char)
+        cached = self._pinned_fb_cache.get(char)
+        if not cached:
+            cached = self._char_fb_cache.pop(char, None)
+            if cached:
+                # re-insert as the most recently used
+                self._char_fb_cache[char] = cached
         if cached:
+            self.cache_hits += 1
             width, height, char_fb = cached
         else:
+            self.cache_misses += 1
             chr_tuple = self._font_dict.get(char)
             if chr_tuple:
                 width, height, char_data = chr_tuple
             else:
                 width, height, char_data = self._unknown_char
-            char_fb = self._draw_char_fb(
+            char_fb = self._build_char_fb(
                 char_data, width, height, self._foreground_color, self._background_color
             )
-            self._char_fb_cache[char] = width, height, char_fb
+            self._cache_char_fb(char, (width, height, char_fb))
         if display:
             display.blit(char_fb, x, y, self._background_color if transparent else -1)
         return width, height
@@ -106,13 +216,68 @@ class MonoFont:
         return self._draw_text(display, text, x, y, transparent)
 
     def get_text_size(self, text: str | list[str]) -> tuple[int, int]:
-        _, _, width, height = self._draw_text(
-            None,
-            text,
-            0,
-            0,
-        )
-        return width, height
+        return self.text_width(text), self._line_height
+
+    def text_width(self, text: str | list[str]) -> int:
+        "Width of `text` in pixels, from the width table only"
+        _, width = self._fit_text(text)
+        return width
+
+    def truncate_text(self, text: str, max_width: int, ellipsis: str = "...") -> str:
+        "Shorten `text` to fit `max_width` pixels, ending with `ellipsis`"
+        _, width = self._fit_text(text)
+        if width <= max_width:
+            return text
+        fit_end, _ = self._fit_text(text, max_width - self.text_width(ellipsis))
+        return text[:fit_end].rstrip() + ellipsis
+
+    @micropython.native
+    def _fit_text(
+        self, text: str | list[str], max_width: int | None = None
+    ) -> tuple[int, int]:
+        """
+        Returns how many items of `text` fit in `max_width` and their width,
+        follows the same {{NAME}} parsing as _draw_text.
+        """
+        widths = self._widths
+        unknown_width = self._unknown_width
+        bracket_counter = 0
+        special_char = ""
+        width = 0
+        fit_end = 0
+        i = 0
+
+        for ch in text:
+            i += 1
+            w = 0
+
+            if ch == "{":
+                if bracket_counter < 2:
+                    bracket_counter += 1
+                else:
+                    bracket_counter = 0
+                    w = widths.get("{", unknown_width)
+            elif ch == "}":
+                if bracket_counter > 0:
+                    bracket_counter -= 1
+                if bracket_counter == 0 and special_char:
+                    w = widths.get(special_char, unknown_width)
+                    special_char = ""
+
+            elif bracket_counter == 2:
+                special_char += ch
+            else:
+                bracket_counter = 0
+                if special_char:
+                    raise ValueError(f"unclosed parenthesis: {special_char}}}")
+                w = widths.get(ch, unknown_width)
+
+            if w:
+                if max_width is not None and width + w > max_width:
+                    break
+                width += w
+                fit_end = i
+        return fit_end, width
 
     @micropython.native
     def _draw_text(
@@ -158,3 +323,89 @@ class MonoFont:
             if w:
                 display_x += w
         return (x, y, display_x, y + self._line_height)
+
+
+TextRunCacheStats = collections.namedtuple(
+    "TextRunCacheStats", ("hits", "misses", "evictions", "runs", "cached_bytes")
+)
+
+
+class TextRunCache:
+    """
+    Renders whole strings once into their own 1-bit FrameBuffer, so drawing
+    a repeated string (line names, directions, "12m") is a single blit.
+    Runs are keyed by font, text and colours and evicted least recently used
+    first once `budget_bytes` would be exceeded.
+    """
+
+    def __init__(self, budget_bytes: int) -> None:
+        self._runs = collections.OrderedDict()
+        self._budget_bytes = budget_bytes
+        self._cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> TextRunCacheStats:
+        return TextRunCacheStats(
+            self.hits, self.misses, self.evictions, len(self._runs), self._cached_bytes
+        )
+
+    def clear(self):
+        self._runs = collections.OrderedDict()
+        self._cached_bytes = 0
+
+    def _render(self, font: MonoFont, text: str) -> tuple[int, int, FrameBuffer]:
+        width, height = font.get_text_size(text)
+        run_fb = FrameBuffer(
+            bytearray(((width + 7) // 8) * height), width, height, MONO_HMSB
+        )
+        if font._background_color:
+            run_fb.fill(font._background_color)
+        font._draw_text(run_fb, text, 0, 0)
+        return width, height, run_fb
+
+    def _get(self, font: MonoFont, text: str) -> tuple[int, int, FrameBuffer]:
+        key = (font, text, font._foreground_color, font._background_color)
+        run = self._runs.pop(key, None)
+        if run:
+            self.hits += 1
+            self._runs[key] = run
+            return run
+
+        self.misses += 1
+        run = self._render(font, text)
+        width, height, _ = run
+        size = ((width + 7) // 8) * height
+        if size > self._budget_bytes:
+            return run
+        while self._cached_bytes + size > self._budget_bytes:
+            lru_key = next(iter(self._runs))
+            lru_width, lru_height, _ = self._runs.pop(lru_key)
+            self._cached_bytes -= ((lru_width + 7) // 8) * lru_height
+            self.evictions += 1
+        self._runs[key] = run
+        self._cached_bytes += size
+        return run
+
+    def draw_text(
+        self,
+        font: MonoFont,
+        display: FrameBuffer,
+        text: str,
+        x: int,
+        y: int,
+        transparent: bool = False,
+        align: int = MonoFont.LEFT,
+    ):
+        "Same as MonoFont.draw_text, but blits a cached rendering of `text`"
+        if not isinstance(text, str) or not text:
+            return font.draw_text(display, text, x, y, transparent, align)
+
+        width, _, run_fb = self._get(font, text)
+        if align == MonoFont.RIGHT:
+            x -= width
+        elif align == MonoFont.CENTER:
+            x -= width // 2
+        display.blit(run_fb, x, y, font._background_color if transparent else -1)
+        return (x, y, x + width, y + font._line_height)
@@ -0,0 +1,5 @@
+"""
+Host-side simulator of the display: runs ui.main() on CPython against
+stand-ins for the board (simulator/fakes) and a local fixture server.
+See simulator/__main__.py.
+"""
@@ -0,0 +1,222 @@
+"""
+Simulate the display for hours of wake cycles on the host:
+
+    python -m simulator --hours 24 --fonts /path/to/fonts --out /tmp/sim
+
+The flash directory gets the config, the fonts and everything the app
+writes. Every refresh of the panel is saved as a PNG in the output
+directory, the app's output goes to device.log there.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import time
+
+from simulator import board
+from simulator.device import APP_DIR, Device
+from simulator.fixture_server import FixtureServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+ACCESS_POINT_BSSID = b"\x02\x11\x22\x33\x44\x55"
+PERCENTILES = (50, 95)
+REPORTED_SPANS = (
+    "wifi",
+    "ntp",
+    "fetch",
+    "parse",
+    "restore",
+    "render",
+    "refresh",
+    "persist",
+    "loop",
+)
+
+
+def _percentile(sorted_values: list, percentile: int):
+    index = max(0, -(-len(sorted_values) * percentile // 100) - 1)
+    return sorted_values[index]
+
+
+def _png_writer(out_dir: str, every: int):
+    from PIL import Image
+
+    # the frame is LSB first with 1 for black, PNG is MSB first with 1 for white
+    flip = bytes(int(f"{b:08b}"[::-1], 2) ^ 0xFF for b in range(256))
+    refreshes = 0
+
+    def write(pixels: bytes):
+        nonlocal refreshes
+        refreshes += 1
+        if refreshes % every:
+            return
+        image = Image.frombytes(
+            "1", (board.WIDTH, board.HEIGHT), pixels.translate(flip)
+        )
+        image.save(os.path.join(out_dir, f"refresh-{refreshes:05d}.png"))
+
+    return write
+
+
+def _prepare_flash(
+    flash: str, config_path: str, fonts_dir: str, cycles: int, server_url: str
+) -> dict:
+    os.makedirs(os.path.join(flash, "fonts"), exist_ok=True)
+    for name in ("condensed.bin", "regular.bin"):
+        font_path = os.path.join(fonts_dir, name)
+        if not os.path.exists(font_path):
+            sys.exit(f"{font_path} is missing, run `just make-fonts` or pass --fonts")
+        shutil.copy(font_path, os.path.join(flash, "fonts", name))
+    with open(config_path) as config_file:
+        config = json.load(config_file)
+    # every wake's spans, the report is made from them
+    config["profile_cycles"] = cycles
+    config["departures_base_url"] = server_url
+    config["timezone_url"] = server_url + "/api/ip"
+    with open(os.path.join(flash, "config.json"), "w") as config_file:
+        json.dump(config, config_file)
+    return config
+
+
+def _spans(flash: str) -> dict[str, list[int]]:
+    sys.path.insert(0, APP_DIR)
+    import profiler
+
+    spans = dict()
+    try:
+        with open(os.path.join(flash, "profile.bin"), "rb") as profile_file:
+            cycles = profiler.read_cycles(profile_file.read())
+    except OSError:
+        return spans
+    for _, cycle_spans in cycles:
+        for name, _, elapsed_us, _, _ in cycle_spans:
+            spans.setdefault(name, []).append(elapsed_us)
+    return spans
+
+
+def _report(args, device: Device, server: FixtureServer, spans, host_sec) -> dict:
+    panel = device.board.panel
+    counts = device.board.counts
+    return {
+        "hours": args.hours,
+        "host_seconds": round(host_sec, 1),
+        "cpu_scale": args.cpu_scale,
+        "wakes": counts["deepsleeps"] + len(device.errors) + 1,
+        "loops": device.loops,
+        "crashes": len(device.errors),
+        "departure_requests": server.departure_requests,
+        "timezone_requests": server.timezone_requests,
+        "bytes_moved": server.bytes_sent,
+        "wifi_connects": counts["wifi_connects"],
+        "wifi_scans": counts["wifi_scans"],
+        "wifi_ms": int(counts["wifi_ms"]),
+        "ntp_requests": counts["ntp_requests"],
+        "clock_error_max_sec": round(device.max_clock_error, 1),
+        "full_refreshes": panel.full_refreshes,
+        "partial_refreshes": panel.partial_refreshes,
+        "panel_ms": panel.refresh_ms,
+        "stale_pixels": panel.stale_pixels,
+        "spans_ms": {
+            name: {
+                f"p{p}": _percentile(sorted(spans[name]), p) / 1000 for p in PERCENTILES
+            }
+            | {"total": sum(spans[name]) / 1000}
+            for name in REPORTED_SPANS
+            if name in spans
+        },
+    }
+
+
+def _print_report(report: dict):
+    print(
+        f"{report['hours']}h simulated in {report['host_seconds']}s:"
+        f" {report['wakes']} wakes, {report['loops']} loops,"
+        f" {report['crashes']} crashes"
+    )
+    print(
+        f"fetches: {report['departure_requests']} departures,"
+        f" {report['timezone_requests']} timezone,"
+        f" {report['bytes_moved'] / 1024:.0f}kB moved"
+    )
+    print(
+        f"radio: {report['wifi_connects']} Wi-Fi connects,"
+        f" {report['wifi_scans']} scans ({report['wifi_ms'] / 1000:.0f}s),"
+        f" {report['ntp_requests']} NTP requests"
+        f" (clock off by up to {report['clock_error_max_sec']}s)"
+    )
+    print(
+        f"panel: {report['full_refreshes']} full, {report['partial_refreshes']}"
+        f" partial refreshes, {report['panel_ms'] / 1000:.0f}s modelled,"
+        f" {report['stale_pixels']} stale pixels"
+    )
+    print(f"spans, ms of host CPU x {report['cpu_scale']}:")
+    for name, values in report["spans_ms"].items():
+        print(
+            f"{name:>10}: "
+            + " ".join(f"{key} {value:9.1f}" for key, value in values.items())
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--start", default="2024-11-29T04:30:00+00:00")
+    parser.add_argument(
+        "--config", default=os.path.join(APP_DIR, "config.example.json")
+    )
+    parser.add_argument("--fonts", default=os.path.join(APP_DIR, "fonts"))
+    parser.add_argument("--fixtures", default=FIXTURES_DIR)
+    parser.add_argument("--out", default="/tmp/eink-sim")
+    parser.add_argument("--png-every", type=int, default=1, help="0 saves none")
+    parser.add_argument("--cpu-scale", type=float, default=50)
+    parser.add_argument("--drift-ppm", type=float, default=20)
+    parser.add_argument(
+        "--no-wifi", action="store_true", help="the access point is never in range"
+    )
+    parser.add_argument("--json", help="write the report here too")
+    args = parser.parse_args()
+
+    shutil.rmtree(args.out, ignore_errors=True)
+    flash = os.path.join(args.out, "flash")
+    os.makedirs(flash)
+    seconds = int(args.hours * 3600)
+
+    start = datetime.datetime.fromisoformat(args.start).timestamp()
+    clock = board.Clock(
+        int(start) - board.DEVICE_EPOCH_OFFSET, args.cpu_scale, args.drift_ppm
+    )
+    # HTTPS like the real API, the device's TLS sockets differ from CPython's
+    server = FixtureServer(args.fixtures, clock, tls=True)
+    # for async_fetch, asyncio verifies the certificate
+    os.environ["SSL_CERT_FILE"] = server.cert_path
+    server.start()
+    config = _prepare_flash(
+        flash, args.config, args.fonts, seconds // 60 + 16, server.url
+    )
+
+    with open(os.path.join(args.out, "device.log"), "w") as log:
+        device = Device(clock, flash, log)
+        if not args.no_wifi:
+            device.board.access_points = [
+                (config["wifi"]["ssid"], ACCESS_POINT_BSSID, 6, -61)
+            ]
+        if args.png_every:
+            device.board.on_refresh = _png_writer(args.out, args.png_every)
+        host_start = time.perf_counter()
+        try:
+            device.run(seconds)
+        finally:
+            server.stop()
+        host_sec = time.perf_counter() - host_start
+
+    report = _report(args, device, server, _spans(flash), host_sec)
+    _print_report(report)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+main()
@@ -0,0 +1,177 @@
+"""
+What the simulated board keeps across a reset: the clock, RTC memory, the
+panel and the counters of the run. The fake modules in simulator/fakes read
+and change it through `device`.
+"""
+
+import collections
+import contextlib
+import threading
+import time
+
+# MicroPython on the ESP32 counts seconds from 2000-01-01
+DEVICE_EPOCH_OFFSET = 946684800
+
+PWRON_RESET = 1
+HARD_RESET = 2
+DEEPSLEEP_RESET = 4
+
+# modelled durations, the app's own work is timed by Clock
+BOOT_MS = 900
+# LittleFS looking up and opening a file
+FLASH_OPEN_MS = 5
+# clean + draw of the README's refresh timing
+FULL_REFRESH_MS = 1152
+PARTIAL_REFRESH_MS = 301
+
+WIDTH = 800
+HEIGHT = 600
+
+# the board the fakes act on, set by Device
+device = None
+
+
+class DeepSleep(BaseException):
+    "machine.deepsleep() never returns, the app starts over after a reset"
+
+
+class Reset(BaseException):
+    "machine.reset()"
+
+
+class Clock:
+    """
+    Time of the simulated board. It moves by what is modelled (sleeps, boot,
+    radio, panel) and by the host CPU time of the app times `cpu_scale`, a
+    rough factor between CPython on the host and MicroPython on the ESP32.
+    The RTC, which the app reads, runs `drift_ppm` off and is only right
+    after it was set. A `realtime` clock moves with the host's wall clock
+    instead of the app's CPU time, for measuring real network waits.
+    """
+
+    def __init__(
+        self,
+        start: int,
+        cpu_scale: float = 1,
+        drift_ppm: float = 0,
+        realtime: bool = False,
+    ) -> None:
+        self.start = start
+        self.cpu_scale = cpu_scale
+        self.drift_ppm = drift_ppm
+        self.realtime = realtime
+        self._modelled_us = 0
+        self._excluded = 0.0
+        self._boot_us = 0
+        # the CPU clock of the thread running the app, the fixture server
+        # reads the time from its own thread
+        try:
+            cpu_clock = time.pthread_getcpuclockid(threading.get_ident())
+            self._cpu = lambda: time.clock_gettime(cpu_clock)
+        except (AttributeError, OSError):
+            self._cpu = time.process_time
+        if realtime:
+            self._cpu = time.perf_counter
+        self._cpu_start = self._cpu()
+        self._rtc_offset = 0.0
+        self._rtc_set_at = float(start)
+
+    def elapsed_us(self) -> int:
+        cpu = self._cpu() - self._cpu_start - self._excluded
+        return self._modelled_us + int(cpu * 1e6 * self.cpu_scale)
+
+    def advance_ms(self, ms: float):
+        self._modelled_us += int(ms * 1000)
+
+    def now(self) -> float:
+        "True time, seconds since 2000-01-01"
+        return self.start + self.elapsed_us() / 1e6
+
+    def rtc(self) -> float:
+        "What the board's RTC says, seconds since 2000-01-01"
+        now = self.now()
+        return now + self._rtc_offset + (now - self._rtc_set_at) * self.drift_ppm / 1e6
+
+    def set_rtc(self, seconds: float):
+        now = self.now()
+        self._rtc_offset = seconds - now
+        self._rtc_set_at = now
+
+    def boot(self):
+        "ticks count from the reset"
+        self._boot_us = self.elapsed_us()
+        self.advance_ms(BOOT_MS)
+
+    def ticks_us(self) -> int:
+        return self.elapsed_us() - self._boot_us
+
+    @contextlib.contextmanager
+    def excluded(self):
+        "Simulator work that the board would not do, e.g. writing PNGs"
+        start = self._cpu()
+        try:
+            yield
+        finally:
+            self._excluded += self._cpu() - start
+
+
+class Panel:
+    """
+    The e-paper panel keeps its picture across resets. A partial update only
+    drives the pixels that differ from the driver's snapshot, so a snapshot
+    that is not what the panel shows leaves stale pixels behind.
+    """
+
+    def __init__(self) -> None:
+        self.pixels = bytes(WIDTH * HEIGHT // 8)
+        self.full_refreshes = 0
+        self.partial_refreshes = 0
+        self.refresh_ms = 0
+        # pixels left different from the frame after a partial update
+        self.stale_pixels = 0
+
+    def full(self, frame: bytes):
+        self.pixels = bytes(frame)
+        self.full_refreshes += 1
+        self.refresh_ms += FULL_REFRESH_MS
+        device.clock.advance_ms(FULL_REFRESH_MS)
+
+    def partial(self, snapshot: bytes, frame: bytes):
+        new = int.from_bytes(frame, "little")
+        driven = int.from_bytes(snapshot, "little") ^ new
+        shown = int.from_bytes(self.pixels, "little")
+        shown = (shown & ~driven) | (new & driven)
+        self.pixels = shown.to_bytes(len(frame), "little")
+        self.stale_pixels += bin(shown ^ new).count("1")
+        self.partial_refreshes += 1
+        self.refresh_ms += PARTIAL_REFRESH_MS
+        device.clock.advance_ms(PARTIAL_REFRESH_MS)
+
+
+class Board:
+    def __init__(self, clock: Clock) -> None:
+        self.clock = clock
+        self.panel = Panel()
+        self.rtc_memory = b""
+        self.reset_cause = PWRON_RESET
+        # Wi-Fi access points in reach, (ssid, bssid, channel, rssi)
+        self.access_points = []
+        self.wlan_active = False
+        self.wlan_connected = False
+        # (started, done, access point or None) of a connect in progress
+        self.wlan_connecting = None
+        self.wlan_static_ifconfig = None
+        self.counts = collections.Counter()
+        # called with the panel pixels after every refresh
+        self.on_refresh = None
+
+    def reset(self, cause: int):
+        self.reset_cause = cause
+        self.wlan_active = False
+        self.wlan_connected = False
+        self.wlan_connecting = None
+        self.wlan_static_ifconfig = None
+        if cause == PWRON_RESET:
+            self.rtc_memory = b""
+            self.clock.set_rtc(0)
+        self.clock.boot()
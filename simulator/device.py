@@ -0,0 +1,257 @@
+"""
+Runs the app on CPython as if it was on the board.
+
+The fakes directory goes first on sys.path, so `import machine` & co. get
+the stand-ins. The parts of `time`, `gc` and `sys` that only MicroPython
+has are patched in, with `time` reading the simulated RTC. Absolute paths
+the host does not have (/cache.bin, /fonts/...) are the board's flash and
+live in a directory on the host. `ssl` is swapped for the fake too, the
+host's stays in sys.modules for everything else.
+
+A deep sleep ends in a reset, so every wake imports the app again with
+only RTC memory, flash and the panel left from before.
+"""
+
+# imported before the fakes are, so asyncio keeps the host's ssl
+import asyncio
+import builtins
+import calendar
+import contextlib
+import gc
+import os
+import ssl
+import sys
+import time
+import traceback
+
+from simulator import board
+
+FAKES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fakes")
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# what gc.mem_free() says, the Inkplate has 4MB of PSRAM
+HEAP_BYTES = 4 * 1024 * 1024
+# consecutive crashes before the run gives up
+MAX_RESETS = 3
+
+
+class _Patches:
+    def __init__(self) -> None:
+        self._undo = []
+
+    def set(self, target, name: str, value):
+        missing = not hasattr(target, name)
+        self._undo.append((target, name, missing, getattr(target, name, None)))
+        setattr(target, name, value)
+
+    def undo(self):
+        while self._undo:
+            target, name, missing, value = self._undo.pop()
+            if missing:
+                delattr(target, name)
+            else:
+                setattr(target, name, value)
+
+
+class Flash:
+    """
+    Maps the board's absolute paths into `root` on the host, opening a file
+    on the board's flash costs FLASH_OPEN_MS.
+    """
+
+    def __init__(self, root: str, clock: board.Clock) -> None:
+        self.root = root
+        self.clock = clock
+        self._host_entries = set(os.listdir("/"))
+
+    def path(self, path):
+        if (
+            isinstance(path, str)
+            and path.startswith("/")
+            and path.lstrip("/").split("/")[0] not in self._host_entries
+        ):
+            return os.path.join(self.root, path.lstrip("/"))
+        return path
+
+    def patch(self, patches: _Patches):
+        def mapped(function):
+            return lambda path, *args, **kwargs: function(
+                self.path(path), *args, **kwargs
+            )
+
+        host_open = builtins.open
+
+        def flash_open(path, *args, **kwargs):
+            mapped_path = self.path(path)
+            if isinstance(path, str) and (
+                mapped_path is not path or not os.path.isabs(path)
+            ):
+                self.clock.advance_ms(board.FLASH_OPEN_MS)
+            return host_open(mapped_path, *args, **kwargs)
+
+        patches.set(builtins, "open", flash_open)
+        for name in ("remove", "stat", "listdir", "mkdir"):
+            patches.set(os, name, mapped(getattr(os, name)))
+        rename = os.rename
+        patches.set(
+            os, "rename", lambda old, new: rename(self.path(old), self.path(new))
+        )
+
+
+def _device_time(clock: board.Clock):
+    def gmtime(seconds=None):
+        if seconds is None:
+            seconds = clock.rtc()
+        return tuple(_host_gmtime(seconds + board.DEVICE_EPOCH_OFFSET)[:8])
+
+    def mktime(t) -> int:
+        return calendar.timegm(tuple(t[:6]) + (0, 0, 0)) - board.DEVICE_EPOCH_OFFSET
+
+    def sleep_ms(ms: int):
+        clock.advance_ms(ms)
+
+    return {
+        "time": lambda: int(clock.rtc()),
+        "gmtime": gmtime,
+        # the board has no timezone, local time is UTC
+        "localtime": gmtime,
+        "mktime": mktime,
+        "sleep": lambda seconds: sleep_ms(seconds * 1000),
+        "sleep_ms": sleep_ms,
+        "sleep_us": lambda us: sleep_ms(us / 1000),
+        "ticks_ms": lambda: clock.ticks_us() // 1000,
+        "ticks_us": clock.ticks_us,
+        "ticks_diff": lambda end, start: end - start,
+        "ticks_add": lambda ticks, delta: ticks + delta,
+    }
+
+
+_host_gmtime = time.gmtime
+
+
+def _print_exception(e, file=None):
+    traceback.print_exception(type(e), e, e.__traceback__, file=file or sys.stdout)
+
+
+def _modules_in(directory: str) -> list[str]:
+    return [
+        name
+        for name, module in sys.modules.items()
+        if os.path.dirname(os.path.abspath(getattr(module, "__file__", None) or ""))
+        == directory
+    ]
+
+
+def _drop_connections():
+    "A reset ends the board's connections, the host has to close its sockets"
+    http_pool = sys.modules.get("http_pool")
+    if http_pool is not None:
+        http_pool.POOL.close_all()
+    async_fetch = sys.modules.get("async_fetch")
+    if async_fetch is not None and async_fetch._loop is not None:
+        # closing TLS transports takes a few rounds of the loop with the server
+        async_fetch._loop.run_until_complete(asyncio.sleep(0.05))
+        async_fetch._loop.close()
+
+
+class Device:
+    def __init__(self, clock: board.Clock, flash_root: str, log) -> None:
+        self.board = board.Board(clock)
+        self.flash = Flash(flash_root, clock)
+        self.log = log
+        self.loops = 0
+        self.resets = 0
+        self.errors = []
+        # most the app's time was off at the start of a loop, after the
+        # first NTP sync
+        self.max_clock_error = 0.0
+
+    @contextlib.contextmanager
+    def installed(self):
+        """
+        The board's modules and flash in place of the host's, app modules
+        imported inside are dropped at the end
+        """
+        patches = _Patches()
+        cwd = os.getcwd()
+        board.device = self.board
+        # the app's `import ssl` gets the fake, it does the TLS with this one
+        del sys.modules["ssl"]
+        sys.path.insert(0, FAKES_DIR)
+        if APP_DIR not in sys.path:
+            sys.path.insert(1, APP_DIR)
+        try:
+            patches.set(builtins, "micropython", __import__("micropython"))
+            for name, function in _device_time(self.board.clock).items():
+                patches.set(time, name, function)
+            patches.set(gc, "mem_free", lambda: HEAP_BYTES)
+            patches.set(gc, "mem_alloc", lambda: 0)
+            patches.set(sys, "print_exception", _print_exception)
+            self.flash.patch(patches)
+            os.chdir(self.flash.root)
+            with contextlib.redirect_stdout(self.log):
+                yield
+        finally:
+            _drop_connections()
+            os.chdir(cwd)
+            patches.undo()
+            sys.path.remove(FAKES_DIR)
+            for name in _modules_in(APP_DIR) + _modules_in(FAKES_DIR):
+                del sys.modules[name]
+            sys.modules["ssl"] = ssl
+            board.device = None
+
+    def _boot(self, cause: int):
+        _drop_connections()
+        for name in _modules_in(APP_DIR):
+            del sys.modules[name]
+        self.board.reset(cause)
+        import ui
+
+        loop = ui.loop
+
+        def counted_loop(config, cache):
+            now = self.board.clock.now()
+            if now >= self._end:
+                raise _Stop()
+            if self.board.counts["ntp_requests"]:
+                clock_error = abs(sys.modules["dateutil"].now_epoch() - now)
+                self.max_clock_error = max(self.max_clock_error, clock_error)
+            self.loops += 1
+            loop(config, cache)
+
+        ui.loop = counted_loop
+        ui.main()
+
+    def run(self, seconds: int):
+        self._end = self.board.clock.now() + seconds
+        cause = board.PWRON_RESET
+        try:
+            with self.installed():
+                while self.board.clock.now() < self._end:
+                    try:
+                        self._boot(cause)
+                    except board.DeepSleep:
+                        cause = board.DEEPSLEEP_RESET
+                        self.resets = 0
+                    except board.Reset:
+                        cause = board.HARD_RESET
+                        self._crashed()
+        except _Stop:
+            pass
+
+    def _crashed(self):
+        self.resets += 1
+        try:
+            with open(self.flash.path("/error.log")) as error_log:
+                self.errors.append(error_log.read().strip())
+        except OSError:
+            self.errors.append("reset without /error.log")
+        if self.resets >= MAX_RESETS:
+            raise RuntimeError(
+                f"the app crashed {self.resets} times in a row:\n{self.errors[-1]}"
+            )
+
+
+class _Stop(BaseException):
+    pass
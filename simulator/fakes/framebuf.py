@@ -0,0 +1,103 @@
+"""
+Stand-in for MicroPython's framebuf, only the MONO_HMSB format and the
+methods the app uses. Rows are handled as Python ints, bit x of a row is
+pixel x, so blits and fills cost a few int operations per row.
+"""
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width: int, height: int, format: int, stride=None):
+        if format != MONO_HMSB:
+            raise ValueError("only MONO_HMSB is simulated")
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self._row_bytes = ((stride or width) + 7) // 8
+        if len(buffer) < self._row_bytes * height:
+            raise ValueError("buffer too small")
+
+    def _row(self, y: int) -> int:
+        start = y * self._row_bytes
+        return int.from_bytes(self.buffer[start : start + self._row_bytes], "little")
+
+    def _set_row(self, y: int, row: int):
+        start = y * self._row_bytes
+        size = self._row_bytes
+        self.buffer[start : start + size] = (row & ((1 << size * 8) - 1)).to_bytes(
+            size, "little"
+        )
+
+    def pixel(self, x: int, y: int, c: int | None = None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        index = y * self._row_bytes + (x >> 3)
+        bit = 1 << (x & 7)
+        if c is None:
+            return 1 if self.buffer[index] & bit else 0
+        if c:
+            self.buffer[index] |= bit
+        else:
+            self.buffer[index] &= ~bit & 0xFF
+
+    def fill(self, c: int):
+        size = self._row_bytes * self.height
+        self.buffer[:size] = (b"\xff" if c else b"\x00") * size
+
+    def fill_rect(self, x: int, y: int, w: int, h: int, c: int):
+        x1, y1 = max(x, 0), max(y, 0)
+        x2, y2 = min(x + w, self.width), min(y + h, self.height)
+        if x2 <= x1 or y2 <= y1:
+            return
+        mask = ((1 << (x2 - x1)) - 1) << x1
+        for row_y in range(y1, y2):
+            row = self._row(row_y)
+            self._set_row(row_y, row | mask if c else row & ~mask)
+
+    def hline(self, x: int, y: int, w: int, c: int):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x: int, y: int, h: int, c: int):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x: int, y: int, w: int, h: int, c: int, f: bool = False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.fill_rect(x, y, w, 1, c)
+        self.fill_rect(x, y + h - 1, w, 1, c)
+        self.fill_rect(x, y, 1, h, c)
+        self.fill_rect(x + w - 1, y, 1, h, c)
+
+    def blit(self, fbuf: "FrameBuffer", x: int, y: int, key: int = -1, palette=None):
+        if (
+            key == -1
+            and x == 0
+            and y == 0
+            and fbuf.height == self.height
+            and fbuf.width == self.width
+            and fbuf._row_bytes == self._row_bytes
+        ):
+            size = self._row_bytes * self.height
+            self.buffer[:size] = fbuf.buffer[:size]
+            return
+
+        skip = -x if x < 0 else 0
+        shift = max(x, 0)
+        width = min(fbuf.width - skip, self.width - shift)
+        if width <= 0:
+            return
+        mask = (1 << width) - 1
+        for src_y in range(max(-y, 0), min(fbuf.height, self.height - y)):
+            bits = (fbuf._row(src_y) >> skip) & mask
+            row = self._row(y + src_y)
+            if key == -1:
+                row = (row & ~(mask << shift)) | (bits << shift)
+            elif key == 0:
+                row |= bits << shift
+            else:
+                row &= ~((~bits & mask) << shift)
+            self._set_row(y + src_y, row)
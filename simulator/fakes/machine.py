@@ -0,0 +1,46 @@
+"Stand-in for MicroPython's machine module, see simulator/board.py"
+
+import time
+
+from simulator import board
+
+PWRON_RESET = board.PWRON_RESET
+HARD_RESET = board.HARD_RESET
+DEEPSLEEP_RESET = board.DEEPSLEEP_RESET
+
+
+def reset_cause() -> int:
+    return board.device.reset_cause
+
+
+def lightsleep(time_ms: int = 0):
+    board.device.counts["lightsleeps"] += 1
+    board.device.clock.advance_ms(time_ms)
+
+
+def deepsleep(time_ms: int = 0):
+    board.device.counts["deepsleeps"] += 1
+    board.device.clock.advance_ms(time_ms)
+    raise board.DeepSleep(time_ms)
+
+
+def reset():
+    raise board.Reset()
+
+
+class RTC:
+    def datetime(self, *datetimetuple):
+        if datetimetuple:
+            year, month, day, _, hour, minute, second, _ = datetimetuple[0]
+            board.device.clock.set_rtc(
+                time.mktime((year, month, day, hour, minute, second, 0, 0))
+            )
+            return None
+        year, month, day, hour, minute, second, weekday, _ = time.gmtime()
+        return (year, month, day, weekday + 1, hour, minute, second, 0)
+
+    def memory(self, *data):
+        if data:
+            board.device.rtc_memory = bytes(data[0])
+            return None
+        return board.device.rtc_memory
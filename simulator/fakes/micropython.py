@@ -0,0 +1,12 @@
+"Stand-in for MicroPython's micropython module, the code emitters are no-ops"
+
+
+def native(function):
+    return function
+
+
+viper = native
+
+
+def const(value):
+    return value
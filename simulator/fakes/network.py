@@ -0,0 +1,106 @@
+"""
+Stand-in for MicroPython's network module. Connecting takes modelled time
+and only works to an access point in board.device.access_points, with
+DHCP on top unless a static ifconfig was set.
+"""
+
+from simulator import board
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_WRONG_PASSWORD = 202
+STAT_NO_AP_FOUND = 201
+STAT_GOT_IP = 1010
+
+# active scan of all channels
+SCAN_MS = 1800
+# finding the access point, authentication and association
+ASSOC_MS = 1000
+DHCP_MS = 1500
+DHCP_IFCONFIG = ("192.168.1.23", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+
+def _now_ms() -> float:
+    return board.device.clock.now() * 1000
+
+
+class WLAN:
+    def __init__(self, interface: int = STA_IF) -> None:
+        self._interface = interface
+
+    def active(self, is_active: bool | None = None):
+        if is_active is None:
+            return board.device.wlan_active
+        board.device.wlan_active = bool(is_active)
+        if not is_active:
+            self.disconnect()
+
+    def scan(self) -> list[tuple]:
+        if not board.device.wlan_active:
+            raise OSError("Wifi Not Started")
+        board.device.counts["wifi_scans"] += 1
+        board.device.counts["wifi_ms"] += SCAN_MS
+        board.device.clock.advance_ms(SCAN_MS)
+        return [
+            (ssid.encode(), bssid, channel, rssi, 3, False)
+            for ssid, bssid, channel, rssi in board.device.access_points
+        ]
+
+    def connect(self, ssid: str | None = None, key: str | None = None, bssid=None):
+        device = board.device
+        if not device.wlan_active:
+            raise OSError("Wifi Not Started")
+        device.counts["wifi_connects"] += 1
+        ap = None
+        for candidate in device.access_points:
+            if candidate[0] == ssid and bssid in (None, candidate[1]):
+                ap = candidate
+                break
+        duration_ms = ASSOC_MS
+        if ap is not None and device.wlan_static_ifconfig is None:
+            duration_ms += DHCP_MS
+        started = _now_ms()
+        device.wlan_connected = False
+        device.wlan_connecting = (started, started + duration_ms, ap)
+
+    def _poll(self):
+        device = board.device
+        if device.wlan_connecting is None:
+            return
+        started, done, ap = device.wlan_connecting
+        if ap is not None and _now_ms() >= done:
+            device.counts["wifi_ms"] += done - started
+            device.wlan_connecting = None
+            device.wlan_connected = True
+
+    def disconnect(self):
+        device = board.device
+        if device.wlan_connecting is not None:
+            started, _, _ = device.wlan_connecting
+            device.counts["wifi_ms"] += _now_ms() - started
+        device.wlan_connecting = None
+        device.wlan_connected = False
+
+    def isconnected(self) -> bool:
+        self._poll()
+        return board.device.wlan_connected
+
+    def status(self, *args):
+        self._poll()
+        device = board.device
+        if device.wlan_connected:
+            return STAT_GOT_IP
+        if device.wlan_connecting is None:
+            return STAT_IDLE
+        _, done, ap = device.wlan_connecting
+        if ap is None and _now_ms() >= done:
+            return STAT_NO_AP_FOUND
+        return STAT_CONNECTING
+
+    def ifconfig(self, *args):
+        if not args:
+            return board.device.wlan_static_ifconfig or DHCP_IFCONFIG
+        board.device.wlan_static_ifconfig = None if args[0] == "dhcp" else args[0]
@@ -0,0 +1,21 @@
+"Stand-in for MicroPython's ntptime, answers with the simulator's true time"
+
+from simulator import board
+
+host = "pool.ntp.org"
+timeout = 1
+
+# one UDP round trip
+ROUND_TRIP_MS = 150
+
+
+def time() -> int:
+    if not board.device.wlan_connected:
+        raise OSError(113)
+    board.device.counts["ntp_requests"] += 1
+    board.device.clock.advance_ms(ROUND_TRIP_MS)
+    return int(board.device.clock.now())
+
+
+def settime():
+    board.device.clock.set_rtc(time())
@@ -0,0 +1,68 @@
+"""
+Stand-in for the Inkplate 6 driver in 1-bit mode. Refreshes go to the
+simulated panel, which models their duration and what ends up on screen.
+"""
+
+from framebuf import FrameBuffer, MONO_HMSB
+
+from simulator import board
+
+
+class _PartialSnapshot:
+    def __init__(self, inkplate: "Inkplate") -> None:
+        self._inkplate = inkplate
+
+    def start(self):
+        "What partialUpdate compares the next frame with"
+        self._inkplate._snapshot = bytes(self._inkplate.ipm.buffer)
+
+
+class Inkplate:
+    INKPLATE_1BIT = 0
+    INKPLATE_2BIT = 1
+
+    def __init__(self, mode: int) -> None:
+        if mode != Inkplate.INKPLATE_1BIT:
+            raise ValueError("only INKPLATE_1BIT is simulated")
+        self.ipm = FrameBuffer(
+            bytearray(board.WIDTH * board.HEIGHT // 8),
+            board.WIDTH,
+            board.HEIGHT,
+            MONO_HMSB,
+        )
+        self.ipp = _PartialSnapshot(self)
+        # the driver starts from a blank snapshot after every reset
+        self._snapshot = bytes(len(self.ipm.buffer))
+
+    def begin(self):
+        pass
+
+    def width(self) -> int:
+        return board.WIDTH
+
+    def height(self) -> int:
+        return board.HEIGHT
+
+    def clearDisplay(self):
+        self.ipm.fill(0)
+
+    def display(self):
+        board.device.panel.full(self.ipm.buffer)
+        self._snapshot = bytes(self.ipm.buffer)
+        self._refreshed()
+
+    def partialUpdate(self):
+        board.device.panel.partial(self._snapshot, self.ipm.buffer)
+        self._snapshot = bytes(self.ipm.buffer)
+        self._refreshed()
+
+    def einkOn(self):
+        pass
+
+    def einkOff(self):
+        pass
+
+    def _refreshed(self):
+        if board.device.on_refresh is not None:
+            with board.device.clock.excluded():
+                board.device.on_refresh(board.device.panel.pixels)
@@ -0,0 +1,77 @@
+"""
+Stand-in for MicroPython's ssl module. The TLS is CPython's, but the
+sockets it returns have only the methods MicroPython's have: no makefile
+and no settimeout, the timeout of the socket that was wrapped applies.
+"""
+
+from simulator.device import ssl as _host_ssl
+
+PROTOCOL_TLS_CLIENT = 0
+PROTOCOL_TLS_SERVER = 1
+CERT_NONE = 0
+CERT_OPTIONAL = 1
+CERT_REQUIRED = 2
+
+
+class SSLSocket:
+    def __init__(self, sock, host_context, server_hostname) -> None:
+        self._raw = sock
+        self._tls = host_context.wrap_socket(
+            sock.dup(), server_hostname=server_hostname
+        )
+        self._file = self._tls.makefile("rwb")
+
+    def _stream(self):
+        self._tls.settimeout(self._raw.gettimeout())
+        return self._file
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            return self._stream().read()
+        return self._stream().read1(size)
+
+    def readinto(self, buf) -> int:
+        return self._stream().readinto1(buf)
+
+    def readline(self) -> bytes:
+        return self._stream().readline()
+
+    def write(self, data) -> int:
+        stream = self._stream()
+        written = stream.write(data)
+        stream.flush()
+        return written
+
+    def setblocking(self, flag: bool):
+        self._raw.setblocking(flag)
+
+    def close(self):
+        self._file.close()
+        self._tls.close()
+        self._raw.close()
+
+
+class SSLContext:
+    def __init__(self, protocol: int) -> None:
+        self.verify_mode = CERT_REQUIRED if protocol == PROTOCOL_TLS_CLIENT else CERT_NONE
+
+    def wrap_socket(
+        self,
+        sock,
+        server_side: bool = False,
+        do_handshake_on_connect: bool = True,
+        server_hostname: str | None = None,
+    ) -> SSLSocket:
+        host_context = _host_ssl.SSLContext(_host_ssl.PROTOCOL_TLS_CLIENT)
+        if self.verify_mode == CERT_NONE:
+            host_context.check_hostname = False
+            host_context.verify_mode = _host_ssl.CERT_NONE
+        else:
+            host_context.load_default_certs()
+        return SSLSocket(sock, host_context, server_hostname)
+
+
+def wrap_socket(sock, server_side: bool = False, cert_reqs: int = CERT_NONE, **kwargs):
+    context = SSLContext(PROTOCOL_TLS_SERVER if server_side else PROTOCOL_TLS_CLIENT)
+    context.verify_mode = cert_reqs
+    return context.wrap_socket(sock, server_side=server_side, **kwargs)
@@ -0,0 +1,382 @@
+"""
+Local stand-in for the departures and timezone APIs.
+
+A fixture is a recorded departures response of one stop, saved as
+fixtures/<stop id>.json. Its departures are replayed around the simulated
+time: the span the recording covers repeats, so a fixture of an hour serves
+a whole day. The query parameters the app sends (duration, results, remarks
+and excluded products) are applied like the real API does.
+
+Faults shape every response: latency and bandwidth, chunked encoding for
+HTTP/1.1 clients, and a share of 503s, stalled responses that run into the
+client's timeout and bodies cut off in the middle. On a simulated clock the
+waits are modelled, on a realtime one they really happen.
+
+With `tls` it serves HTTPS like the real API, with a self-signed
+certificate for 127.0.0.1 made by the openssl command. Clients that verify
+certificates find it through SSL_CERT_FILE.
+"""
+
+import collections
+import copy
+import datetime
+import http.server
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from simulator import board
+
+Faults = collections.namedtuple(
+    "Faults",
+    (
+        "latency_ms",
+        "bandwidth_kbit",
+        "chunked",
+        "error_rate",
+        "stall_rate",
+        "truncate_rate",
+    ),
+)
+DEFAULT_FAULTS = Faults(150, 2000, False, 0, 0, 0)
+
+# longer than any fetch timeout, then the connection is closed
+STALL_MS = 30000
+CHUNK_BYTES = 1024
+# written at once before waiting for the bandwidth
+SEGMENT_BYTES = 1460
+
+# the app patches time.sleep on the simulated board
+_host_sleep = time.sleep
+
+
+def _epoch(iso: str) -> float:
+    return datetime.datetime.fromisoformat(iso).timestamp() - board.DEVICE_EPOCH_OFFSET
+
+
+def _iso(seconds: float, utc_offset: int) -> str:
+    zone = datetime.timezone(datetime.timedelta(seconds=utc_offset))
+    return datetime.datetime.fromtimestamp(
+        seconds + board.DEVICE_EPOCH_OFFSET, zone
+    ).isoformat()
+
+
+class Fixture:
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as fixture_file:
+            self.departures = json.load(fixture_file)["departures"]
+        planned = [_epoch(d["plannedWhen"]) for d in self.departures]
+        self.first = min(planned)
+        # the recording repeats after the minute its last departure is in
+        self.period = (max(planned) - self.first) // 60 * 60 + 60
+        self._offsets = [p - self.first for p in planned]
+
+    def replay(self, start: float, duration_sec: int, utc_offset: int) -> list[dict]:
+        "Departures planned from `start` on, for `duration_sec`"
+        cycle = (start - self.first) // self.period
+        replayed = []
+        while True:
+            cycle_start = self.first + cycle * self.period
+            if cycle_start >= start + duration_sec:
+                break
+            for offset, departure in zip(self._offsets, self.departures):
+                planned = cycle_start + offset
+                if start <= planned < start + duration_sec:
+                    replayed.append((planned, departure))
+            cycle += 1
+        replayed.sort(key=lambda item: item[0])
+
+        result = []
+        for planned, departure in replayed:
+            departure = copy.deepcopy(departure)
+            departure["plannedWhen"] = _iso(planned, utc_offset)
+            if departure.get("when") is not None:
+                departure["when"] = _iso(
+                    planned + (departure["delay"] or 0), utc_offset
+                )
+            result.append(departure)
+        return result
+
+
+class FixtureServer:
+    def __init__(
+        self,
+        fixtures_dir: str,
+        clock: board.Clock,
+        faults: Faults = DEFAULT_FAULTS,
+        utc_offset: int = 3600,
+        timezone: str = "Europe/Berlin",
+        seed: int = 0,
+        tls: bool = False,
+    ) -> None:
+        self.clock = clock
+        self.faults = faults
+        self.random = random.Random(seed)
+        self.utc_offset = utc_offset
+        self.timezone = timezone
+        self.fixtures = {
+            name[: -len(".json")]: Fixture(os.path.join(fixtures_dir, name))
+            for name in os.listdir(fixtures_dir)
+            if name.endswith(".json")
+        }
+        self.requests = 0
+        self.bytes_sent = 0
+        self.departure_requests = 0
+        self.timezone_requests = 0
+        self.injected = collections.Counter()
+        self._httpd = _Server(("127.0.0.1", 0), _Handler)
+        self._httpd.fixture_server = self
+        self._process = None
+        self._cert_dir = None
+        self.cert_path = None
+        if tls:
+            self._serve_tls()
+
+    def _serve_tls(self):
+        self._cert_dir = tempfile.mkdtemp(prefix="fixture-server-")
+        self.cert_path = os.path.join(self._cert_dir, "cert.pem")
+        key_path = os.path.join(self._cert_dir, "key.pem")
+        subprocess.run(
+            [
+                "openssl",
+                "req",
+                "-x509",
+                "-newkey",
+                "ec",
+                "-pkeyopt",
+                "ec_paramgen_curve:prime256v1",
+                "-nodes",
+                "-days",
+                "2",
+                "-subj",
+                "/CN=127.0.0.1",
+                "-addext",
+                "subjectAltName=IP:127.0.0.1",
+                "-keyout",
+                key_path,
+                "-out",
+                self.cert_path,
+            ],
+            check=True,
+            capture_output=True,
+        )
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.cert_path, key_path)
+        # the handshake happens in the handler's thread, not while accepting
+        self._httpd.socket = context.wrap_socket(
+            self._httpd.socket, server_side=True, do_handshake_on_connect=False
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        scheme = "https" if self.cert_path else "http"
+        return f"{scheme}://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def start_process(self):
+        """
+        Serves from a forked process instead, so building the responses does
+        not show up in the client's memory. Needs a realtime clock.
+        """
+        pipe, child_pipe = multiprocessing.Pipe()
+        process = multiprocessing.get_context("fork").Process(
+            target=self._serve_until_stopped, args=(child_pipe,), daemon=True
+        )
+        process.start()
+        self._process = (process, pipe)
+
+    def _serve_until_stopped(self, pipe):
+        self.start()
+        pipe.recv()
+        self._httpd.shutdown()
+        pipe.send(
+            (
+                self.requests,
+                self.bytes_sent,
+                self.departure_requests,
+                self.timezone_requests,
+                self.injected,
+            )
+        )
+
+    def stop(self):
+        if self._process is not None:
+            process, pipe = self._process
+            pipe.send("stop")
+            (
+                self.requests,
+                self.bytes_sent,
+                self.departure_requests,
+                self.timezone_requests,
+                self.injected,
+            ) = pipe.recv()
+            process.join()
+        else:
+            self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._cert_dir:
+            shutil.rmtree(self._cert_dir)
+
+    def departures(self, stop_id: str, query: dict[str, str]) -> dict | None:
+        fixture = self.fixtures.get(stop_id)
+        if fixture is None:
+            return None
+        now = self.clock.now()
+        departures = fixture.replay(
+            now - 60, int(query.get("duration", "10")) * 60 + 60, self.utc_offset
+        )
+        excluded = set(name for name, value in query.items() if value == "false")
+        departures = [d for d in departures if d["line"]["product"] not in excluded]
+        if query.get("remarks") == "false":
+            for departure in departures:
+                departure["remarks"] = []
+        if "results" in query:
+            departures = departures[: int(query["results"])]
+        return {"departures": departures, "realtimeDataUpdatedAt": int(now)}
+
+    def tz_info(self) -> dict:
+        now = self.clock.now()
+        return {
+            "abbreviation": "CET",
+            "client_ip": "127.0.0.1",
+            "datetime": _iso(now, self.utc_offset),
+            "day_of_week": 5,
+            "day_of_year": 334,
+            "dst": False,
+            "dst_from": None,
+            "dst_offset": 0,
+            "dst_until": None,
+            "raw_offset": self.utc_offset,
+            "timezone": self.timezone,
+            "unixtime": int(now + board.DEVICE_EPOCH_OFFSET),
+            "utc_datetime": _iso(now, 0),
+            "utc_offset": _iso(now, self.utc_offset)[-6:],
+            "week_number": 48,
+        }
+
+    def wait(self, ms: float):
+        if self.clock.realtime:
+            _host_sleep(ms / 1000)
+        else:
+            self.clock.advance_ms(ms)
+
+    def fault(self) -> str | None:
+        "Fault to inject into the next response, if any"
+        roll = self.random.random()
+        for name, rate in (
+            ("error", self.faults.error_rate),
+            ("stall", self.faults.stall_rate),
+            ("truncate", self.faults.truncate_rate),
+        ):
+            if roll < rate:
+                self.injected[name] += 1
+                return name
+            roll -= rate
+        return None
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    # stalled handlers must not hold up shutting down
+    daemon_threads = True
+    block_on_close = False
+
+    def handle_error(self, request, client_address):
+        # clients close the connection once they have read enough
+        if not isinstance(sys.exc_info()[1], (ConnectionError, ssl.SSLEOFError)):
+            super().handle_error(request, client_address)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server.fixture_server
+        url = urllib.parse.urlsplit(self.path)
+        parts = url.path.strip("/").split("/")
+        body = None
+        if len(parts) == 3 and parts[0] == "stops" and parts[2] == "departures":
+            server.departure_requests += 1
+            query = dict(urllib.parse.parse_qsl(url.query))
+            body = server.departures(parts[1], query)
+        elif url.path == "/api/ip":
+            server.timezone_requests += 1
+            body = server.tz_info()
+
+        if body is None:
+            self._send(404, b'{"message": "not found"}')
+        else:
+            self._send(200, json.dumps(body).encode())
+
+    def _send(self, status: int, body: bytes):
+        server = self.server.fixture_server
+        faults = server.faults
+        fault = server.fault()
+        server.requests += 1
+        server.wait(faults.latency_ms)
+        if fault == "stall":
+            server.wait(STALL_MS)
+            self.close_connection = True
+            return
+        if fault == "error":
+            status, body = 503, b'{"message": "upstream unavailable"}'
+
+        close = fault == "truncate" or (
+            self.request_version == "HTTP/1.0"
+            or self.headers.get("Connection", "").lower() == "close"
+        )
+        chunked = faults.chunked and self.request_version == "HTTP/1.1"
+        head = (
+            f"HTTP/1.1 {status} {self.responses[status][0]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            + (
+                "Transfer-Encoding: chunked\r\n"
+                if chunked
+                else f"Content-Length: {len(body)}\r\n"
+            )
+            + f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        if chunked:
+            body = (
+                b"".join(
+                    b"%x\r\n%s\r\n" % (len(chunk), chunk)
+                    for chunk in (
+                        body[i : i + CHUNK_BYTES]
+                        for i in range(0, len(body), CHUNK_BYTES)
+                    )
+                )
+                + b"0\r\n\r\n"
+            )
+        if fault == "truncate":
+            body = body[: int(len(body) * server.random.uniform(0.1, 0.9))]
+        self._write(head.encode() + body)
+        self.close_connection = close
+
+    def _write(self, data: bytes):
+        server = self.server.fixture_server
+        bytes_per_ms = server.faults.bandwidth_kbit / 8
+        # counted as it goes out, the client may hang up before the end
+        if not server.clock.realtime:
+            self.wfile.write(data)
+            server.bytes_sent += len(data)
+            server.wait(len(data) / bytes_per_ms)
+        else:
+            for i in range(0, len(data), SEGMENT_BYTES):
+                segment = data[i : i + SEGMENT_BYTES]
+                self.wfile.write(segment)
+                server.bytes_sent += len(segment)
+                server.wait(len(segment) / bytes_per_ms)
+
+    def log_message(self, format, *args):
+        pass
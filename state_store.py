@@ -0,0 +1,70 @@
+"""
+Where StateCache keeps its bytes.
+
+RTC memory survives deep sleep but not a power cut, and writing it costs no
+flash wear, so small fields that change every loop go there, with a CRC to
+tell a valid record from leftovers. Everything else goes to flash, written
+to a temporary file first and renamed over the old one, so a power cut
+leaves either the old or the new file behind.
+"""
+
+import binascii
+import os
+import struct
+
+CRC = "<I"
+
+
+class RTCStore:
+    def __init__(self, rtc=None) -> None:
+        # anything with machine.RTC's memory([data]), tests pass a stub
+        self._rtc = rtc
+
+    def _memory(self, *data):
+        if self._rtc is None:
+            import machine
+
+            self._rtc = machine.RTC()
+        return self._rtc.memory(*data)
+
+    def read(self) -> bytes | None:
+        "The last written payload, None after a cold boot or if it is damaged"
+        data = self._memory()
+        crc_size = struct.calcsize(CRC)
+        if len(data) <= crc_size:
+            return None
+        payload = data[:-crc_size]
+        (crc,) = struct.unpack(CRC, data[-crc_size:])
+        if binascii.crc32(payload) != crc:
+            return None
+        return bytes(payload)
+
+    def write(self, payload: bytes):
+        self._memory(payload + struct.pack(CRC, binascii.crc32(payload)))
+
+
+class FlashStore:
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def read(self) -> bytes | None:
+        # a reset after write() removed the old file leaves only the new one,
+        # under its temporary name
+        for path in (self.path, self.path + ".tmp"):
+            try:
+                with open(path, "rb") as store_file:
+                    return store_file.read()
+            except OSError:
+                pass
+        return None
+
+    def write(self, data: bytes):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as tmp_file:
+            tmp_file.write(data)
+        try:
+            os.rename(tmp_path, self.path)
+        except OSError:
+            # filesystems that don't rename over an existing file
+            os.remove(self.path)
+            os.rename(tmp_path, self.path)
@@ -1,7 +1,7 @@
-import requests
 from cache import StateCache
 import dateutil
 
+# "timezone_url" in the config replaces it
 TIME_API_IP_URL = "http://worldtimeapi.org/api/ip"
 
 def _log(*args, **kwargs):
@@ -11,18 +11,25 @@ def _log(*args, **kwargs):
     else:
         print()
 
-def _run_request(url: str, method: str):
+def _run_request(url: str, method: str, timeout: int):
     # _log("http request", method=method, url=url)
-    return requests.request(
-        method=method,
-        url=url,
-    ).json()
+    from transport_api import run_request
 
+    return run_request(url=url, method=method, timeout=timeout).json()
 
-def get_tz_info_for_my_ip(cache: StateCache, config):
-    if check_needed(cache, config):
+
+def get_tz_info_for_my_ip(cache: StateCache, config, online: bool = True):
+    "Offline or when it fails it is the last response, even if a new one is due"
+    if online and check_needed(cache, config):
         _log("fetching TZ info from current IP")
-        cache.last_tz_response = _run_request(TIME_API_IP_URL, "GET")
+        try:
+            cache.last_tz_response = _run_request(
+                config.get("timezone_url", TIME_API_IP_URL),
+                "GET",
+                config.get("fetch_timeout_sec", 10),
+            )
+        except (OSError, ValueError) as e:
+            _log("could not get TZ info:", type(e), e)
     return cache.last_tz_response
 
 def check_needed(cache: StateCache, config: dict) -> bool:
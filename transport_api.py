@@ -1,6 +1,9 @@
-import requests
+import http_pool
+from json_stream import iter_array_items
 
-URL_TEMPLATE = "https://v6.vbb.transport.rest/stops/{}/departures/"
+# "departures_base_url" in the config replaces it, e.g. for a local server
+BASE_URL = "https://v6.vbb.transport.rest"
+DEPARTURES_PATH = "/stops/{}/departures/"
 
 UNRESERVED_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_.~"
 
@@ -29,20 +32,20 @@ def _percent_encode_query(value: str) -> str:
     return encoded
 
 
-def _run_request(url: str, method: str, timeout: int=5):
-    response = requests.request(
-        method=method,
-        url=url,
-        timeout=timeout
-    )
+def run_request(url: str, method: str, timeout: int = 5):
+    "http_pool.request, ValueError unless the status is 2xx"
+    response = http_pool.request(method=method, url=url, timeout=timeout)
     if response.status_code < 200 or response.status_code > 299:
-        raise ValueError("response was not successful!", response)
+        response.close()
+        raise ValueError("response was not successful!", response.status_code)
 
     return response
 
 
-def departures_url(stop_id: str, params: dict[str, str]) -> str:
-    templated = URL_TEMPLATE.format(stop_id)
+def departures_url(
+    stop_id: str, params: dict[str, str], base_url: str | None = None
+) -> str:
+    templated = (base_url or BASE_URL).rstrip("/") + DEPARTURES_PATH.format(stop_id)
     if params:
         templated += "?"
         templated += "&".join(
@@ -53,16 +56,36 @@ def departures_url(stop_id: str, params: dict[str, str]) -> str:
     return templated
 
 
-def get_departures(stop_id: str, duration: int = 50, cache: dict[str, dict] = dict(), now_epoch: int = 0) -> any:
-    params = {
-        "duration": str(duration),
-    }
-    url = departures_url(stop_id, params)
-    result_json = _run_request(
-        method="GET",
-        url=url,
-    ).json()
-    departures = result_json.get("departures")
-    if departures is not None:
-        return departures
-    raise KeyError(f"missing departures in response: {result_json}")
+def iter_departures(
+    stop_id: str,
+    duration: int = 50,
+    params: dict | None = None,
+    base_url: str | None = None,
+    timeout: int = 5,
+):
+    """
+    Yield departures one at a time while the response is being read, so
+    only one departure object is in memory at once. Close the generator
+    to stop reading early, that also closes the connection.
+    `params` replaces the default query, see query_planner.py.
+    """
+    if params is None:
+        params = {
+            "duration": str(duration),
+        }
+    url = departures_url(stop_id, params, base_url)
+    response = run_request(method="GET", url=url, timeout=timeout)
+    try:
+        for departure in iter_array_items(response.raw, "departures"):
+            yield departure
+    finally:
+        response.close()
+
+
+def get_departures(
+    stop_id: str,
+    duration: int = 50,
+    cache: dict[str, dict] = dict(),
+    now_epoch: int = 0,
+) -> any:
+    return list(iter_departures(stop_id, duration))
@@ -1,41 +1,116 @@
+import time
+import gc
+import profiler
+
+# ticks count from the reset, so this is how long booting took
+BOOT_US = time.ticks_us()
+BOOT_MEM_FREE = gc.mem_free()
+PROFILER = profiler.Profiler()
+
+import binascii
 import collections
 import sys
-import json
-import time
 import machine
+from framebuf import FrameBuffer, MONO_HMSB
 
 from cache import StateCache, UIDeparture
-from soldered_inkplate6 import Inkplate
 
-import transport_api
+# the display driver, the HTTP stack (http_pool, transport_api,
+# async_fetch, query_planner), netutil and stringutil are imported where
+# they are first needed, a wake without a fetch never loads the HTTP stack
+import clock_sync
+import fetch_scheduler
 import timezone_api
 import dateutil
+import refresh
+import ui_model
 
 start_time_ticks = time.ticks_ms()
 
-import netutil
 from config import load_config
+from departure_filter import DepartureFilter
 from dateutil import timedelta_pformat
-from stringutil import clean_string
 
-from simple_bitmap_font import MonoFont
-from fonts.condensed import font_dict as condensed_font
-from fonts.regular import font_dict as regular_font
+from simple_bitmap_font import MonoFont, TextRunCache
+from ui_model import Widget, fill_widget, text_widget
 
 Any = object
 
-CONDENSED = MonoFont(font_dict=condensed_font, preload_chars=False)
-REGULAR = MonoFont(font_dict=regular_font, preload_chars=False)
+# per font, 96px glyphs take ~0.5-1kB each
+FONT_CACHE_BUDGET_BYTES = 24 * 1024
+# font name -> path, chars kept in the glyph cache for good
+FONT_FILES = {
+    "condensed": ("/fonts/condensed.bin", "0123456789:"),
+    "regular": ("/fonts/regular.bin", "0123456789hm"),
+}
+# fonts opened so far, see font()
+FONTS = dict()
+# rendered stop names, line names, directions and times, ~7kB per direction
+TEXT_RUNS = TextRunCache(budget_bytes=96 * 1024)
 
 UIState = collections.namedtuple("UIState", ("departures", "created_at"))
 Message = collections.namedtuple("Message", ("text", "created_at"))
 XY = collections.namedtuple("XY", ("x", "y"))
 
-display = Inkplate(Inkplate.INKPLATE_1BIT)
+_display = None
+
+# everything is drawn into FRAME first, PREVIOUS_FRAME is what the panel shows
+FRAME = bytearray(refresh.FRAME_BYTES)
+FRAME_FB = FrameBuffer(FRAME, refresh.WIDTH, refresh.HEIGHT, MONO_HMSB)
+PREVIOUS_FRAME = bytearray(refresh.FRAME_BYTES)
+PREVIOUS_FRAME_FB = FrameBuffer(
+    PREVIOUS_FRAME, refresh.WIDTH, refresh.HEIGHT, MONO_HMSB
+)
+# the widgets FRAME shows, None when that is not known; after a reset the
+# frames are drawn again from the saved ones
+WIDGETS_PATH = "/widgets.json"
+shown_widgets = None
+# the widgets the panel shows, also when FRAME was not drawn again
+panel_widgets = None
+
+PROFILER.add("boot", BOOT_US, -1, BOOT_MEM_FREE)
+PROFILER.add(
+    "imports", time.ticks_diff(time.ticks_us(), BOOT_US), BOOT_MEM_FREE, gc.mem_free()
+)
+
+# a DHCP lease is reused as a static IP for this long, 0 always asks DHCP
+WIFI_LEASE_SEC = 12 * 60 * 60
+# after a failed connect, loops in the same wake stay offline this long
+WIFI_RETRY_MS = 60 * 1000
+# ticks_ms of the last failed connect, None if there was none
+wifi_failed_at = None
+
+# seconds from a deep sleep wake until the next minute's frame can be
+# drawn: booting and loading the state, drawing the shown frame again when
+# the refresh will be a partial one, Wi-Fi with NTP or a fetch when due
+WAKE_LEAD_SEC = 3
+RESTORE_LEAD_SEC = 2
+ONLINE_LEAD_SEC = 10
+# shorter deep sleeps are not worth the reset, the loop light sleeps instead
+MIN_DEEPSLEEP_SEC = 8
+
+
+def font(name: str) -> MonoFont:
+    loaded = FONTS.get(name)
+    if loaded is None:
+        path, pinned_chars = FONT_FILES[name]
+        loaded = MonoFont.from_file(
+            path,
+            preload_chars=False,
+            cache_budget_bytes=FONT_CACHE_BUDGET_BYTES,
+            pinned_chars=pinned_chars,
+        )
+        FONTS[name] = loaded
+    return loaded
+
 
+def get_display():
+    global _display
+    if _display is None:
+        from soldered_inkplate6 import Inkplate
 
-APPROX_REFRESH_DURATION_AFTER_DEEPSLEEP_RESET = 16
-APPROX_COLD_BOOT_REFRESH_DURATION = 22
+        _display = Inkplate(Inkplate.INKPLATE_1BIT)
+    return _display
 
 
 def _log(*args, **kwargs):
@@ -59,67 +134,69 @@ def _when(departure) -> int:
 
 
 def is_relevant(
-    departure: dict[str, Any], lines_directions: list[dict], now: int
+    departure: dict[str, Any], departure_filter: DepartureFilter, now: int
 ) -> bool:
-    api_when = _when(departure)
-    if not api_when:
-        # probably canceled
-        return False
-    time_left = api_when - now
+    return _relevant_when(departure, departure_filter, now) is not None
 
-    if time_left < 0:
-        return False
 
-    for match_config in lines_directions:
-        match_line, dir_regex, except_regex = (
-            match_config["line_name"],
-            match_config["direction_regex"],
-            match_config.get("except_regex"),
-        )
+def _relevant_when(
+    departure: dict[str, Any], departure_filter: DepartureFilter, now: int
+) -> int | None:
+    "Departure time if it should be shown, 'when' is only parsed for matches"
+    if not departure_filter.matches(departure["line"]["name"], departure["direction"]):
+        return None
 
-        departure_line = departure["line"]["name"]
-        if departure_line != match_line:
-            continue
-
-        direction_departure = departure["direction"]
-        dir_match = dir_regex.match(direction_departure)
-        if dir_match is None:
-            continue
-
-        if except_regex and except_regex.match(direction_departure):
-            continue
-
-        return True
-
-    return False
+    api_when = _when(departure)
+    if not api_when or api_when < now:
+        # probably canceled or already gone
+        return None
+    return api_when
 
 
 def get_configured_departures(
     stops: list[str],
-    lines_directions: list,
+    departure_filter: DepartureFilter,
     remove_phrases: list[str],
     cache: StateCache,
     departures_max_duration_min: int,
+    fetch_concurrency: int,
+    fetch_timeout: int,
+    fetch_policy: fetch_scheduler.FetchPolicy,
+    utc_offset_seconds: int,
+    base_url: str | None = None,
+    online: bool = True,
 ) -> dict[str, list[UIDeparture]]:
-    MAX_AGE = 30  # seconds
-    cached_departures_age = dateutil.now_epoch() - cache.last_departure_update
-    if cached_departures_age > MAX_AGE:
+    now = dateutil.now_epoch()
+    if fetch_scheduler.fetch_due(cache, now):
         try:
-            departures = update_departures_from_api(
-                stops,
-                lines_directions,
-                remove_phrases,
-                cache,
-                departures_max_duration_min,
-            )
+            if not online:
+                raise OSError("not connected to Wi-Fi")
+            with PROFILER.span("fetch"):
+                departures = update_departures_from_api(
+                    stops,
+                    departure_filter,
+                    remove_phrases,
+                    cache,
+                    departures_max_duration_min,
+                    fetch_concurrency,
+                    fetch_timeout,
+                    base_url,
+                )
         except OSError as e:
             show_status_message(f"Could not connect to transport API: {type(e)}: {e}")
             show_status_message("Using cached departures")
-            departures = cache.departures
+            fetch_scheduler.record_failure(cache)
+            departures = cache.upcoming_departures(now)
+        cache.departures = departures
+        next_fetch_sec = fetch_scheduler.schedule(
+            cache, now, fetch_policy, utc_offset_seconds
+        )
+        _log("next departures fetch in", next_fetch_sec, "sec")
     else:
-        departures = cache.departures
+        departures = cache.upcoming_departures(now)
         show_status_message(
-            f"Using cached departures, got the last update {cached_departures_age} sec ago"
+            f"Using cached departures, got the last update {now - cache.last_departure_update} sec ago,"
+            f" next in {cache.next_departure_fetch - now} sec"
         )
 
     grouped_by_stop = dict()
@@ -128,188 +205,498 @@ def get_configured_departures(
         stop_departures.append(d)
         grouped_by_stop[d.stop] = stop_departures
 
-    cache.departures = departures
-
     return grouped_by_stop
 
 
 def update_departures_from_api(
-    stops, lines_directions, remove_phrases, cache, duration
+    stops,
+    departure_filter,
+    remove_phrases,
+    cache,
+    duration,
+    concurrency,
+    timeout,
+    base_url=None,
 ) -> list[UIDeparture]:
-    departures: list[UIDeparture] = []
+    import async_fetch
+    from json_stream import ArrayItemParser
+    from query_planner import plan_departures_query
+    from stringutil import clean_string
+
     update_start_time = dateutil.now_epoch()
+    # twice what fits on screen, some will leave before the next update
+    max_per_stop = 2 * DEPARTURE_ROWS // len(stops)
+    plans = [
+        plan_departures_query(stop_id, departure_filter.line_names, duration, base_url)
+        for stop_id in stops
+    ]
+
+    filter_us = 0
+
+    def accept(stop_id, api_departure) -> UIDeparture | None:
+        nonlocal filter_us
+        start = time.ticks_us()
+        departure = _to_ui_departure(stop_id, api_departure)
+        filter_us += time.ticks_diff(time.ticks_us(), start)
+        return departure
+
+    def _to_ui_departure(stop_id, api_departure) -> UIDeparture | None:
+        api_when = _relevant_when(api_departure, departure_filter, update_start_time)
+        if api_when is None:
+            return None
+        return UIDeparture(
+            api_departure["line"]["name"],
+            clean_string(api_departure["direction"], remove_phrases),
+            api_when,
+            clean_string(api_departure["stop"]["name"], remove_phrases),
+            stop_id,
+        )
 
-    for stop_id in stops:
-        _log("getting departures from api for", stop_id)
-        all_departures_from_stop = transport_api.get_departures(stop_id, duration)
-        _log("got", len(all_departures_from_stop), "departures from", stop_id)
-        departures_list = [
-            d
-            for d in all_departures_from_stop
-            if is_relevant(d, lines_directions, update_start_time)
-        ]
-        for api_departure in departures_list:
-            display_direction = clean_string(api_departure["direction"], remove_phrases)
-
-            departures.append(
-                UIDeparture(
-                    api_departure["line"]["name"],
-                    display_direction,
-                    _when(api_departure) - update_start_time,
-                    clean_string(api_departure["stop"]["name"], remove_phrases),
-                )
+    parse_start_us = ArrayItemParser.feed_us
+    mem_before = gc.mem_free()
+    if concurrency > 1:
+        _log("getting departures for", len(plans), "stops,", concurrency, "at once")
+        timings = dict()
+        results = async_fetch.fetch_all(
+            {plan.stop_id: plan.url for plan in plans},
+            accept,
+            max_per_stop,
+            concurrency,
+            timeout,
+            timings,
+        )
+        # the stops overlap, their heap use can't be told apart
+        for index, plan in enumerate(plans):
+            PROFILER.add("fetch_stop", timings.get(plan.stop_id, 0), -1, -1, index)
+    else:
+        results = dict()
+        for index, plan in enumerate(plans):
+            try:
+                with PROFILER.span("fetch_stop", index):
+                    results[plan.stop_id] = _fetch_stop(
+                        plan, accept, max_per_stop, base_url, timeout
+                    )
+            except (OSError, ValueError, KeyError) as e:
+                results[plan.stop_id] = e
+    PROFILER.add(
+        "parse", ArrayItemParser.feed_us - parse_start_us, mem_before, gc.mem_free()
+    )
+    PROFILER.add("filter", filter_us, -1, -1)
+
+    departures: list[UIDeparture] = []
+    failed = False
+    for plan in plans:
+        result = results[plan.stop_id]
+        if isinstance(result, Exception):
+            failed = True
+            show_status_message(
+                f"Could not get departures for {plan.stop_id}: {type(result)}: {result}"
             )
+            result = [
+                d
+                for d in cache.upcoming_departures(update_start_time)
+                if d.stop_id == plan.stop_id
+            ]
+        else:
+            _log("got", len(result), "departures from", plan.stop_id)
+        departures.extend(result)
+    fetch_scheduler.record_fetch(cache, departures, update_start_time, ok=not failed)
     cache.last_departure_update = update_start_time
     return departures
 
 
+def _fetch_stop(
+    plan, accept, max_per_stop: int, base_url: str | None, timeout: int
+) -> list[UIDeparture]:
+    import transport_api
+
+    _log("getting departures:", plan.url, "saves ~", plan.saved_bytes, "bytes")
+    api_departures = transport_api.iter_departures(
+        plan.stop_id, params=plan.params, base_url=base_url, timeout=timeout
+    )
+    stop_departures = []
+    for api_departure in api_departures:
+        departure = accept(plan.stop_id, api_departure)
+        if departure is None:
+            continue
+        stop_departures.append(departure)
+        if len(stop_departures) >= max_per_stop:
+            break
+    api_departures.close()
+    return stop_departures
+
+
 MARGIN = 5
+DEPARTURE_ROWS = 6
 DESTINATION_X = 130 + MARGIN
 TIME_LEFT_X = 0 + MARGIN
 
 CONDENSED_Y_OFFSET = -5
 
 
-def display_departures(departure_data: dict[str, list[UIDeparture]]):
+def departure_widgets(
+    departure_data: dict[str, list[UIDeparture]], now: int
+) -> list[Widget]:
+    condensed, regular = font("condensed"), font("regular")
+    widgets = []
     y = MARGIN
-    deps_per_stop = 6 // len(departure_data)
-    for stop, departures in departure_data.items():
-        # _log(stop)
-        CONDENSED.draw_text(display.ipm, stop, 0, y, align=MonoFont.LEFT)
-        y += CONDENSED._line_height
-
-        departures = departures[:deps_per_stop]
-
-        for line, dir, time_left, _ in departures:
-            # _log(line, dir, time_left)
-            _, _, line_end_x, _ = REGULAR.draw_text(display.ipm, line, x=0, y=y)
-
-            CONDENSED.draw_text(
-                display.ipm, dir, x=DESTINATION_X, y=y + CONDENSED_Y_OFFSET
+    deps_per_stop = DEPARTURE_ROWS // max(len(departure_data), 1)
+    for stop_index, (stop, departures) in enumerate(departure_data.items()):
+        widgets.append(text_widget(f"{stop_index}", "condensed", condensed, stop, 0, y))
+        y += condensed._line_height
+
+        departures = [d for d in departures if d.when > now][:deps_per_stop]
+
+        for row, (line, dir, when, _, _) in enumerate(departures):
+            key = f"{stop_index}.{row}"
+            widgets.append(text_widget(key + ".line", "regular", regular, line, 0, y))
+
+            when_pretty = timedelta_pformat(when - now)
+            when_w = regular.text_width(when_pretty)
+            dir = condensed.truncate_text(dir, 800 - when_w - MARGIN - DESTINATION_X)
+            widgets.append(
+                text_widget(
+                    key + ".direction",
+                    "condensed",
+                    condensed,
+                    dir,
+                    DESTINATION_X,
+                    y + CONDENSED_Y_OFFSET,
+                )
             )
-            when_pretty = timedelta_pformat(time_left)
-            when_w, when_h = REGULAR.get_text_size(when_pretty)
-            display.ipm.fill_rect(800 - when_w, y, when_w, when_h, 0)
-            REGULAR.draw_text(
-                display.ipm, when_pretty, x=800, y=y, align=MonoFont.RIGHT
+            widgets.append(
+                text_widget(
+                    key + ".time", "regular", regular, when_pretty, 800 - when_w, y
+                )
             )
             y += 100
 
         y += 12
-        display.drawRect(y=y, x=0, w=800, h=2, c=1)
+        widgets.append(fill_widget(f"{stop_index}.rule", 0, y, 800, 2))
         y += 12
+    return widgets
 
 
 CLOCK_TEXT_SIZE = 4
+# the clock gets a "~" in front once it may be off by more than this
+CLOCK_APPROXIMATE_SEC = 30
 
 
 def show_status_message(text: str):
     print(text)
 
 
-def display_clock(utc_offset_seconds: int):
-    (_, _, _, hour, minute, _, _, _) = time.gmtime(
+def clock_widget(utc_offset_seconds: int, approximate: bool = False) -> Widget:
+    _, _, _, hour, minute, _, _, _ = time.gmtime(
         dateutil.now_epoch() + utc_offset_seconds
     )
-
-    CONDENSED.draw_text(
-        display.ipm,
-        f"{hour:02d}:{minute:02d}",
-        x=800 - 3,
-        y=10,
-        transparent=False,
-        align=MonoFont.RIGHT,
+    text = f"{hour:02d}:{minute:02d}"
+    if approximate:
+        text = "~" + text
+    condensed = font("condensed")
+    return text_widget(
+        "clock", "condensed", condensed, text, 800 - 3 - condensed.text_width(text), 10
     )
 
 
-def should_set_time(cache: StateCache) -> bool:
-    seconds_since_update = abs(dateutil.now_epoch() - cache.last_rtc_ntp_update)
-    return cache.last_rtc_ntp_update == 0 or seconds_since_update > 1 * 60 * 60
+def sync_time(config, cache: StateCache):
+    import netutil
+
+    try:
+        ntp_now = netutil.ntp_time(config.get("ntp_timeout_sec", 1))
+    except OSError as e:
+        now = dateutil.now_epoch()
+        clock_sync.record_failure(cache, now)
+        _log("NTP failed:", e, "clock off by up to", clock_sync.error_bound(cache, now))
+        return
+    rtc_now = dateutil.rtc_epoch()
+    corrected_error = dateutil.now_epoch() - ntp_now
+    clock_sync.record_sync(cache, ntp_now, rtc_now)
+    netutil.set_rtc(ntp_now)
+    _log(
+        "RTC was",
+        rtc_now - ntp_now,
+        "s off,",
+        corrected_error,
+        "s with the drift correction, drift",
+        cache.rtc_drift_ppm,
+        "ppm, next sync in",
+        cache.next_ntp_sync - ntp_now,
+        "s",
+    )
 
 
 def loop(config, cache: StateCache):
-    global start_time_ticks
-    if not netutil.wlan.isconnected():
-        connect_wifi(config, cache)
-
-    if should_set_time(cache):
+    global start_time_ticks, shown_widgets, panel_widgets, wifi_failed_at
+    now = dateutil.now_epoch()
+    needs_network = (
+        fetch_scheduler.fetch_due(cache, now)
+        or clock_sync.sync_due(cache, now)
+        or timezone_api.check_needed(cache, config)
+    )
+    online = False
+    if not needs_network:
+        _log("no fetch due, staying offline")
+    else:
+        import netutil
+
+        online = netutil.wlan.isconnected()
+        if not online and (
+            wifi_failed_at is None
+            or time.ticks_diff(time.ticks_ms(), wifi_failed_at) > WIFI_RETRY_MS
+        ):
+            with PROFILER.span("wifi") as span:
+                span.tag = connect_wifi(config, cache)
+            online = span.tag != netutil.FAILED
+            if not online:
+                wifi_failed_at = time.ticks_ms()
+
+    if online and clock_sync.sync_due(cache, dateutil.now_epoch()):
         show_status_message("Setting time from NTP...")
-        netutil.setup_time()
-        cache.last_rtc_ntp_update = dateutil.now_epoch()
+        with PROFILER.span("ntp"):
+            sync_time(config, cache)
 
+    with PROFILER.span("timezone"):
+        tz_info = timezone_api.get_tz_info_for_my_ip(
+            config=config, cache=cache, online=online
+        )
+    utc_offset_seconds = get_utc_offset(tz_info)
     departures = get_configured_departures(
         config["stops"],
-        config["lines_directions"],
+        config["departure_filter"],
         config["remove_phrases"],
         cache,
         config["max_duration_min"],
+        config.get("fetch_concurrency", min(len(config["stops"]), 3)),
+        config.get("fetch_timeout_sec", 10),
+        fetch_scheduler.policy_from_config(config),
+        utc_offset_seconds,
+        config.get("departures_base_url"),
+        online,
     )
-    tz_info = timezone_api.get_tz_info_for_my_ip(config=config, cache=cache)
 
     seconds_until_next_min = dateutil.next_full_minute() - dateutil.now_epoch()
-    if seconds_until_next_min < 10:
+    if seconds_until_next_min < 10 or (
+        panel_widgets and frame_clock_widget(utc_offset_seconds, cache) in panel_widgets
+    ):
+        # the panel shows this minute already, the rest can wait for the next
         _log("light sleep for", seconds_until_next_min, "seconds")
         machine.lightsleep(seconds_until_next_min * 1000)
 
+    _log("detected timezone:", tz_info.get("timezone"))
+    with PROFILER.span("render"):
+        widgets = frame_widgets(departures, utc_offset_seconds, cache)
+        render_stats = ui_model.render(
+            FRAME_FB,
+            shown_widgets,
+            widgets,
+            FONTS,
+            TEXT_RUNS,
+            refresh.WIDTH,
+            refresh.HEIGHT,
+        )
+    _log("redrew", render_stats.drawn, "of", render_stats.widgets, "widgets")
+    with PROFILER.span("refresh"):
+        refresh_display(config, cache, render_stats.rects)
+    with PROFILER.span("persist"):
+        if render_stats.rects:
+            ui_model.save_widgets(WIDGETS_PATH, widgets)
+        cache.perist()
+    shown_widgets = panel_widgets = widgets
+    for name, loaded in FONTS.items():
+        _log("glyph cache", name, loaded.cache_stats())
+    _log("text run cache:", TEXT_RUNS.stats())
+    if "http_pool" in sys.modules:
+        _log("http connections:", sys.modules["http_pool"].POOL.stats())
+    loop_ms = time.ticks_diff(time.ticks_ms(), start_time_ticks)
+    _log("loop() done in", loop_ms, "ms ticks")
+    PROFILER.add("loop", loop_ms * 1000, -1, gc.mem_free())
+    PROFILER.flush(dateutil.now_epoch(), config.get("profile_cycles", 0))
+    if not go_to_sleep(config, cache):
+        start_time_ticks = time.ticks_ms()
+
+
+def frame_widgets(
+    departures: dict[str, list[UIDeparture]], utc_offset_seconds: int, cache
+) -> list[Widget]:
+    widgets = departure_widgets(departure_data=departures, now=dateutil.now_epoch())
+    widgets.append(frame_clock_widget(utc_offset_seconds, cache))
+    return widgets
+
+
+def frame_clock_widget(utc_offset_seconds: int, cache) -> Widget:
+    clock_error = clock_sync.error_bound(cache, dateutil.now_epoch())
+    return clock_widget(
+        utc_offset_seconds, clock_error is None or clock_error > CLOCK_APPROXIMATE_SEC
+    )
+
+
+def refresh_display(config, cache: StateCache, rects: list[tuple[int, int, int, int]]):
+    mode = refresh.choose_mode(
+        rects,
+        cache.partial_refreshes_since_full,
+        config.get("max_partial_refreshes", refresh.DEFAULT_MAX_PARTIAL_REFRESHES),
+        config.get(
+            "max_partial_dirty_fraction", refresh.DEFAULT_MAX_PARTIAL_DIRTY_FRACTION
+        ),
+    )
+    _log("dirty rects:", rects, "refresh:", mode)
+
+    display = get_display()
     display.begin()
+    if mode == refresh.NONE:
+        return
+
+    if mode == refresh.PARTIAL and refresh.seed_partial_update(
+        display, PREVIOUS_FRAME_FB
+    ):
+        display.ipm.blit(FRAME_FB, 0, 0)
+        display.partialUpdate()
+        cache.partial_refreshes_since_full += 1
+    else:
+        display.ipm.blit(FRAME_FB, 0, 0)
+        display.display()
+        cache.partial_refreshes_since_full = 0
 
-    display_departures(departure_data=departures)
-    _log("detected timezone:", tz_info["timezone"])
-    utc_offset_seconds = get_utc_offset(tz_info)
-    display_clock(utc_offset_seconds)
-    display.display()
-    cache.perist()
-    _log(
-        "loop() done in",
-        time.ticks_diff(time.ticks_ms(), start_time_ticks),
-        "ms ticks",
+    PREVIOUS_FRAME[:] = FRAME
+    cache.frame_hash = binascii.crc32(FRAME)
+
+
+def restore_frame(cache: StateCache) -> bool:
+    """
+    Draws the saved widgets into FRAME and PREVIOUS_FRAME, False if that is
+    not the frame the panel shows
+    """
+    global shown_widgets
+    widgets = ui_model.load_widgets(WIDGETS_PATH)
+    if widgets is None:
+        return False
+    for name in set(w.font for w in widgets if w.font is not None):
+        font(name)
+    ui_model.render(
+        FRAME_FB, None, widgets, FONTS, TEXT_RUNS, refresh.WIDTH, refresh.HEIGHT
     )
-    if not go_to_sleep():
-        start_time_ticks = time.ticks_ms()
+    if binascii.crc32(FRAME) != cache.frame_hash:
+        return False
+    PREVIOUS_FRAME[:] = FRAME
+    shown_widgets = widgets
+    return True
 
 
 def get_utc_offset(tz_info):
+    if not tz_info:
+        # never got one, UTC until the board gets online
+        return 0
     return tz_info["raw_offset"] + (tz_info["dst_offset"] if tz_info["dst"] else 0)
 
 
-def go_to_sleep():
-    display.einkOff()
-
-    reset_refresh_sec = (
-        APPROX_REFRESH_DURATION_AFTER_DEEPSLEEP_RESET
-        if machine.reset_cause() == machine.DEEPSLEEP_RESET
-        else APPROX_COLD_BOOT_REFRESH_DURATION
+def next_refresh_full(config, cache: StateCache) -> bool:
+    "Whether the next refresh has to be a full one, as far as is known yet"
+    return cache.partial_refreshes_since_full >= config.get(
+        "max_partial_refreshes", refresh.DEFAULT_MAX_PARTIAL_REFRESHES
     )
-    hot_refresh_seconds = 8
+
+
+def wake_lead_sec(config, cache: StateCache) -> int:
+    "How long before the next minute to wake up, to draw it when it starts"
+    at = dateutil.next_full_minute()
+    lead = WAKE_LEAD_SEC
+    if not next_refresh_full(config, cache):
+        lead += RESTORE_LEAD_SEC
+    if (
+        fetch_scheduler.fetch_due(cache, at)
+        or clock_sync.sync_due(cache, at)
+        or timezone_api.check_needed(cache, config)
+    ):
+        lead += ONLINE_LEAD_SEC
+    return lead
+
+
+def go_to_sleep(config, cache: StateCache):
+    get_display().einkOff()
 
     sleep_time_seconds = (
-        dateutil.next_full_minute() - dateutil.now_epoch() - reset_refresh_sec
+        dateutil.next_full_minute()
+        - dateutil.now_epoch()
+        - wake_lead_sec(config, cache)
     )
     # sleep only if it makes sense
-    if sleep_time_seconds > hot_refresh_seconds:
+    if sleep_time_seconds > MIN_DEEPSLEEP_SEC:
         _log("going into deep sleep for", sleep_time_seconds, "seconds")
         machine.deepsleep(sleep_time_seconds * 1000)
     else:
         return False
 
 
-def connect_wifi(config, cache: StateCache):
+def connect_wifi(config, cache: StateCache) -> int:
+    "Returns how it connected, netutil.FAILED if it did not"
     wifi_conf = config["wifi"]
     ssid = wifi_conf["ssid"]
     show_status_message(f"Connecting to WiFi '{ssid}'")
-    ip, _, _, _ = netutil.do_connect(ssid, wifi_conf.get("key", None))
-    show_status_message(f"Connected to {ssid} ({ip})")
-    cache.last_connected_wifi_ssid = config["wifi"]["ssid"]
+    import netutil
+
+    now = dateutil.now_epoch()
+    known = cache.last_connected_wifi_ssid == ssid
+    # not after failed fetches, the address might be taken by now
+    reuse_lease = (
+        known
+        and cache.wifi_ifconfig
+        and cache.fetch_failures == 0
+        and abs(now - cache.wifi_leased_at)
+        < config.get("wifi_lease_sec", WIFI_LEASE_SEC)
+    )
+    start = time.ticks_ms()
+    connection = netutil.do_connect(
+        ssid,
+        wifi_conf.get("key", None),
+        cache.wifi_bssid if known else b"",
+        cache.wifi_channel,
+        cache.wifi_ifconfig if reuse_lease else None,
+        config.get("wifi_timeout_sec", 10) * 1000,
+        config.get("wifi_attempts", 2),
+    )
+    connect_ms = time.ticks_diff(time.ticks_ms(), start)
+    if connection.method == netutil.FAILED:
+        show_status_message(f"Could not connect to {ssid} in {connect_ms}ms")
+        cache.wifi_bssid = b""
+        return connection.method
+
+    show_status_message(
+        f"Connected to {ssid} ({connection.ifconfig[0]}) in {connect_ms}ms"
+    )
+    cache.last_connected_wifi_ssid = ssid
+    cache.wifi_bssid = connection.bssid
+    cache.wifi_channel = connection.channel
+    if not (reuse_lease and connection.method == netutil.DIRECT):
+        cache.wifi_ifconfig = tuple(connection.ifconfig)
+        cache.wifi_leased_at = now
+    return connection.method
 
 
 def main():
-    if machine.reset_cause() not in (machine.DEEPSLEEP_RESET,):
-        display.begin()
-        display.display()
+    global shown_widgets, panel_widgets
     try:
+        # kept in memory while awake, RTC memory and flash only matter after a reset
+        cache = StateCache.load_cache()
+        clock_sync.apply(cache)
+        if machine.reset_cause() not in (machine.DEEPSLEEP_RESET,):
+            # the panel is blank now, which is what an all zeros PREVIOUS_FRAME says
+            get_display().begin()
+            get_display().display()
+            shown_widgets = panel_widgets = []
+        elif next_refresh_full(load_config(), cache):
+            _log("the next refresh is a full one, not restoring the frame")
+            panel_widgets = ui_model.load_widgets(WIDGETS_PATH)
+        else:
+            # FRAME is only redrawn where widgets changed, start from what is shown
+            with PROFILER.span("restore"):
+                restored = restore_frame(cache)
+            if not restored:
+                _log("no saved frame, the next refresh will be a full one")
+                PREVIOUS_FRAME_FB.fill(1)
+            panel_widgets = shown_widgets
         while True:
             config = load_config()
-            cache = StateCache.load_cache()
             loop(config, cache)
 
     except KeyboardInterrupt:
@@ -0,0 +1,150 @@
+"""
+Retained-mode description of the screen.
+
+The UI builds a list of widgets every loop. Each widget has a stable key
+(its position in the layout) and a bounding box. Comparing the list with
+the one drawn last time tells which widgets have to be cleared and drawn
+again, everything else stays in the frame as it is. The drawn list is kept
+in flash next to the frame, so this works across deep sleep resets.
+"""
+
+import collections
+import json
+
+# a text widget draws `text` in `font` with its top left corner at (x, y),
+# a widget without a font is a filled rectangle
+Widget = collections.namedtuple("Widget", ("key", "font", "text", "x", "y", "w", "h"))
+
+RenderStats = collections.namedtuple("RenderStats", ("widgets", "drawn", "rects"))
+
+
+def text_widget(key: str, font_name: str, font, text: str, x: int, y: int) -> Widget:
+    width, height = font.get_text_size(text)
+    return Widget(key, font_name, text, x, y, width, height)
+
+
+def fill_widget(key: str, x: int, y: int, w: int, h: int) -> Widget:
+    return Widget(key, None, "", x, y, w, h)
+
+
+def _rect(widget: Widget) -> tuple[int, int, int, int]:
+    return widget.x, widget.y, widget.w, widget.h
+
+
+def _union(a, b) -> tuple[int, int, int, int]:
+    x, y = min(a[0], b[0]), min(a[1], b[1])
+    return (
+        x,
+        y,
+        max(a[0] + a[2], b[0] + b[2]) - x,
+        max(a[1] + a[3], b[1] + b[3]) - y,
+    )
+
+
+def _intersects(a, b) -> bool:
+    return (
+        a[0] < b[0] + b[2]
+        and b[0] < a[0] + a[2]
+        and a[1] < b[1] + b[3]
+        and b[1] < a[1] + a[3]
+    )
+
+
+def _clip(rect, width: int, height: int) -> tuple[int, int, int, int] | None:
+    x, y, w, h = rect
+    x1, y1 = max(x, 0), max(y, 0)
+    x2, y2 = min(x + w, width), min(y + h, height)
+    if x2 <= x1 or y2 <= y1:
+        return None
+    return x1, y1, x2 - x1, y2 - y1
+
+
+def changed_rects(
+    previous: list[Widget], current: list[Widget]
+) -> tuple[list[tuple[int, int, int, int]], set[str]]:
+    """
+    Areas to clear and the keys of the widgets to draw again. A widget that
+    changed covers both where it was and where it is now.
+    """
+    previous_by_key = {w.key: w for w in previous}
+    current_keys = set()
+    rects = []
+    redraw = set()
+    for widget in current:
+        current_keys.add(widget.key)
+        old = previous_by_key.get(widget.key)
+        if old == widget:
+            continue
+        redraw.add(widget.key)
+        rects.append(
+            _rect(widget) if old is None else _union(_rect(old), _rect(widget))
+        )
+    for widget in previous:
+        if widget.key not in current_keys:
+            rects.append(_rect(widget))
+
+    # unchanged widgets overlapping a cleared area have to be drawn again,
+    # text is drawn opaquely, so then also the ones overlapping those
+    covered = list(rects)
+    added = True
+    while added:
+        added = False
+        for widget in current:
+            if widget.key not in redraw and any(
+                _intersects(_rect(widget), rect) for rect in covered
+            ):
+                redraw.add(widget.key)
+                covered.append(_rect(widget))
+                added = True
+    return rects, redraw
+
+
+def render(
+    fb,
+    previous: list[Widget] | None,
+    current: list[Widget],
+    fonts: dict,
+    text_runs,
+    width: int,
+    height: int,
+) -> RenderStats:
+    """
+    Brings `fb` from showing `previous` to showing `current` and returns the
+    changed rectangles. With `previous` None the contents of `fb` are unknown
+    and everything is drawn.
+    """
+    if previous is None:
+        fb.fill(0)
+        rects, redraw = [(0, 0, width, height)], set(w.key for w in current)
+    else:
+        rects, redraw = changed_rects(previous, current)
+
+    clipped = []
+    for rect in rects:
+        rect = _clip(rect, width, height)
+        if rect is not None:
+            clipped.append(rect)
+            fb.fill_rect(*rect, 0)
+
+    for widget in current:
+        if widget.key not in redraw:
+            continue
+        if widget.font is None:
+            fb.fill_rect(widget.x, widget.y, widget.w, widget.h, 1)
+        else:
+            text_runs.draw_text(fonts[widget.font], fb, widget.text, widget.x, widget.y)
+    return RenderStats(len(current), len(redraw), clipped)
+
+
+def save_widgets(path: str, widgets: list[Widget]):
+    with open(path, "w") as widgets_file:
+        json.dump([list(w) for w in widgets], widgets_file)
+
+
+def load_widgets(path: str) -> list[Widget] | None:
+    "Widgets saved by save_widgets, None if there are no usable ones"
+    try:
+        with open(path) as widgets_file:
+            return [Widget(*w) for w in json.load(widgets_file)]
+    except (OSError, TypeError, ValueError):
+        return None